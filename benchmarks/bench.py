@@ -0,0 +1,180 @@
+"""Benchmark suite for the simulation hot paths.
+
+Measures
+
+* ``tick``: time of ``_background_update_once`` by fleet size, device mix
+  and engine (per-device loop or vectorized),
+* ``events``: callback deliveries per second with 1, 10 and 1000 callbacks,
+* ``latency``: ``set_device_state`` latency while the update loop and
+  other writers are running,
+* ``memory``: bytes per device for the storage layouts.
+
+Results are written as JSON and can be compared against a saved baseline,
+the exit code is 1 if a result got slower than ``--tolerance`` allows.
+
+    python benchmarks/bench.py --quick --output results.json
+    python benchmarks/bench.py --quick --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+
+import memory
+from common import MIXES, make_fleet
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock
+from iot_simulator.store import np
+
+FULL_SIZES = [10, 1_000, 10_000, 100_000, 1_000_000]
+QUICK_SIZES = [10, 1_000, 10_000]
+CALLBACK_COUNTS = [1, 10, 1000]
+
+
+def _timed(function, repeat):
+    """Best-of-``repeat`` wall time of ``function()`` in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_tick(sizes, repeat):
+    engines = ["loop"] + (["vectorized"] if np is not None else [])
+    results = {}
+    for engine in engines:
+        for mix in MIXES:
+            for size in sizes:
+                vectorized = engine == "vectorized"
+                hub = SimulatedHub(vectorized=vectorized, compact=vectorized,
+                                   devices=make_fleet(size, mix), seed=1)
+                hub._background_update_once()  # Warm up, builds the engine
+                seconds = _timed(hub._background_update_once, repeat)
+                results[f"tick/{engine}/{mix}/{size}"] = {
+                    "seconds": seconds,
+                    "devices_per_second": size / seconds,
+                }
+    return results
+
+
+def bench_events(size, repeat):
+    results = {}
+    for count in CALLBACK_COUNTS:
+        hub = SimulatedHub(devices=make_fleet(size, "sensors"), seed=1)
+        delivered = [0]
+
+        def callback(device_id, state):
+            delivered[0] += 1
+
+        for _ in range(count):
+            # Distinct function objects, the callbacks are kept in a set
+            hub.register_callback(lambda device_id, state, cb=callback: cb(device_id, state))
+        delivered[0] = 0
+        seconds = _timed(hub._background_update_once, repeat)
+        events = delivered[0] / repeat  # One delivery per callback and change
+        results[f"events/{count}_callbacks"] = {
+            "seconds": seconds,
+            "deliveries_per_second": events / seconds,
+        }
+    return results
+
+
+async def _latency(writers, writes, fleet_size):
+    hub = SimulatedHub(devices=make_fleet(fleet_size), seed=1, clock=VirtualClock(start=0.0))
+    hub.register_callback(lambda device_id, state: None)
+    updates = asyncio.create_task(hub.start_background_updates())
+    samples = []
+
+    async def writer(n):
+        for i in range(writes):
+            started = time.perf_counter()
+            await hub.set_device_state(f"temp_{(n * 3) % fleet_size}", float(i))
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(writer(n) for n in range(writers)))
+    updates.cancel()
+    samples.sort()
+    return {
+        "seconds": statistics.median(samples),
+        "p99_seconds": samples[int(len(samples) * 0.99) - 1],
+        "samples": len(samples),
+    }
+
+
+def bench_latency(quick):
+    writers = 10 if quick else 100
+    return {f"latency/set_device_state/{writers}_writers": asyncio.run(_latency(writers, 100, 1_000))}
+
+
+def bench_memory(size):
+    layouts = ["legacy", "slotted"] + (["table"] if np is not None else [])
+    return {f"memory/{layout}": {"bytes_per_device": memory.measure(layout, size)} for layout in layouts}
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change against ``baseline``, returns the regressed names."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        key = "seconds" if "seconds" in result else "bytes_per_device"
+        ratio = result[key] / old[key]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<45} {old[key]:>12.6g} -> {result[key]:>12.6g} ({ratio - 1:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite for the simulation hot paths.")
+    parser.add_argument("--quick", action="store_true", help="small fleets only (up to 10k devices)")
+    parser.add_argument("--only", nargs="+", choices=["tick", "events", "latency", "memory"],
+                        help="run only these groups")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="compare against a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before a result counts as regression")
+    args = parser.parse_args(argv)
+
+    groups = args.only or ["tick", "events", "latency", "memory"]
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    results = {}
+    if "tick" in groups:
+        results.update(bench_tick(sizes, args.repeat))
+    if "events" in groups:
+        results.update(bench_events(1_000 if args.quick else 10_000, args.repeat))
+    if "latency" in groups:
+        results.update(bench_latency(args.quick))
+    if "memory" in groups:
+        results.update(bench_memory(10_000 if args.quick else 1_000_000))
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": getattr(np, "__version__", None),
+        "quick": args.quick,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        return 1 if regressions else 0
+    for name, result in sorted(results.items()):
+        print(f"{name:<45} " + "  ".join(f"{key}={value:.6g}" for key, value in result.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Helpers shared by the benchmark scripts."""
+from iot_simulator import SimulatedDevice
+
+# Share of sensors, switches and selects in a fleet
+MIXES = {
+    "mixed": (1, 1, 1),
+    "sensors": (1, 0, 0),
+    "switches": (0, 1, 0),
+}
+
+
+def make_fleet(count, mix="mixed"):
+    """Builds ``count`` devices with the device type ratio of ``mix``."""
+    sensors, switches, selects = MIXES[mix]
+    pattern = ["sensor"] * sensors + ["switch"] * switches + ["select"] * selects
+    devices = []
+    for n in range(count):
+        kind = pattern[n % len(pattern)]
+        if kind == "sensor":
+            devices.append(SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", 21.0))
+        elif kind == "switch":
+            devices.append(SimulatedDevice(f"light_{n}", f"Licht {n}", "switch", False))
+        else:
+            devices.append(SimulatedDevice(f"mode_{n}", f"Modus {n}", "select", "Eco"))
+    return devices
@@ -0,0 +1,81 @@
+"""Memory benchmark: bytes per device for the different storage layouts.
+
+Compares the original dict-based ``SimulatedDevice`` layout with the
+slotted device and the struct-of-arrays ``DeviceTable``.
+
+    python benchmarks/memory.py --devices 1000000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from iot_simulator import SimulatedDevice
+from iot_simulator.store import DeviceTable
+
+
+class LegacyDevice:
+    """The device layout before slots, kept here for comparison."""
+
+    def __init__(self, device_id, name, device_type, initial_state):
+        self.id = device_id
+        self.name = name
+        self.type = device_type
+        self.state = initial_state
+        self.simulation_enabled = True
+        self.unit = "°C" if device_type == "sensor" else None
+        self.options = ["Eco", "Comfort", "Boost"] if device_type == "select" else None
+
+
+def fleet_spec(count):
+    """Yields (id, name, type, state) tuples for a mixed fleet."""
+    for n in range(count):
+        if n % 3 == 0:
+            yield f"temp_{n}", f"Sensor {n}", "sensor", 20.0 + n % 50 / 10
+        elif n % 3 == 1:
+            yield f"light_{n}", f"Licht {n}", "switch", n % 2 == 0
+        else:
+            yield f"mode_{n}", f"Modus {n}", "select", "Eco"
+
+
+def build_objects(cls, count):
+    return {dev_id: cls(dev_id, name, kind, state) for dev_id, name, kind, state in fleet_spec(count)}
+
+
+def build_table(count):
+    table = DeviceTable(capacity=count)
+    for dev_id, name, kind, state in fleet_spec(count):
+        table.add(dev_id, name, kind, state)
+    return table
+
+
+LAYOUTS = {
+    "legacy": lambda count: build_objects(LegacyDevice, count),
+    "slotted": lambda count: build_objects(SimulatedDevice, count),
+    "table": build_table,
+}
+
+
+def measure(layout, count):
+    """Returns the bytes per device allocated while building ``layout``."""
+    gc.collect()
+    tracemalloc.start()
+    store = LAYOUTS[layout](count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100_000)
+    args = parser.parse_args()
+    baseline = None
+    for layout in LAYOUTS:
+        per_device = measure(layout, args.devices)
+        baseline = baseline or per_device
+        print(f"{layout:>8}: {per_device:8.1f} bytes/device ({per_device / baseline:.0%} of legacy)")
+
+
+if __name__ == "__main__":
+    main()
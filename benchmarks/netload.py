@@ -0,0 +1,147 @@
+"""Network load test: messages per second and end-to-end latency.
+
+Starts a hub with a ``HubServer`` on a local port, connects ``--clients``
+TCP clients that subscribe to all changes (or to ``--pattern``) and lets
+``--writers`` of them send ``set`` commands. Prints delivered changes and
+messages per second, the number of dropped messages and the latency from
+the change timestamp to its arrival at a client.
+
+    python benchmarks/netload.py --devices 10000 --clients 2000 --duration 10
+
+Clients run in the same process and on the same loop as the server, so the
+numbers include their parsing work. For several thousand clients raise the
+open file limit (``ulimit -n``), the script tries that itself.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import time
+
+from common import make_fleet
+from iot_simulator import SimulatedHub
+from iot_simulator.server import HubServer
+
+
+def raise_file_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+class Stats:
+    def __init__(self, clock):
+        self.clock = clock
+        self.messages = 0
+        self.changes = 0
+        self.dropped = 0
+        self.latencies = []
+
+    def observe(self, message):
+        op = message.get("op")
+        if op == "changes":
+            self.messages += 1
+            self.changes += len(message["changes"])
+            # One sample per message, the oldest change in it
+            self.latencies.append(self.clock.time() - message["changes"][0][2])
+        elif op == "dropped":
+            self.dropped += message["messages"]
+
+
+async def client(port, stats, subscription, stop):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 24)
+    writer.write(json.dumps({"op": "subscribe", **subscription}).encode() + b"\n")
+    try:
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            stats.observe(json.loads(line))
+    finally:
+        writer.close()
+
+
+async def command_writer(port, device_ids, rate, stop):
+    """Sends ``rate`` set commands per second over one reused connection."""
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    switches = [device_id for device_id in device_ids if device_id.startswith("light_")] or device_ids
+    try:
+        while not stop.is_set():
+            device_id = random.choice(switches)
+            writer.write(json.dumps({"op": "set", "id": device_id, "state": random.random() > 0.5}).encode() + b"\n")
+            await writer.drain()
+            await asyncio.sleep(1.0 / rate)
+    finally:
+        writer.close()
+
+
+def percentile(values, share):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def run(args):
+    hub = SimulatedHub(
+        vectorized=args.vectorized, compact=args.vectorized, devices=make_fleet(args.devices),
+        update_interval=args.interval,
+    )
+    stats = Stats(hub.clock)
+    stop = asyncio.Event()
+    subscription = {"pattern": args.pattern} if args.pattern else {}
+    async with HubServer(hub, port=0, max_buffer=args.max_buffer) as server:
+        clients = []
+        for start in range(0, args.clients, 500):
+            # Connect in waves to stay below the listen backlog
+            clients += [
+                asyncio.create_task(client(server.port, stats, subscription, stop))
+                for _ in range(start, min(args.clients, start + 500))
+            ]
+            await asyncio.sleep(0.05)
+        while server.clients < args.clients:
+            await asyncio.sleep(0.05)
+        writers = [
+            asyncio.create_task(command_writer(server.port, list(hub.devices), args.rate, stop))
+            for _ in range(args.writers)
+        ]
+        updates = asyncio.create_task(hub.start_background_updates())
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        updates.cancel()
+        for task in writers + clients:
+            task.cancel()
+        await asyncio.gather(updates, *writers, *clients, return_exceptions=True)
+    return stats, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=1_000)
+    parser.add_argument("--clients", type=int, default=1_000)
+    parser.add_argument("--writers", type=int, default=10, help="clients that send set commands")
+    parser.add_argument("--rate", type=float, default=50.0, help="set commands per second and writer")
+    parser.add_argument("--interval", type=float, default=1.0, help="hub update interval in seconds")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to measure")
+    parser.add_argument("--pattern", help="id glob every client subscribes to, default all")
+    parser.add_argument("--max-buffer", type=int, default=1 << 20, help="bytes queued per client")
+    parser.add_argument("--vectorized", action="store_true", help="use the NumPy engine")
+    args = parser.parse_args()
+    raise_file_limit(2 * (args.clients + args.writers) + 64)
+    stats, elapsed = asyncio.run(run(args))
+    latencies = [value * 1000 for value in stats.latencies]
+    print(f"clients            {args.clients:>12,}")
+    print(f"changes / s        {stats.changes / elapsed:>12,.0f}")
+    print(f"messages / s       {stats.messages / elapsed:>12,.0f}")
+    print(f"dropped messages   {stats.dropped:>12,}")
+    print(f"latency p50 ms     {percentile(latencies, 0.5):>12.2f}")
+    print(f"latency p99 ms     {percentile(latencies, 0.99):>12.2f}")
+    print(f"latency max ms     {max(latencies, default=float('nan')):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
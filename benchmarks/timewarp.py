@@ -0,0 +1,41 @@
+"""Time-warp benchmark: simulated seconds per wall-clock second.
+
+Runs a hub on a ``VirtualClock`` as fast as possible for a range of fleet
+sizes and prints how much simulated time passes per real second.
+
+    python benchmarks/timewarp.py --simulated 3600 --sizes 10 1000 100000
+"""
+import argparse
+import asyncio
+import time
+
+from common import make_fleet
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock
+
+
+def run(count, simulated, vectorized):
+    clock = VirtualClock(start=0.0)
+    hub = SimulatedHub(vectorized=vectorized, compact=vectorized, devices=make_fleet(count), clock=clock)
+    events = [0]
+    hub.register_batch_callback(lambda batch: events.__setitem__(0, events[0] + len(batch)))
+    started = time.perf_counter()
+    asyncio.run(hub.start_background_updates(until=simulated))
+    elapsed = time.perf_counter() - started
+    return simulated / elapsed, events[0] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--simulated", type=float, default=3600.0, help="simulated seconds per run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 10_000, 100_000])
+    parser.add_argument("--vectorized", action="store_true", help="use the NumPy engine")
+    args = parser.parse_args()
+    print(f"{'devices':>10} {'sim s / wall s':>16} {'events / s':>14}")
+    for count in args.sizes:
+        speedup, rate = run(count, args.simulated, args.vectorized)
+        print(f"{count:>10} {speedup:>16,.0f} {rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,6 @@
-from .hub import SimulatedHub, SimulatedDevice
\ No newline at end of file
+from .hub import SimulatedHub, SimulatedDevice
+from .engine import VectorizedEngine
+from .store import DeviceTable, DeviceView
+from .events import ChangeBatch
+from .sharding import ShardedHub
+from .reporting import ReportingPolicy
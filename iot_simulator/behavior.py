@@ -0,0 +1,519 @@
+"""Pluggable behavior models.
+
+Without a model a device follows the built-in rules of the hub: sensors do
+a +/-0.2 random walk, switches flip with 10 % probability, everything else
+keeps its state. ``hub.set_behavior(model, device_id=..., device_type=...)``
+replaces that for a device or a device type.
+
+A model steps all its devices of a tick at once::
+
+    new_states = model.step(states, dt, rng, now)
+
+``states`` is an array of the current states, ``dt`` an array with the
+seconds since each device's last step (0 on its first), ``rng`` a
+``BatchRandom`` with one random stream per device and ``now`` the clock
+time. It returns the new states as an array of the same length. Models
+with ``per_device = True`` also get ``slots``, a stable number per device:
+its position among all devices of the model in fleet order, no matter
+which of them are stepped in a tick.
+
+Models are registered by name, so fleet configs can refer to them::
+
+    {"model": "daily_cycle", "mean": 21, "amplitude": 3}
+
+Built in are ``random_walk``, ``toggle``, ``daily_cycle``, ``markov`` and
+``trace`` (playback of a CSV or binary file, memory-mapped).
+"""
+import math
+import mmap
+import os
+import random
+
+from .engine import draw_uniform, round2
+from .rng import bulk_random
+from .store import KIND_OTHER, KIND_SENSOR, KIND_SWITCH, np, require_numpy
+
+MODELS = {}
+
+_DAY = 86400.0
+
+
+def register_model(name):
+    """Class decorator that makes a model available under ``name``."""
+
+    def decorator(cls):
+        MODELS[name] = cls
+        cls.name = name
+        return cls
+
+    return decorator
+
+
+def create_model(spec):
+    """A model from a name, a ``{"model": name, **params}`` dict or a model instance."""
+    if isinstance(spec, str):
+        spec = {"model": spec}
+    if not isinstance(spec, dict):
+        return spec
+    params = dict(spec)
+    name = params.pop("model", None)
+    if name not in MODELS:
+        raise ValueError(f"Unknown behavior model {name!r}, known: {', '.join(sorted(MODELS))}")
+    return MODELS[name](**params)
+
+
+def as_states(states):
+    """Array of a list of states: ``bool``, ``float64`` or ``object`` if mixed."""
+    if all(isinstance(state, bool) for state in states):
+        return np.array(states, dtype=bool)
+    if all(isinstance(state, (int, float)) and not isinstance(state, bool) for state in states):
+        return np.array(states, dtype=np.float64)
+    array = np.empty(len(states), dtype=object)
+    array[:] = states
+    return array
+
+
+class BatchRandom:
+    """Uniform random numbers for a batch of devices, one stream per device.
+
+    Every call returns one number per device and moves each device's
+    stream on by one, so a device gets the same numbers no matter which
+    other devices are in the batch (with a hub seed).
+    """
+
+    def __init__(self, count, draw):
+        self.count = count
+        self._draw = draw
+
+    def random(self):
+        return self._draw(self.count)
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+    def normal(self, loc=0.0, scale=1.0):
+        # Box-Muller, two numbers per device
+        radius = np.sqrt(-2.0 * np.log1p(-self.random()))
+        return loc + scale * radius * np.cos(2.0 * math.pi * self.random())
+
+
+class BehaviorModel:
+    """Base class, subclasses implement ``step``."""
+
+    name = None
+    per_device = False  # True: step() also gets the devices' slots
+
+    def step(self, states, dt, rng, now):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+
+@register_model("random_walk")
+class RandomWalk(BehaviorModel):
+    """Adds a uniform step in ``[-step, step]``, rounded to ``decimals``.
+
+    With the defaults this is the built-in sensor rule, a step never
+    leaves the value unchanged. ``low``/``high`` clip the value.
+    """
+
+    def __init__(self, step=0.2, decimals=2, low=None, high=None):
+        self.step_size = step
+        self.decimals = decimals
+        self.low = low
+        self.high = high
+
+    def step(self, states, dt, rng, now):
+        old = states.astype(np.float64)
+        delta = round2(rng.uniform(-self.step_size, self.step_size), self.decimals)
+        new = round2(old + delta, self.decimals)
+        same = new == old
+        if same.any():
+            push = np.where(delta[same] <= 0, self.step_size, -self.step_size)
+            new[same] = round2(old[same] + push, self.decimals)
+        if self.low is not None or self.high is not None:
+            new = np.clip(new, self.low, self.high)
+        return new
+
+
+@register_model("toggle")
+class Toggle(BehaviorModel):
+    """Flips boolean states with ``probability`` per step (built-in switch rule with 0.1)."""
+
+    def __init__(self, probability=0.1):
+        self.probability = probability
+
+    def step(self, states, dt, rng, now):
+        flip = rng.random() > 1.0 - self.probability
+        return states.astype(bool) ^ flip
+
+
+@register_model("daily_cycle")
+class DailyCycle(BehaviorModel):
+    """Sinusoidal day curve plus noise, e.g. room or outside temperatures.
+
+    The value is ``mean + amplitude * cos(2 pi (hour - peak_hour) / 24)``
+    plus normal noise with ``noise`` standard deviation, hours in UTC of
+    the clock time.
+    """
+
+    def __init__(self, mean=21.0, amplitude=2.0, peak_hour=15.0, noise=0.1, decimals=2):
+        self.mean = mean
+        self.amplitude = amplitude
+        self.peak_hour = peak_hour
+        self.noise = noise
+        self.decimals = decimals
+
+    def step(self, states, dt, rng, now):
+        hour = (now % _DAY) / 3600.0
+        base = self.mean + self.amplitude * math.cos(2.0 * math.pi * (hour - self.peak_hour) / 24.0)
+        values = base + rng.normal(0.0, self.noise) if self.noise else np.full(len(states), base)
+        return values if self.decimals is None else round2(values, self.decimals)
+
+
+@register_model("markov")
+class MarkovChain(BehaviorModel):
+    """Discrete states with transition probabilities per step.
+
+        MarkovChain({"Eco": {"Comfort": 0.05}, "Comfort": {"Eco": 0.1, "Boost": 0.02},
+                     "Boost": {"Comfort": 0.5}})
+
+    The rest of each row's probability is the chance to stay, states not
+    in ``transitions`` never change.
+    """
+
+    def __init__(self, transitions):
+        names = list(transitions)
+        for targets in transitions.values():
+            names += [target for target in targets if target not in names]
+        self.names = names
+        self._index = {name: i for i, name in enumerate(names)}
+        self._cumulative = np.zeros((len(names) + 1, len(names)))  # Last row: unknown states
+        for name, targets in transitions.items():
+            row = np.zeros(len(names))
+            for target, probability in targets.items():
+                row[self._index[target]] = probability
+            if row.sum() > 1.0 + 1e-9:
+                raise ValueError(f"Transition probabilities of {name!r} add up to more than 1")
+            self._cumulative[self._index[name]] = np.cumsum(row)
+        self._targets = np.empty(len(names), dtype=object)
+        self._targets[:] = names
+
+    def step(self, states, dt, rng, now):
+        index = self._index
+        codes = np.array([index.get(state, -1) for state in states.tolist()], dtype=np.intp)
+        draws = rng.random()
+        cumulative = self._cumulative[codes]
+        # First target whose cumulative probability exceeds the draw
+        target = (draws[:, None] >= cumulative).sum(axis=1)
+        move = (codes >= 0) & (target < len(self.names)) & (draws < cumulative[:, -1])
+        new = states.astype(object)
+        new[move] = self._targets[target[move]]
+        return new
+
+
+class _CsvTrace:
+    """Rows of a CSV file, parsed one at a time from a memory map."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._start = 0
+        first = self._line(0)[0]
+        if first is not None and self._parse(first) is None:
+            self._start = self._line(0)[1]  # Skip the header
+        self.rows = None  # Known once the end was reached
+        self._rewind()
+
+    def _rewind(self):
+        self._row = -1
+        self._offset = self._start
+        self._values = None
+
+    def _line(self, offset):
+        data = self._data
+        if offset >= len(data):
+            return None, offset
+        end = data.find(b"\n", offset)
+        if end == -1:
+            end = len(data)
+        return data[offset:end].strip(), end + 1
+
+    @staticmethod
+    def _parse(line):
+        try:
+            return np.array([float(field) for field in line.split(b",")])
+        except ValueError:
+            return None
+
+    def row(self, row, loop):
+        if self.rows is not None:
+            row = row % self.rows if loop else min(row, self.rows - 1)
+        if row < self._row:
+            self._rewind()
+        while self._row < row:
+            line, offset = self._line(self._offset)
+            if line is None:
+                if self._row < 0:
+                    raise ValueError("Trace file has no rows")
+                self.rows = self._row + 1
+                return self.row(row, loop)
+            self._offset = offset
+            if not line:
+                continue
+            self._row += 1
+            if self._row == row:
+                self._values = self._parse(line)
+                if self._values is None:
+                    raise ValueError(f"Cannot parse trace row {row}: {line[:80]!r}")
+        return self._values
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+
+class _ArrayTrace:
+    """Rows of a ``.npy`` or raw ``float64`` file through ``np.memmap``."""
+
+    def __init__(self, path, columns):
+        if str(path).endswith(".npy"):
+            data = np.load(path, mmap_mode="r")
+        else:
+            data = np.memmap(path, dtype="<f8", mode="r")
+            data = data[: len(data) // columns * columns].reshape(-1, columns)
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        if not len(data):
+            raise ValueError("Trace file has no rows")
+        self._data = data
+        self.rows = len(data)
+
+    def row(self, row, loop):
+        row = row % self.rows if loop else min(row, self.rows - 1)
+        return np.asarray(self._data[row], dtype=np.float64)
+
+    def close(self):
+        pass
+
+
+@register_model("trace")
+class TracePlayback(BehaviorModel):
+    """Plays back recorded values, one file row every ``period`` seconds.
+
+    ``path`` is a CSV file (one column per trace, an optional header line)
+    or a binary file: ``.npy`` or raw little-endian ``float64`` with
+    ``columns`` values per row. The file is memory-mapped, only the current
+    row is read. The n-th device of the model (in fleet order) plays column
+    ``n % columns``.
+    Playback starts at the first step, with ``loop`` it starts over at the
+    end, else the last row is held.
+    """
+
+    def __init__(self, path, period=1.0, loop=True, columns=1):
+        require_numpy("Trace playback")
+        path = os.fspath(path)
+        self.path = path
+        self.period = period
+        self.loop = loop
+        if path.endswith((".csv", ".txt")):
+            self._trace = _CsvTrace(path)
+        else:
+            self._trace = _ArrayTrace(path, columns)
+        self._started = None
+
+    per_device = True
+
+    def step(self, states, dt, rng, now, slots=None):
+        if self._started is None:
+            self._started = now
+        row = self._trace.row(int((now - self._started) // self.period), self.loop)
+        if slots is None:
+            slots = np.arange(len(states))
+        return row[slots % len(row)]
+
+    def close(self):
+        self._trace.close()
+
+
+class Behaviors:
+    """Models assigned to devices and types, a device model wins over its type."""
+
+    def __init__(self):
+        self.by_device = {}
+        self.by_type = {}
+        self.stepped_at = {}  # device id -> clock time of the last model step
+        self._stepped_rows = None  # The same per table row
+        self._table_groups = None
+        self._device_slots = None  # (devices, size, {device id: slot}) for dict hubs
+
+    def __bool__(self):
+        return bool(self.by_device or self.by_type)
+
+    def set(self, model, device_id=None, device_type=None):
+        require_numpy("Behavior models")
+        target = self.by_device if device_id is not None else self.by_type
+        key = device_id if device_id is not None else device_type
+        if key is None:
+            raise ValueError("Give a device_id or a device_type")
+        if model is None:
+            target.pop(key, None)
+        else:
+            target[key] = create_model(model)
+        self._table_groups = None
+        self._device_slots = None
+
+    def model_for(self, device_id, device_type):
+        model = self.by_device.get(device_id)
+        return model if model is not None else self.by_type.get(device_type)
+
+    def models(self):
+        """All assigned models, each once, in assignment order."""
+        seen = {}
+        for model in (*self.by_type.values(), *self.by_device.values()):
+            seen.setdefault(id(model), model)
+        return list(seen.values())
+
+    def table_groups(self, table):
+        """``(modeled, [(model, rows), ...])`` for a ``DeviceTable``, cached."""
+        cached = self._table_groups
+        if cached is not None and cached[0] is table and cached[1] == len(table):
+            return cached[2]
+        size = len(table)
+        codes = np.full(size, -1, dtype=np.intp)
+        models = self.models()
+        number = {id(model): k for k, model in enumerate(models)}
+        type_codes = table.type_codes[:size]
+        for device_type, model in self.by_type.items():
+            if device_type in table.types:
+                codes[type_codes == table.types.index(device_type)] = number[id(model)]
+        for device_id, model in self.by_device.items():
+            i = table.find(device_id)
+            if i is not None:
+                codes[i] = number[id(model)]
+        groups = [(model, np.flatnonzero(codes == k)) for k, model in enumerate(models)]
+        result = (codes >= 0, groups)
+        self._table_groups = (table, size, result)
+        return result
+
+    def _stepped(self, size):
+        stepped = self._stepped_rows
+        if stepped is None or len(stepped) < size:
+            grown = np.full(size, np.nan)
+            if stepped is not None:
+                grown[: len(stepped)] = stepped
+            stepped = self._stepped_rows = grown
+        return stepped
+
+    def step_table(self, engine, indices, rng, now):
+        """Steps the modeled rows of ``engine.table``, returns the changed and the stepped rows."""
+        table = engine.table
+        size = len(table)
+        stepped_at = self._stepped(size)
+        changed = []
+        stepped = []
+        for model, all_rows in self.table_groups(table)[1]:
+            rows = all_rows
+            if indices is not None:
+                rows = np.intersect1d(rows, indices, assume_unique=True)
+            rows = rows[table.enabled[rows]]
+            if not len(rows):
+                continue
+            stepped.append(rows)
+            dt = now - stepped_at[rows]
+            dt[np.isnan(dt)] = 0.0
+            stepped_at[rows] = now
+            kinds = table.kinds[rows]
+            if (kinds == KIND_SENSOR).all():
+                old = table.values[rows]
+            elif (kinds == KIND_SWITCH).all():
+                old = table.values[rows] != 0.0
+            else:
+                old = as_states([table.get_state(i) for i in rows.tolist()])
+            if engine.seed is None:
+                draw = lambda count: draw_uniform(rng, count)  # noqa: E731
+            else:
+                keys, counters = engine._streams(size)
+
+                def draw(count, rows=rows):
+                    values = bulk_random(keys[rows], counters[rows])
+                    counters[rows] += np.uint64(1)
+                    return values
+
+            if model.per_device:
+                slots = np.searchsorted(all_rows, rows)
+                new = model.step(old, dt, BatchRandom(len(rows), draw), now, slots=slots)
+            else:
+                new = model.step(old, dt, BatchRandom(len(rows), draw), now)
+            new = np.asarray(new)
+            moved = new != old
+            if not moved.any():
+                continue
+            changed_rows = rows[moved]
+            if new.dtype != object and (kinds != KIND_OTHER).all():
+                table.values[changed_rows] = new[moved]
+            else:
+                for i, state in zip(changed_rows.tolist(), new[moved].tolist()):
+                    table.set_state(i, state)
+            changed.append(changed_rows)
+        none = np.zeros(0, dtype=np.intp)
+        return (
+            np.concatenate(changed) if changed else none,
+            np.concatenate(stepped) if stepped else none,
+        )
+
+    def _slots(self, devices):
+        """Position of every modeled device among the devices of its model, cached."""
+        cached = self._device_slots
+        if cached is not None and cached[0] is devices and cached[1] == len(devices):
+            return cached[2]
+        counts = {}
+        slots = {}
+        for device_id, device in devices.items():
+            model = self.model_for(device_id, device.type)
+            if model is not None:
+                slots[device_id] = counts.get(id(model), 0)
+                counts[id(model)] = slots[device_id] + 1
+        self._device_slots = (devices, len(devices), slots)
+        return slots
+
+    def step_devices(self, hub, device_ids, now):
+        """Steps the modeled devices of a device dict, returns the changed ``(id, state)``."""
+        devices = hub.devices
+        groups = {}
+        for device_id in devices if device_ids is None else device_ids:
+            device = devices.get(device_id)
+            if device is not None and device.simulation_enabled:
+                model = self.model_for(device_id, device.type)
+                if model is not None:
+                    groups.setdefault(id(model), []).append(device_id)
+        changed = []
+        stepped_at = self.stepped_at
+        for model in self.models():
+            ids = groups.get(id(model))
+            if not ids:
+                continue
+            old = as_states([devices[device_id].state for device_id in ids])
+            dt = np.array([now - stepped_at.get(device_id, now) for device_id in ids])
+            for device_id in ids:
+                stepped_at[device_id] = now
+            if hub.seed is None:
+                draw = lambda count: draw_uniform(random, count)  # noqa: E731
+            else:
+                sources = [hub._random(device_id) for device_id in ids]
+
+                def draw(count, sources=sources):
+                    return np.array([source.random() for source in sources])
+
+            if model.per_device:
+                slots = self._slots(devices)
+                slots = np.array([slots[device_id] for device_id in ids], dtype=np.intp)
+                new = model.step(old, dt, BatchRandom(len(ids), draw), now, slots=slots)
+            else:
+                new = model.step(old, dt, BatchRandom(len(ids), draw), now)
+            new = np.asarray(new)
+            for device_id, state in zip(ids, new.tolist()):
+                if devices[device_id].update_state(state):
+                    changed.append((device_id, state))
+        return changed
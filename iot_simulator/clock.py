@@ -0,0 +1,62 @@
+"""Clocks for the simulation loop.
+
+The hub asks its clock for the current time (used for scheduling and as the
+timestamp of every change) and lets the clock do the waiting. ``WallClock``
+follows real time. ``VirtualClock`` jumps straight to the next due time, or
+runs ``speed`` times faster than real time, so a simulated day can be done
+in seconds.
+"""
+import asyncio
+import time
+
+
+class WallClock:
+    """Real time, as epoch seconds derived from the monotonic loop clock."""
+
+    def __init__(self):
+        # Monotonic for scheduling, shifted to epoch seconds for timestamps
+        self._offset = time.time() - time.monotonic()
+
+    def time(self):
+        return time.monotonic() + self._offset
+
+    async def wait(self, event, deadline):
+        """Waits until ``deadline`` or until ``event`` is set."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout=max(0.0, deadline - self.time()))
+        except TimeoutError:
+            pass
+
+
+class VirtualClock:
+    """Simulated time that starts at ``start`` (epoch seconds, default now).
+
+    With ``speed=None`` the clock jumps to the next deadline right away and
+    the hub runs as fast as the CPU allows. With a ``speed`` factor it waits
+    ``delay / speed`` real seconds for every ``delay`` simulated seconds.
+    """
+
+    def __init__(self, start=None, speed=None):
+        self.now = time.time() if start is None else start
+        self.speed = speed
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    async def wait(self, event, deadline):
+        delay = max(0.0, deadline - self.now)
+        if not self.speed:
+            # Still yield, so other tasks get to run between ticks
+            await asyncio.sleep(0)
+            if not event.is_set():
+                self.now += delay
+            return
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(event.wait(), timeout=delay / self.speed)
+            self.now += min(delay, (time.monotonic() - started) * self.speed)
+        except TimeoutError:
+            self.now += delay
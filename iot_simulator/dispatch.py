@@ -0,0 +1,216 @@
+"""Non-blocking delivery of state changes to slow subscribers.
+
+Every ``Subscription`` owns a bounded buffer and a delivery task. The hub
+only appends to the buffer, it never waits on a consumer while a tick is
+computed. ``async def`` callbacks are awaited by the delivery task, plain
+callbacks run in the default executor, up to ``_CHUNK`` changes per hop,
+so a slow callback of either kind never holds up the event loop. Plain
+callbacks therefore run in another thread. What happens when the buffer
+is full is chosen per subscriber:
+
+* ``"block"``: the background loop waits for space before it starts the
+  next tick (back pressure on the simulation). The hub cannot wait within
+  a tick, so changes beyond ``maxsize`` are coalesced to the latest state
+  per device until there is room again (counted in ``coalesced``). The
+  buffer holds at most ``maxsize`` plus one entry per device.
+* ``"drop_oldest"``: the oldest pending change is discarded.
+* ``"coalesce"``: only the latest state per device is kept, so the buffer
+  never holds more than one entry per device. Without ``maxsize`` it is
+  bounded by the fleet size alone.
+
+``EventStream`` uses the same buffer without a task, the consumer pulls
+the changes with ``async for``.
+"""
+import asyncio
+import inspect
+import logging
+import time
+from collections import deque
+
+_LOGGER = logging.getLogger(__name__)
+
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COALESCE = "coalesce"
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_COALESCE)
+
+# Changes a plain callback gets per trip to the executor
+_CHUNK = 256
+
+
+class Subscription:
+    """Bounded buffer plus delivery task for one sync or async callback."""
+
+    def __init__(self, callback, maxsize=1000, policy=POLICY_DROP_OLDEST, metrics=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, use one of {POLICIES}")
+        if maxsize is None and policy != POLICY_COALESCE:
+            raise ValueError("Only the coalesce policy can do without maxsize")
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.callback = callback
+        self.maxsize = maxsize
+        self.policy = policy
+        self.metrics = metrics  # HubMetrics that time the callback, or None
+        self._threaded = callback is not None and not (
+            inspect.iscoroutinefunction(callback)
+            or inspect.iscoroutinefunction(getattr(callback, "__call__", None))
+        )
+        # Coalescing keeps a dict of pending device ids in arrival order
+        self._pending = {} if policy == POLICY_COALESCE else deque()
+        self._overflow = {}  # Blocking only, latest state per device beyond maxsize
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task = None
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._pending) + len(self._overflow)
+
+    @property
+    def full(self):
+        return self.maxsize is not None and len(self._pending) >= self.maxsize
+
+    def offer(self, device_id, state):
+        """Queues a change without ever waiting."""
+        pending = self._pending
+        if self.policy == POLICY_COALESCE:
+            if device_id not in pending and self.full:
+                del pending[next(iter(pending))]
+                self.dropped += 1
+            pending[device_id] = state
+        elif self.policy == POLICY_BLOCK and self.full:
+            if device_id in self._overflow:
+                self.coalesced += 1
+            self._overflow[device_id] = state
+        else:
+            if self.policy == POLICY_DROP_OLDEST and len(pending) >= self.maxsize:
+                pending.popleft()
+                self.dropped += 1
+            pending.append((device_id, state))
+            if self.full:
+                self._space.clear()
+        self._ready.set()
+
+    def _pop(self):
+        if self.policy == POLICY_COALESCE:
+            device_id = next(iter(self._pending))
+            return device_id, self._pending.pop(device_id)
+        event = self._pending.popleft()
+        if self._overflow:
+            # Refill from the overflow, the queue stays full until it is empty
+            device_id = next(iter(self._overflow))
+            self._pending.append((device_id, self._overflow.pop(device_id)))
+        return event
+
+    async def wait_for_space(self):
+        """Waits until a blocking subscription has room again."""
+        if self.policy == POLICY_BLOCK:
+            await self._space.wait()
+
+    def start(self):
+        """Starts the delivery task on the running loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._deliver())
+        return self
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _run_chunk(self, events):
+        """Calls a plain callback for ``events`` in an executor thread, returns the durations."""
+        durations = []
+        for device_id, state in events:
+            started = time.perf_counter()
+            try:
+                self.callback(device_id, state)
+            except Exception:
+                _LOGGER.exception("Subscriber %r failed for %s", self.callback, device_id)
+            durations.append(time.perf_counter() - started)
+        return durations
+
+    async def _deliver(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            while self._pending and self._threaded:
+                events = [self._pop() for _ in range(min(len(self._pending), _CHUNK))]
+                if not self.full:
+                    self._space.set()
+                durations = await loop.run_in_executor(None, self._run_chunk, events)
+                if self.metrics is not None:
+                    for seconds in durations:
+                        self.metrics.observe_callback(self.callback, seconds)
+                self.delivered += len(events)
+            while self._pending:
+                device_id, state = self._pop()
+                if not self.full:
+                    self._space.set()
+                started = time.perf_counter()
+                try:
+                    result = self.callback(device_id, state)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    _LOGGER.exception("Subscriber %r failed for %s", self.callback, device_id)
+                if self.metrics is not None:
+                    self.metrics.observe_callback(self.callback, time.perf_counter() - started)
+                self.delivered += 1
+                # Let the simulation and other subscribers run in between
+                await asyncio.sleep(0)
+            self._ready.clear()
+
+
+class EventStream(Subscription):
+    """Subscription that is consumed with ``async for`` instead of a callback.
+
+    Iterating yields ``(device_id, state)`` tuples and waits while nothing
+    is pending. ``close`` (or leaving ``async with``) ends the iteration
+    and unregisters the stream from its hub.
+    """
+
+    def __init__(self, maxsize=None, policy=POLICY_COALESCE, hub=None):
+        super().__init__(None, maxsize, policy)
+        self.closed = False
+        self._hub = hub
+
+    def start(self):
+        return self  # Nothing to run, the consumer pulls
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._ready.set()
+        self._space.set()  # A blocked hub must not wait for a closed stream
+        hub, self._hub = self._hub, None
+        if hub is not None:
+            hub.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._pending:
+            if self.closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        if self.closed:
+            raise StopAsyncIteration
+        event = self._pop()
+        if not self.full:
+            self._space.set()
+        self.delivered += 1
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
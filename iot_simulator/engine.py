@@ -0,0 +1,165 @@
+"""NumPy backed tick engine for large fleets.
+
+The engine keeps sensor values, switch states and simulation flags of all
+devices in contiguous arrays and computes a whole simulation tick at once.
+It consumes the same random numbers in the same order as the per-device
+loop in ``SimulatedHub._background_update_once``, so for a given seed both
+paths produce identical states.
+"""
+import random
+
+from .rng import bulk_keys, bulk_random
+from .store import DeviceTable, KIND_OTHER, KIND_SENSOR, KIND_SWITCH, np, require_numpy
+
+
+def draw_uniform(rng, count):
+    """Draws ``count`` values from ``rng`` exactly like ``rng.random()`` would.
+
+    ``rng`` is a ``random.Random`` instance or the ``random`` module itself.
+    Its Mersenne Twister state is handed to numpy, the values are drawn in
+    bulk and the advanced state is written back.
+    """
+    version, internal, gauss = rng.getstate()
+    legacy = np.random.RandomState()
+    legacy.set_state(("MT19937", np.array(internal[:-1], dtype=np.uint32), internal[-1]))
+    values = legacy.random_sample(count)
+    _, key, pos = legacy.get_state()[:3]
+    rng.setstate((version, tuple(key.tolist()) + (int(pos),), gauss))
+    return values
+
+
+def round2(values, decimals=2):
+    """Rounds to ``decimals`` with the same result as Python's ``round(x, 2)``.
+
+    ``np.round`` scales by 100 first, which can differ from Python's
+    correctly rounded result right at the half-way points. Those few values
+    are recomputed with ``round``.
+    """
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0 ** decimals
+    borderline = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in borderline:
+        rounded[i] = round(float(values[i]), decimals)
+    return rounded
+
+
+class VectorizedEngine:
+    """Simulates a whole tick in bulk on the arrays of a ``DeviceTable``.
+
+    If the hub stores its devices in a ``DeviceTable`` the engine works on
+    it directly. For a plain dict of device objects it keeps a private copy,
+    and the hub writes changed states back to the objects.
+
+    With a ``seed`` every device draws from its own stream (see
+    ``iot_simulator.rng``) instead of the shared ``random`` module.
+    """
+
+    def __init__(self, devices, seed=None):
+        require_numpy("The vectorized engine")
+        self.devices = devices
+        self.shared = isinstance(devices, DeviceTable)
+        self.table = devices if self.shared else DeviceTable.from_devices(devices)
+        self._size = len(devices)
+        self.seed = seed
+        self.rng_keys = np.zeros(0, dtype=np.uint64)
+        self.rng_counters = np.zeros(0, dtype=np.uint64)
+        # Rows that drew random numbers in the last tick, their streams moved on
+        self.advanced = np.zeros(0, dtype=np.intp)
+
+    def _streams(self, size):
+        """Stream keys and counters, extended for rows added since the last tick."""
+        known = len(self.rng_keys)
+        if known < size:
+            self.rng_keys = np.concatenate((self.rng_keys, bulk_keys(self.seed, self.table.ids[known:size])))
+            self.rng_counters = np.concatenate((self.rng_counters, np.zeros(size - known, dtype=np.uint64)))
+        return self.rng_keys, self.rng_counters
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def ids(self):
+        return self.table.ids
+
+    def matches(self, devices):
+        """Whether the engine was built for this device mapping."""
+        return devices is self.devices and (self.shared or len(devices) == self._size)
+
+    def indices(self, device_ids):
+        """Sorted row indices of ``device_ids``, unknown ids are ignored.
+
+        An array is taken as rows already, see ``SimulatedHub._default_group``.
+        """
+        if isinstance(device_ids, np.ndarray):
+            return device_ids
+        index = self.table.index
+        found = [index[dev_id] for dev_id in device_ids if dev_id in index]
+        return np.sort(np.array(found, dtype=np.intp))
+
+    def set_state(self, device_id, new_state):
+        i = self.table.find(device_id)
+        if i is not None and not self.shared:
+            self.table.set_state(i, new_state)
+
+    def set_enabled(self, device_id, enable):
+        i = self.table.find(device_id)
+        if i is not None and not self.shared:
+            self.table.enabled[i] = enable
+
+    def tick(self, rng=random, indices=None, behaviors=None, now=0.0):
+        """Runs one simulation step and returns the indices of changed devices.
+
+        ``indices`` (sorted) restricts the step to a subset of the devices.
+        Rows with a model in ``behaviors`` (see ``iot_simulator.behavior``)
+        are stepped by their model after the built-in rules.
+        """
+        table = self.table
+        size = len(table)
+        if indices is None:
+            active = np.flatnonzero(table.enabled[:size] & (table.kinds[:size] != KIND_OTHER))
+        else:
+            active = indices[table.enabled[indices] & (table.kinds[indices] != KIND_OTHER)]
+        if not behaviors:
+            self.advanced = active
+            return self._builtin_step(active, rng)
+        modeled = behaviors.table_groups(table)[0]
+        builtin = active[~modeled[active]]
+        changed = self._builtin_step(builtin, rng)
+        stepped, self.advanced = behaviors.step_table(self, indices, rng, now)
+        if len(self.advanced):
+            self.advanced = np.concatenate((builtin, self.advanced))
+        else:
+            self.advanced = builtin
+        return np.sort(np.concatenate((changed, stepped))) if len(stepped) else changed
+
+    def _builtin_step(self, active, rng):
+        """Sensor random walk and switch flips for the ``active`` rows."""
+        if not len(active):
+            return active
+        table = self.table
+        size = len(table)
+        values = table.values[:size]
+        if self.seed is None:
+            draws = draw_uniform(rng, len(active))
+        else:
+            keys, counters = self._streams(size)
+            draws = bulk_random(keys[active], counters[active])
+            counters[active] += np.uint64(1)
+        kinds = table.kinds[active]
+
+        sensors = kinds == KIND_SENSOR
+        s_idx = active[sensors]
+        old = values[s_idx]
+        # Same formula as random.uniform(-0.2, 0.2)
+        delta = round2(-0.2 + 0.4 * draws[sensors])
+        new = round2(old + delta)
+        same = new == old
+        if same.any():
+            # Never return the old value, push in the opposite direction instead
+            new[same] = round2(old[same] + np.where(delta[same] <= 0, 0.2, -0.2))
+        values[s_idx] = new
+
+        flipped = active[(kinds == KIND_SWITCH) & (draws > 0.9)]
+        values[flipped] = 1.0 - values[flipped]
+
+        return np.sort(np.concatenate((s_idx[new != old], flipped)))
@@ -0,0 +1,133 @@
+"""Batches of state changes.
+
+A ``ChangeBatch`` holds all changes of one tick (or of one flush interval)
+and is handed to batch callbacks in a single call. Iterating it yields
+``(device_id, state, timestamp)`` tuples. When the vectorized engine
+produced the batch it also exposes column arrays: ``indices`` (rows of the
+device table) and ``values`` (numeric states, meaningless for rows with
+other states). The Python lists are then only built if somebody asks for them.
+"""
+from .store import KIND_OTHER, KIND_SWITCH
+
+
+class ChangeBatch:
+    """State changes as columns, iterable as ``(device_id, state, timestamp)``."""
+
+    __slots__ = ("_device_ids", "_states", "_timestamps", "table", "indices", "values", "kinds")
+
+    def __init__(self, device_ids=(), states=(), timestamps=()):
+        self._device_ids = list(device_ids)
+        self._states = list(states)
+        self._timestamps = list(timestamps)
+        self.table = None
+        self.indices = None
+        self.values = None
+        self.kinds = None
+
+    @classmethod
+    def from_table(cls, table, indices, timestamp):
+        """Batch of numeric table rows, the Python lists are built lazily."""
+        batch = cls.__new__(cls)
+        batch._device_ids = batch._states = None
+        batch._timestamps = timestamp
+        batch.table = table
+        batch.indices = indices
+        # Copies, later ticks do not change the batch
+        batch.values = table.values[indices]
+        batch.kinds = table.kinds[indices]
+        if (batch.kinds == KIND_OTHER).any():
+            # Non-numeric states are not in the columns, take them right away
+            objects = table.objects
+            batch._states = [
+                objects[i] if kind == KIND_OTHER else bool(value) if kind == KIND_SWITCH else value
+                for i, kind, value in zip(indices.tolist(), batch.kinds.tolist(), batch.values.tolist())
+            ]
+        return batch
+
+    @classmethod
+    def concat(cls, batches):
+        """Merges several batches into one, keeping their order."""
+        if len(batches) == 1:
+            return batches[0]
+        merged = cls()
+        for batch in batches:
+            merged._device_ids.extend(batch.device_ids)
+            merged._states.extend(batch.states)
+            merged._timestamps.extend(batch.timestamps)
+        return merged
+
+    def __len__(self):
+        if self.indices is not None:
+            return len(self.indices)
+        return len(self._device_ids)
+
+    def __iter__(self):
+        return zip(self.device_ids, self.states, self.timestamps)
+
+    def __repr__(self):
+        return f"ChangeBatch({len(self)} changes)"
+
+    @property
+    def device_ids(self):
+        if self._device_ids is None:
+            ids = self.table.ids
+            self._device_ids = [ids[i] for i in self.indices.tolist()]
+        return self._device_ids
+
+    @property
+    def states(self):
+        if self._states is None:
+            switches = (self.kinds == KIND_SWITCH).tolist()
+            self._states = [
+                bool(value) if switch else value
+                for value, switch in zip(self.values.tolist(), switches)
+            ]
+        return self._states
+
+    @property
+    def timestamps(self):
+        if not isinstance(self._timestamps, list):
+            self._timestamps = [self._timestamps] * len(self)
+        return self._timestamps
+
+
+class BatchSubscriber:
+    """A batch callback, optionally collecting batches for ``flush_interval`` seconds."""
+
+    def __init__(self, callback, flush_interval=None, metrics=None):
+        self.callback = callback
+        self.flush_interval = flush_interval
+        self.metrics = metrics  # HubMetrics that time the callback, or None
+        self._pending = []
+        self._last_flush = None
+
+    def offer(self, batch, now):
+        """Delivers or collects ``batch``, ``True`` if it started a new collection."""
+        if not self.flush_interval:
+            self._call(batch)
+            return False
+        if self._last_flush is None:
+            self._last_flush = now
+        started = not self._pending
+        self._pending.append(batch)
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now)
+            return False
+        return started
+
+    def _call(self, batch):
+        if self.metrics is None:
+            self.callback(batch)
+        else:
+            self.metrics.call(self.callback, batch)
+
+    def due(self):
+        """Clock time of the next flush, ``None`` while nothing is collected."""
+        return self._last_flush + self.flush_interval if self._pending else None
+
+    def flush(self, now=None):
+        if self._pending:
+            batches, self._pending = self._pending, []
+            self._call(ChangeBatch.concat(batches))
+        if now is not None:
+            self._last_flush = now
@@ -0,0 +1,185 @@
+"""Declarative fleet definitions.
+
+A fleet is described as JSON (or the equivalent dict)::
+
+    {
+        "seed": 7,
+        "templates": {
+            "room_sensor": {"type": "sensor", "name": "Raum {n}",
+                            "state": {"normal": [21, 1]}}
+        },
+        "devices": [
+            {"id": "light_1", "name": "Deckenlicht", "type": "switch", "state": false},
+            {"template": "room_sensor", "id": "room_{n}", "count": 50000},
+            {"id": "mode_{n}", "count": 10, "type": "select",
+             "state": {"choice": ["Eco", "Comfort"]}, "update_interval": 60}
+        ]
+    }
+
+An entry takes the keys of its ``template`` and overrides them. With
+``count`` the ``id`` and ``name`` are patterns, ``{n}`` runs from ``first``
+(default 1). ``state`` is a plain value or a distribution: ``normal``
+``[mean, std]``, ``uniform`` ``[low, high]`` (both rounded to ``round``
+digits, default 2) or ``choice`` ``[options]``. ``seed`` makes the drawn
+start values reproducible. An optional top-level ``behaviors`` maps device
+types to behavior models, e.g. ``{"sensor": {"model": "daily_cycle"}}``
+(see ``iot_simulator.behavior``).
+
+With a compact store every entry becomes one bulk ``DeviceTable.extend``,
+generated ids and names are only formatted when they are used. Ids must be
+unique across all entries, a collision raises ``ValueError`` for either
+store.
+"""
+import json
+import os
+import random
+
+from .hub import SimulatedDevice
+from .store import DeviceTable, NameTemplate, np
+
+_ENTRY_KEYS = {"template", "id", "name", "type", "state", "count", "first", "simulation_enabled",
+               "update_interval", "jitter"}
+
+
+def read_config(source):
+    """Returns the fleet dict of ``source``, a dict or the path of a JSON file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source) as f:
+            return json.load(f)
+    return source
+
+
+def _entries(config):
+    templates = config.get("templates", {})
+    for entry in config.get("devices", []):
+        name = entry.get("template")
+        if name is not None:
+            if name not in templates:
+                raise ValueError(f"Unknown fleet template {name!r}")
+            entry = {**templates[name], **entry}
+        unknown = set(entry) - _ENTRY_KEYS
+        if unknown:
+            raise ValueError(f"Unknown keys in fleet entry: {', '.join(sorted(unknown))}")
+        if "id" not in entry or "type" not in entry:
+            raise ValueError(f"Fleet entry needs an id and a type: {entry!r}")
+        yield entry
+
+
+class _IdCheck:
+    """Finds ids that more than one fleet entry generates, without formatting ranges."""
+
+    def __init__(self):
+        self.literal = set()
+        self.templates = []
+
+    def add(self, ids):
+        if isinstance(ids, NameTemplate) and ids.simple:
+            for device_id in self.literal:
+                if ids.find(device_id) is not None:
+                    self._duplicate(device_id)
+            for other in self.templates:
+                self._overlap(ids, other)
+            self.templates.append(ids)
+            return
+        for device_id in ids:
+            if device_id in self.literal or any(t.find(device_id) is not None for t in self.templates):
+                self._duplicate(device_id)
+            self.literal.add(device_id)
+
+    def _overlap(self, ids, other):
+        if ids.template == other.template:
+            first = max(ids.first, other.first)
+            if first < min(ids.first + ids.count, other.first + other.count):
+                self._duplicate(ids.template.format(n=first))
+            return
+        prefix, _, suffix = ids.template.partition("{n}")
+        other_prefix, _, other_suffix = other.template.partition("{n}")
+        if not (prefix.startswith(other_prefix) or other_prefix.startswith(prefix)):
+            return
+        if not (suffix.endswith(other_suffix) or other_suffix.endswith(suffix)):
+            return
+        # Different patterns can still meet, e.g. "temp_1{n}" and "temp_{n}"
+        small, large = sorted((ids, other), key=len)
+        for device_id in small:
+            if large.find(device_id) is not None:
+                self._duplicate(device_id)
+
+    @staticmethod
+    def _duplicate(device_id):
+        raise ValueError(f"Device id {device_id!r} is used by more than one fleet entry")
+
+
+def _draw(spec, count, rng):
+    """Start states of ``count`` devices, a single value if ``spec`` is one."""
+    if not isinstance(spec, dict):
+        return spec
+    digits = spec.get("round", 2)
+    if "normal" in spec:
+        mean, std = spec["normal"]
+        if np is not None:
+            values = rng.normal(mean, std, count)
+        else:
+            values = [rng.gauss(mean, std) for _ in range(count)]
+    elif "uniform" in spec:
+        low, high = spec["uniform"]
+        if np is not None:
+            values = rng.uniform(low, high, count)
+        else:
+            values = [rng.uniform(low, high) for _ in range(count)]
+    elif "choice" in spec:
+        options = spec["choice"]
+        if np is not None:
+            picks = rng.integers(0, len(options), count)
+            if all(isinstance(option, bool) for option in options):
+                return np.array(options, dtype=bool)[picks]
+            return [options[i] for i in picks.tolist()]
+        return [rng.choice(options) for _ in range(count)]
+    else:
+        raise ValueError(f"Unknown state distribution {spec!r}")
+    if digits is None:
+        return values
+    if np is not None:
+        return np.round(values, digits)
+    return [round(value, digits) for value in values]
+
+
+def build_fleet(config, compact=False):
+    """Creates the devices of a fleet config.
+
+    Returns ``(devices, intervals)``: a ``DeviceTable`` with ``compact``,
+    else a list of ``SimulatedDevice``, and ``(device_ids, interval,
+    jitter)`` for every entry with its own ``update_interval``.
+    """
+    seed = config.get("seed")
+    rng = np.random.default_rng(seed) if np is not None else random.Random(seed)
+    devices = DeviceTable() if compact else []
+    intervals = []
+    seen = _IdCheck()
+    for entry in _entries(config):
+        count = entry.get("count")
+        if count is None:
+            ids = [entry["id"]]
+            names = [entry.get("name", entry["id"])]
+        else:
+            if "{n}" not in entry["id"]:
+                raise ValueError(f"Fleet entry with a count needs '{{n}}' in its id: {entry['id']!r}")
+            first = entry.get("first", 1)
+            ids = NameTemplate(entry["id"], count, first)
+            names = NameTemplate(entry.get("name", entry["id"]), count, first)
+        seen.add(ids)
+        states = _draw(entry.get("state"), len(ids), rng)
+        enabled = entry.get("simulation_enabled", True)
+        if compact:
+            devices.extend(ids, names, entry["type"], states, enabled)
+        else:
+            if np is not None and isinstance(states, np.ndarray):
+                states = states.tolist()
+            elif not isinstance(states, list):
+                states = [states] * len(ids)
+            for device_id, name, state in zip(ids, names, states):
+                device = SimulatedDevice(device_id, name, entry["type"], state)
+                device.simulation_enabled = enabled
+                devices.append(device)
+        if "update_interval" in entry:
+            intervals.append((ids, entry["update_interval"], entry.get("jitter", 0.0)))
+    return devices, intervals
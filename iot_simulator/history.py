@@ -0,0 +1,290 @@
+"""Bounded history of reported device states.
+
+``History`` keeps the last ``depth`` states of every device in one shared
+columnar ring buffer: a ``(devices, depth)`` array each for timestamps,
+values and storage kinds, plus a write position and a fill count per
+device. Memory is fixed at about ``17 * depth`` bytes per device (see
+``nbytes``), once a device's row is full its oldest sample is overwritten.
+Non-numeric states (select options) are stored as the number of an
+interned object. Objects no longer in any buffer are dropped from the
+intern table once it has grown past ``_INTERN_LIMIT`` and twice its live
+size, so states that never repeat (e.g. unique strings) don't pile up.
+Unhashable states are kept without interning.
+
+The hub records every batch it reports, i.e. after the reporting policies,
+and starts with the states at the time the history was created. Batches of
+the vectorized engine are written for all their rows at once.
+"""
+from .events import ChangeBatch
+from .store import _KINDS, KIND_OTHER, KIND_SWITCH, DeviceTable, _state_kind, np, require_numpy
+
+# Rows per step of a downsampling query, bounds its temporary arrays
+_CHUNK = 65536
+# Size of the intern table from which objects no longer stored are dropped
+_INTERN_LIMIT = 4096
+
+
+class History:
+    """Ring buffers of ``(timestamp, state)`` samples for all devices of a hub."""
+
+    def __init__(self, devices, depth=100):
+        require_numpy("The state history")
+        if depth < 1:
+            raise ValueError("depth must be >= 1")
+        self.devices = devices
+        self.depth = depth
+        # Rows of a dict hub in the order its devices were first seen, a table has its own
+        self._rows = None if isinstance(devices, DeviceTable) else {}
+        self._mapping = None  # (table, size, rows) for batches of another table
+        self._objects = []
+        self._codes = {}
+        self._intern_limit = _INTERN_LIMIT
+        self.times = np.zeros((0, depth))
+        self.values = np.zeros((0, depth))
+        self.kinds = np.zeros((0, depth), dtype=np.uint8)
+        self.head = np.zeros(0, dtype=np.intp)
+        self.count = np.zeros(0, dtype=np.intp)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the buffers, without the interned non-numeric states."""
+        return sum(column.nbytes for column in (self.times, self.values, self.kinds, self.head, self.count))
+
+    def _grow(self, size):
+        known = len(self.head)
+        if size <= known:
+            return
+        capacity = max(size, 2 * known)
+        for name in ("times", "values", "kinds"):
+            old = getattr(self, name)
+            column = np.zeros((capacity, self.depth), dtype=old.dtype)
+            column[:known] = old
+            setattr(self, name, column)
+        self.head = np.concatenate((self.head, np.zeros(capacity - known, dtype=np.intp)))
+        self.count = np.concatenate((self.count, np.zeros(capacity - known, dtype=np.intp)))
+
+    def _row(self, device_id, add=False):
+        """Row of ``device_id`` or ``None``, ``add`` gives a known device of a dict hub its row."""
+        if self._rows is None:
+            return self.devices.find(device_id)
+        row = self._rows.get(device_id)
+        if row is None and add and device_id in self.devices:
+            row = self._rows[device_id] = len(self._rows)
+        return row
+
+    def _table_rows(self, table):
+        """History rows of the rows of ``table``, ``None`` if they are the same."""
+        if table is self.devices:
+            return None
+        size = len(table)
+        mapping = self._mapping
+        if mapping is None or mapping[0] is not table or mapping[1] != size:
+            rows = [self._row(device_id, add=True) for device_id in table.ids]
+            rows = np.array([-1 if row is None else row for row in rows], dtype=np.intp)
+            mapping = self._mapping = (table, size, rows)
+        return mapping[2]
+
+    def _code(self, state):
+        try:
+            code = self._codes.get(state)
+        except TypeError:  # Unhashable, e.g. a list
+            self._objects.append(state)
+            return len(self._objects) - 1
+        if code is None:
+            code = self._codes[state] = len(self._objects)
+            self._objects.append(state)
+        return code
+
+    def _compact_objects(self):
+        """Drops interned objects no sample refers to anymore and renumbers the rest."""
+        stored = (np.arange(self.depth) < self.count[:, None]) & (self.kinds == KIND_OTHER)
+        live = np.unique(self.values[stored]).astype(np.intp)
+        self.values[stored] = np.searchsorted(live, self.values[stored].astype(np.intp))
+        self._objects = [self._objects[code] for code in live.tolist()]
+        self._codes = {}
+        for code, state in enumerate(self._objects):
+            try:
+                self._codes[state] = code
+            except TypeError:
+                pass
+        self._intern_limit = max(_INTERN_LIMIT, 2 * len(self._objects))
+
+    def _state(self, kind, value):
+        if kind == KIND_OTHER:
+            return self._objects[int(value)]
+        if kind == KIND_SWITCH:
+            return value != 0.0
+        return value
+
+    def record(self, batch):
+        """Appends the rows of ``batch`` to the history of their devices."""
+        if not len(batch):
+            return
+        if len(self._objects) >= self._intern_limit:
+            # Before the batch, its codes must stay valid until they are written
+            self._compact_objects()
+        if batch.indices is None:
+            devices = self.devices
+            for device_id, state, timestamp in batch:
+                row = self._row(device_id, add=True)
+                if row is None:
+                    continue
+                kind = _state_kind(_KINDS.get(devices[device_id].type, KIND_OTHER), state)
+                value = self._code(state) if kind == KIND_OTHER else float(state)
+                self._grow(row + 1)
+                self._write(row, timestamp, value, kind)
+            return
+        rows = batch.indices
+        values = batch.values
+        kinds = batch.kinds
+        other = np.flatnonzero(kinds == KIND_OTHER)
+        if len(other):
+            states = batch.states
+            values = values.copy()
+            values[other] = [self._code(states[i]) for i in other.tolist()]
+        timestamps = batch._timestamps
+        if isinstance(timestamps, list):
+            timestamps = np.array(timestamps)
+        mapping = self._table_rows(batch.table)
+        if mapping is not None:
+            rows = mapping[rows]
+            known = rows >= 0
+            if not known.all():
+                rows, values, kinds = rows[known], values[known], kinds[known]
+                if not np.isscalar(timestamps):
+                    timestamps = timestamps[known]
+        if len(rows):
+            self._grow(int(rows.max()) + 1)
+            # Rows of one batch are unique, so one fancy-indexed write per column
+            self._write(rows, timestamps, values, kinds)
+
+    def _write(self, rows, timestamps, values, kinds):
+        positions = self.head[rows]
+        # Flat indices, one 1-D scatter per column is cheaper than 2-D indexing
+        flat = rows * self.depth + positions
+        self.times.reshape(-1)[flat] = timestamps
+        self.values.reshape(-1)[flat] = values
+        self.kinds.reshape(-1)[flat] = kinds
+        self.head[rows] = (positions + 1) % self.depth
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.depth)
+
+    def record_all(self, now):
+        """Records the current state of every device."""
+        devices = self.devices
+        if isinstance(devices, DeviceTable):
+            self.record(ChangeBatch.from_table(devices, np.arange(len(devices), dtype=np.intp), now))
+        else:
+            states = [device.state for device in devices.values()]
+            self.record(ChangeBatch(devices, states, [now] * len(states)))
+
+    def _samples(self, device_id, n=None):
+        """Timestamps, values and kinds of the last ``n`` samples, oldest first."""
+        row = self._row(device_id)
+        if row is None or row >= len(self.count):
+            return np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.uint8)
+        count = int(self.count[row])
+        n = count if n is None else max(0, min(n, count))
+        positions = (self.head[row] - n + np.arange(n)) % self.depth
+        return self.times[row, positions], self.values[row, positions], self.kinds[row, positions]
+
+    def _pairs(self, times, values, kinds):
+        state = self._state
+        return [
+            (timestamp, state(kind, value))
+            for timestamp, value, kind in zip(times.tolist(), values.tolist(), kinds.tolist())
+        ]
+
+    def last(self, device_id, n=None):
+        """The last ``n`` (all without) ``(timestamp, state)`` samples of a device, oldest first."""
+        return self._pairs(*self._samples(device_id, n))
+
+    def between(self, device_id, start=None, end=None):
+        """The ``(timestamp, state)`` samples of a device with ``start <= timestamp <= end``."""
+        times, values, kinds = self._samples(device_id)
+        inside = np.ones(len(times), dtype=bool)
+        if start is not None:
+            inside &= times >= start
+        if end is not None:
+            inside &= times <= end
+        return self._pairs(times[inside], values[inside], kinds[inside])
+
+    def _span(self, rows):
+        """Oldest and newest timestamp of ``rows``, ``(0, 0)`` without samples."""
+        rows = rows[rows >= 0]
+        rows = rows[self.count[rows] > 0]
+        if not len(rows):
+            return 0.0, 0.0
+        oldest = self.times[rows, (self.head[rows] - self.count[rows]) % self.depth]
+        newest = self.times[rows, (self.head[rows] - 1) % self.depth]
+        return float(oldest.min()), float(newest.max())
+
+    def downsample(self, device_ids=None, start=None, end=None, buckets=10):
+        """Min, max and average of numeric states in ``buckets`` equal time buckets.
+
+        ``device_ids`` is a list of ids (all devices without, in the order of
+        ``hub.devices``) or a single id. ``start`` and ``end`` default to the
+        oldest and newest sample, the last bucket includes ``end``. Returns a
+        dict with the bucket ``start`` times, their ``width`` and the arrays
+        ``min``, ``max``, ``avg`` (NaN for empty buckets) and ``count`` with
+        one row per device, or 1-D for a single id. Switches count as 0/1,
+        non-numeric states are left out.
+        """
+        single = isinstance(device_ids, str)
+        if device_ids is None:
+            rows = np.arange(len(self._rows) if self._rows is not None else len(self.devices), dtype=np.intp)
+            rows = rows[rows < len(self.count)]
+        else:
+            found = [self._row(device_id) for device_id in ([device_ids] if single else device_ids)]
+            rows = np.array([-1 if row is None or row >= len(self.count) else row for row in found],
+                            dtype=np.intp)
+        if start is None or end is None:
+            oldest, newest = self._span(rows)
+            start = oldest if start is None else start
+            end = newest if end is None else end
+        width = (end - start) / buckets
+        scale = 1.0 / width if width > 0 else 0.0
+        minimum = np.full((len(rows), buckets), np.inf)
+        maximum = np.full((len(rows), buckets), -np.inf)
+        total = np.zeros((len(rows), buckets))
+        count = np.zeros((len(rows), buckets), dtype=np.intp)
+        offsets = np.arange(self.depth)
+        for first in range(0, len(rows), _CHUNK):
+            chunk = rows[first : first + _CHUNK]
+            known = chunk >= 0
+            chunk = np.where(known, chunk, 0)
+            # Samples are read in storage order: a row that is not full yet has
+            # them in its first columns, and the order does not matter below
+            filled = np.where(known, self.count[chunk], 0)[:, None]
+            times = self.times[chunk]
+            valid = (offsets < filled) & (times >= start) & (times <= end)
+            valid &= self.kinds[chunk] != KIND_OTHER
+            bucket = np.minimum(((times - start) * scale).astype(np.intp), buckets - 1)
+            keys = (np.arange(len(chunk))[:, None] * buckets + bucket)[valid]
+            values = self.values[chunk][valid]
+            size = len(chunk) * buckets
+            at = slice(first, first + len(chunk))
+            count[at] = np.bincount(keys, minlength=size).reshape(-1, buckets)
+            total[at] = np.bincount(keys, weights=values, minlength=size).reshape(-1, buckets)
+            if len(keys):
+                # Runs of equal keys, a bucket can be split where the ring wraps
+                starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+                targets = first * buckets + keys[starts]
+                np.minimum.at(minimum.reshape(-1), targets, np.minimum.reduceat(values, starts))
+                np.maximum.at(maximum.reshape(-1), targets, np.maximum.reduceat(values, starts))
+        empty = count == 0
+        minimum[empty] = np.nan
+        maximum[empty] = np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = np.where(count > 0, total / count, np.nan)
+        result = {
+            "start": start + width * np.arange(buckets),
+            "width": width,
+            "min": minimum,
+            "max": maximum,
+            "avg": average,
+            "count": count,
+        }
+        if single:
+            for key in ("min", "max", "avg", "count"):
+                result[key] = result[key][0]
+        return result
@@ -1,10 +1,31 @@
 import asyncio
+import os
 import random
 import logging
+import time
+from fnmatch import fnmatchcase
+
+from .behavior import Behaviors
+from .clock import WallClock
+from .dispatch import POLICY_BLOCK, POLICY_COALESCE, POLICY_DROP_OLDEST, EventStream, Subscription
+from .engine import VectorizedEngine
+from .metrics import HubMetrics
+from .rng import DeviceRandom, device_key
+from .events import BatchSubscriber, ChangeBatch
+from .history import History
+from .reporting import ReportingPolicies
+from .scheduler import UpdateScheduler
+from .snapshot import DELTA, DirtyTracker, apply_frame, encode_frame, read_frames
+from .store import DeviceTable, _metadata, np
+from .topics import CallbackIndex
 
 _LOGGER = logging.getLogger(__name__)
 
 class SimulatedDevice:
+    # No per-instance __dict__, unit and options come from the device type
+    # unless they are assigned, which stores them in _metadata
+    __slots__ = ("id", "name", "type", "state", "simulation_enabled", "_metadata")
+
     def __init__(self, device_id, name, device_type, initial_state):
         self.id = device_id
         self.name = name
@@ -12,8 +33,28 @@ class SimulatedDevice:
         self.state = initial_state
         # Hier ist die neue Funktion: Simulation pro Gerät an/aus
         self.simulation_enabled = True 
-        self.unit = "°C" if device_type == "sensor" else None
-        self.options = ["Eco", "Comfort", "Boost"] if device_type == "select" else None
+        self._metadata = None
+
+    @property
+    def unit(self):
+        return _metadata(self._metadata, "unit", self.type)
+
+    @unit.setter
+    def unit(self, value):
+        self._set_metadata("unit", value)
+
+    @property
+    def options(self):
+        return _metadata(self._metadata, "options", self.type)
+
+    @options.setter
+    def options(self, value):
+        self._set_metadata("options", value)
+
+    def _set_metadata(self, key, value):
+        if self._metadata is None:
+            self._metadata = {}
+        self._metadata[key] = value
 
     def update_state(self, new_state):
         if self.state == new_state:
@@ -22,43 +63,457 @@ class SimulatedDevice:
         return True
 
 class SimulatedHub:
-    def __init__(self):
-        # Wir erstellen eine Liste von Test-Geräten
-        self.devices = {
-            "temp_1": SimulatedDevice("temp_1", "Wohnzimmer Temperatur", "sensor", 21.0),
-            "light_1": SimulatedDevice("light_1", "Deckenlicht", "switch", False),
-            "mode_1": SimulatedDevice("mode_1", "Heizungsmodus", "select", "Eco"),
-        }
-        self._callbacks = set()
-
-    def register_callback(self, callback):
-        self._callbacks.add(callback)
+    def __init__(self, vectorized=False, compact=False, update_interval=5.0, devices=None, clock=None,
+                 seed=None, metrics=False, history=None):
+        if devices is None:
+            # Wir erstellen eine Liste von Test-Geräten
+            devices = [
+                SimulatedDevice("temp_1", "Wohnzimmer Temperatur", "sensor", 21.0),
+                SimulatedDevice("light_1", "Deckenlicht", "switch", False),
+                SimulatedDevice("mode_1", "Heizungsmodus", "select", "Eco"),
+            ]
+        if isinstance(devices, DeviceTable):
+            self.devices = devices  # Already compact, e.g. from build_fleet
+        else:
+            self.devices = {device.id: device for device in devices}
+        if (compact or vectorized) and not isinstance(self.devices, DeviceTable):
+            # Struct-of-arrays storage, devices are handed out as views. The
+            # vectorized engine works on it directly, so writes to
+            # hub.devices[id].state or .simulation_enabled are seen by every tick
+            self.devices = DeviceTable.from_devices(self.devices)
+        self._callback_index = CallbackIndex()
+        self._callbacks = self._callback_index.callbacks
+        self._subscriptions = []
+        self._batch_subscribers = []
+        # With a seed every device gets its own random stream, see iot_simulator.rng
+        self.seed = seed
+        self._streams = {}
+        # Time source for scheduling and event timestamps, see iot_simulator.clock
+        self.clock = clock if clock is not None else WallClock()
+        # Update interval per device, devices without an entry use update_interval
+        self.update_interval = update_interval
+        self._intervals = {}
+        self._default = None  # (key, ids or rows) of the devices without an own interval
+        self.scheduler = None
+        # Wakes the update loop early, replaced per loop run (an Event binds to one loop)
+        self._schedule_changed = asyncio.Event()
+        # Runtime metrics, None keeps the hot paths free of any measuring
+        self.metrics = HubMetrics() if metrics else None
+        # Last ``history`` reported states per device, see iot_simulator.history
+        self.history = None
+        if history:
+            self.history = History(self.devices, history)
+            self.history.record_all(self._now())
+        # Behavior models replacing the built-in rules, see iot_simulator.behavior
+        self.behaviors = Behaviors()
+        # Which simulated changes are reported, see iot_simulator.reporting
+        self.reporting = ReportingPolicies()
+        # Devices changed since the last checkpoint, None until checkpoint() is used
+        self._dirty = None
+        self._checkpoint_path = None
+        # Optional NumPy engine, built lazily for the current device mapping
+        self._vectorized = vectorized
+        self._engine = None
+        if vectorized:
+            self._engine = VectorizedEngine(self.devices, seed)
+
+    @classmethod
+    def from_config(cls, config, **options):
+        """Creates a hub with the fleet of ``config``, a dict or a JSON file path.
+
+        ``options`` are passed on to the constructor, with ``compact=True``
+        the fleet is built in bulk. See ``iot_simulator.fleet`` for the format.
+        """
+        from .fleet import build_fleet, read_config
+
+        config = read_config(config)
+        compact = options.get("compact", False) or options.get("vectorized", False)
+        devices, intervals = build_fleet(config, compact=compact)
+        hub = cls(devices=devices, **options)
+        for device_type, model in config.get("behaviors", {}).items():
+            hub.set_behavior(model, device_type=device_type)
+        for device_ids, interval, jitter in intervals:
+            for device_id in device_ids:
+                hub.set_update_interval(device_id, interval, jitter)
+        return hub
+
+    def _get_engine(self):
+        if not isinstance(self.devices, DeviceTable):
+            # hub.devices was replaced by a dict, keep it in a table like __init__ does
+            self.devices = DeviceTable.from_devices(self.devices)
+        if not self._engine.matches(self.devices):
+            self._engine = VectorizedEngine(self.devices, self.seed)
+        return self._engine
+
+    def _random(self, device_id):
+        """Random source of a device: its own stream with a seed, else the random module."""
+        if self.seed is None:
+            return random
+        stream = self._streams.get(device_id)
+        if stream is None:
+            stream = self._streams[device_id] = DeviceRandom(device_key(self.seed, device_id))
+        return stream
+
+    def register_callback(self, callback, device_id=None, device_type=None, pattern=None):
+        """Registers ``callback(device_id, state)`` for state changes.
+
+        Without filters the callback gets every change. ``device_id``,
+        ``device_type`` (``"sensor"``, ``"switch"``, ``"select"``) and the id
+        glob ``pattern`` (e.g. ``"temp_*"``) restrict it, all given filters
+        must match.
+        """
+        self._callback_index.add(callback, device_id, device_type, pattern)
+
+    def unregister_callback(self, callback):
+        self._callback_index.remove(callback)
+
+    def register_batch_callback(self, callback, flush_interval=None):
+        """Registers ``callback(batch)`` that gets all changes of a tick at once.
+
+        ``batch`` is a ``ChangeBatch``. With ``flush_interval`` (seconds) the
+        batches are collected and delivered together, by the update loop once
+        the interval has passed or by ``flush_batches``.
+        """
+        subscriber = BatchSubscriber(callback, flush_interval, self.metrics)
+        self._batch_subscribers.append(subscriber)
+        return subscriber
+
+    def unregister_batch_callback(self, subscriber):
+        """Removes a batch callback, ``subscriber`` is what ``register_batch_callback`` returned."""
+        self._batch_subscribers.remove(subscriber)
+
+    def flush_batches(self):
+        """Delivers batches still collected for a flush interval."""
+        now = self._now()
+        for subscriber in self._batch_subscribers:
+            subscriber.flush(now)
+
+    def _next_flush(self):
+        """Earliest flush time of the collecting batch subscribers, ``None`` without."""
+        return min(
+            (due for due in (subscriber.due() for subscriber in self._batch_subscribers) if due is not None),
+            default=None,
+        )
+
+    def _flush_due(self):
+        now = self._now()
+        for subscriber in self._batch_subscribers:
+            due = subscriber.due()
+            if due is not None and due <= now:
+                subscriber.flush(now)
+
+    def subscribe(self, callback, maxsize=1000, policy=POLICY_DROP_OLDEST,
+                  device_id=None, device_type=None, pattern=None):
+        """Registers a sync or async callback that is fed through its own queue.
+
+        Unlike ``register_callback`` the callback runs in a separate delivery
+        task, so a slow subscriber never stalls the simulation. ``policy``
+        decides what happens when ``maxsize`` changes are pending, see
+        ``iot_simulator.dispatch``. The filters work like in
+        ``register_callback``. Must be called with a running event loop.
+        """
+        subscription = Subscription(callback, maxsize, policy, self.metrics).start()
+        self._subscriptions.append(subscription)
+        self._callback_index.add(subscription.offer, device_id, device_type, pattern)
+        return subscription
+
+    def events(self, policy=POLICY_COALESCE, maxsize=None, device_id=None, device_type=None,
+               pattern=None):
+        """Stream of ``(device_id, state)`` changes to pull with ``async for``.
+
+            async with hub.events(device_type="sensor") as events:
+                async for device_id, state in events:
+                    ...
+
+        With the default ``"coalesce"`` policy a slow reader only gets the
+        latest state of each device, the buffer never holds more entries
+        than there are devices. ``"drop_oldest"`` and ``"block"`` keep every
+        change up to ``maxsize`` (default 1000), see ``subscribe``. The
+        stream is registered right away, leaving ``async with`` or
+        ``unsubscribe`` ends it.
+        """
+        if maxsize is None and policy != POLICY_COALESCE:
+            maxsize = 1000
+        stream = EventStream(maxsize, policy, hub=self)
+        self._subscriptions.append(stream)
+        self._callback_index.add(stream.offer, device_id, device_type, pattern)
+        return stream
+
+    def unsubscribe(self, subscription):
+        """Ends a subscription or event stream, once more does nothing."""
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            self._callback_index.remove(subscription.offer)
+        subscription.close()
+
+    def _now(self):
+        return self.clock.time()
+
+    def _emit(self, batch):
+        """Hands a batch of changes to all subscribers.
+
+        Batch callbacks get it in one call, per-device callbacks and
+        subscriptions are fed row by row from the same batch.
+        """
+        if not len(batch):
+            return
+        if self._dirty is not None:
+            self._dirty.add_batch(batch)
+        if self.history is not None:
+            self.history.record(batch)
+        if self.metrics is not None:
+            self._emit_measured(batch)
+            return
+        if self._batch_subscribers:
+            now = self._now()
+            for subscriber in self._batch_subscribers:
+                if subscriber.offer(batch, now):
+                    # The update loop has to wake up for the flush of this collection
+                    self._schedule_changed.set()
+        index = self._callback_index
+        callbacks = self._callbacks
+        if index.filtered:
+            device_type = self._device_type
+            for device_id, state in zip(batch.device_ids, batch.states):
+                for callback in callbacks:
+                    callback(device_id, state)
+                for callback in index.lookup(device_id, device_type):
+                    callback(device_id, state)
+        elif callbacks:
+            for device_id, state in zip(batch.device_ids, batch.states):
+                for callback in callbacks:
+                    callback(device_id, state)
+
+    def _emit_measured(self, batch):
+        """``_emit`` with the time of every callback recorded in ``metrics``.
+
+        Batch callbacks and subscriptions time their own callbacks, under the
+        callback's name, only plain callbacks are timed here.
+        """
+        if self._batch_subscribers:
+            now = self._now()
+            for subscriber in self._batch_subscribers:
+                if subscriber.offer(batch, now):
+                    self._schedule_changed.set()
+        index = self._callback_index
+        device_type = self._device_type
+        for device_id, state in zip(batch.device_ids, batch.states):
+            for callback in self._callbacks:
+                self._call_measured(callback, device_id, state)
+            if index.filtered:
+                for callback in index.lookup(device_id, device_type):
+                    self._call_measured(callback, device_id, state)
+
+    def _call_measured(self, callback, device_id, state):
+        if isinstance(getattr(callback, "__self__", None), Subscription):
+            callback(device_id, state)  # Only queued, the delivery task times it
+        else:
+            self.metrics.call(callback, device_id, state)
+
+    def _device_type(self, device_id):
+        device = self.devices.get(device_id)
+        return device.type if device is not None else None
+
+    async def _wait_for_subscribers(self):
+        """Back pressure from subscribers with the blocking policy."""
+        for subscription in self._subscriptions:
+            if subscription.policy == POLICY_BLOCK and subscription.full:
+                await subscription.wait_for_space()
 
     async def toggle_simulation(self, device_id, enable: bool):
         if device_id in self.devices:
             self.devices[device_id].simulation_enabled = enable
+            if self._engine is not None:
+                self._engine.set_enabled(device_id, enable)
+            if self._dirty is not None:
+                self._dirty.add((device_id,))
             _LOGGER.info(f"Simulation für {device_id} ist jetzt {'an' if enable else 'aus'}")
 
-    async def start_background_updates(self):
-        """Loop that randomly changes values if simulation is active."""
-        while True:
-            await asyncio.sleep(5) # Check every 5 seconds
-            self._background_update_once()
+    def _select(self, device_ids=None, device_type=None, prefix=None, pattern=None):
+        """Ids of the devices matching all given selectors, all devices without any."""
+        if device_ids is not None:
+            selected = [dev_id for dev_id in device_ids if dev_id in self.devices]
+        else:
+            selected = self.devices
+        if device_type is None and prefix is None and pattern is None:
+            return list(selected)
+        return [
+            dev_id for dev_id in selected
+            if (prefix is None or dev_id.startswith(prefix))
+            and (pattern is None or fnmatchcase(dev_id, pattern))
+            and (device_type is None or self.devices[dev_id].type == device_type)
+        ]
+
+    async def set_simulation(self, enable: bool, device_ids=None, device_type=None, prefix=None,
+                             pattern=None):
+        """Turns the simulation on or off for many devices in one pass.
+
+        Selects all devices by default, ``device_ids``, ``device_type`` (e.g.
+        all switches), an id ``prefix`` and an id glob ``pattern`` narrow it
+        down. Returns the number of selected devices.
+        """
+        selected = self._select(device_ids, device_type, prefix, pattern)
+        devices = self.devices
+        for dev_id in selected:
+            devices[dev_id].simulation_enabled = enable
+            if self._engine is not None:
+                self._engine.set_enabled(dev_id, enable)
+        if self._dirty is not None:
+            self._dirty.add(selected)
+        _LOGGER.info(f"Simulation für {len(selected)} Geräte ist jetzt {'an' if enable else 'aus'}")
+        return len(selected)
+
+    def set_behavior(self, model, device_id=None, device_type=None):
+        """Lets a behavior model simulate a device or all devices of a type.
+
+        ``model`` is a model object, a registered name (``"daily_cycle"``)
+        or a ``{"model": name, **params}`` dict, ``None`` goes back to the
+        built-in rules. Needs numpy, see ``iot_simulator.behavior``.
+        """
+        self.behaviors.set(model, device_id, device_type)
+
+    def set_reporting_policy(self, policy, device_id=None, device_type=None):
+        """Filters which simulated changes of a device or device type are reported.
+
+        ``policy`` is a ``ReportingPolicy`` (deadband, minimum interval,
+        heartbeat), ``None`` removes it. A device policy wins over the one
+        of its type.
+        """
+        self.reporting.set(policy, device_id, device_type)
+
+    def set_update_interval(self, device_id, interval, jitter=0.0):
+        """Gives a device its own update interval in seconds, +/- ``jitter``."""
+        if device_id in self.devices:
+            self._intervals[device_id] = (interval, jitter)
+            self._default = None
+            if self.scheduler is not None:
+                self.scheduler.assign(device_id, interval, jitter, now=self._now())
+                self._schedule_changed.set()
+
+    def _default_group(self):
+        """Devices without an own interval, ``None`` for all.
+
+        Cached until intervals or devices change. For the vectorized engine
+        these are sorted table rows, so a tick needs no id lookups.
+        """
+        if not self._intervals:
+            return None  # All devices
+        engine = self._get_engine() if self._vectorized else None
+        key = (len(self.devices), len(self._intervals), engine.table if engine is not None else None)
+        if self._default is not None and self._default[0] == key:
+            return self._default[1]
+        if engine is not None:
+            table = engine.table
+            own = np.zeros(len(table), dtype=bool)
+            # find() parses template ids, no full index is built
+            own[[i for i in map(table.find, self._intervals) if i is not None]] = True
+            group = np.flatnonzero(~own)
+        else:
+            group = [dev_id for dev_id in self.devices if dev_id not in self._intervals]
+        self._default = (key, group)
+        return group
+
+    async def start_background_updates(self, until=None):
+        """Loop that randomly changes values if simulation is active.
 
-    def _background_update_once(self):
-        """Führt einen einzelnen Simulationsdurchlauf für alle Geräte aus."""
-        for dev_id, device in self.devices.items():
+        Devices are updated every ``update_interval`` seconds unless they got
+        their own interval, the loop only wakes up for devices that are due
+        and for batch callbacks whose flush interval has passed. With
+        ``until`` (clock time) the loop returns once that time is reached.
+        """
+        self.scheduler = UpdateScheduler.for_intervals(
+            self._intervals, self.update_interval, now=self._now(), seed=self.seed
+        )
+        self._schedule_changed = asyncio.Event()
+        while until is None or self._now() < until:
+            deadline = self.scheduler.next_due()
+            flush = self._next_flush()
+            if flush is not None:
+                deadline = min(deadline, flush)
+            if until is not None:
+                deadline = min(deadline, until)
+            await self.clock.wait(self._schedule_changed, deadline)
+            self._schedule_changed.clear()
+            due = self.scheduler.pop_due(self._now())
+            if due and self.metrics is not None:
+                self.metrics.tick_lateness_seconds.observe(self.scheduler.last_lateness)
+            for device_ids in due:
+                if device_ids is None:
+                    device_ids = self._default_group()
+                self._background_update_once(device_ids)
+            self._flush_due()
+            await self._wait_for_subscribers()
+
+    def _background_update_once(self, device_ids=None):
+        """Führt einen einzelnen Simulationsdurchlauf für alle Geräte aus.
+
+        With ``device_ids`` only those devices are updated, for the vectorized
+        engine they can also be given as sorted table rows (an array).
+        """
+        if self.metrics is None:
+            self._emit(self._simulate(device_ids))
+            return
+        started = time.perf_counter()
+        batch = self._simulate(device_ids)
+        self.metrics.observe_tick(time.perf_counter() - started, len(batch))
+        self._emit(batch)
+
+    def _simulate(self, device_ids=None):
+        """Computes one simulation step and returns the changes to report as a batch."""
+        if self._vectorized:
+            batch = self._vectorized_update_once(device_ids)
+        else:
+            batch = self._loop_update_once(device_ids)
+        if self._dirty is not None and self.seed is not None:
+            self._mark_advanced(device_ids)
+        if not self.reporting:
+            return batch
+        if self._dirty is not None:
+            self._dirty.add_batch(batch)  # Filtered changes still count for checkpoints
+        return self.reporting.filter(self, batch, device_ids, self._now())
+
+    def _mark_advanced(self, device_ids):
+        """Marks the devices whose random stream moved on in the last tick for checkpoints."""
+        if self._vectorized:
+            self._dirty.add_rows(self._engine.table, self._engine.advanced)
+            return
+        devices = self.devices
+        behaviors = self.behaviors if self.behaviors else None
+        advanced = []
+        for dev_id in devices if device_ids is None else device_ids:
+            device = devices.get(dev_id)
+            if device is None or not device.simulation_enabled:
+                continue
+            # Sensors and switches draw with the built-in rules, anything draws with a model
+            if device.type in ("sensor", "switch") or (
+                behaviors is not None and behaviors.model_for(dev_id, device.type) is not None
+            ):
+                advanced.append(dev_id)
+        self._dirty.add(advanced)
+
+    def _loop_update_once(self, device_ids=None):
+        """One simulation step with the per-device loop."""
+        if device_ids is None:
+            devices = self.devices.items()
+        else:
+            devices = ((dev_id, self.devices[dev_id]) for dev_id in device_ids if dev_id in self.devices)
+        behaviors = self.behaviors if self.behaviors else None
+        changed_ids = []
+        changed_states = []
+        for dev_id, device in devices:
             if device.simulation_enabled:
+                if behaviors is not None and behaviors.model_for(dev_id, device.type) is not None:
+                    continue  # Stepped by its model below
                 old_state = device.state
                 # Random logic
                 if device.type == "sensor":
-                    delta = round(random.uniform(-0.2, 0.2), 2)
+                    delta = round(self._random(dev_id).uniform(-0.2, 0.2), 2)
                     new_state = round(old_state + delta, 2)
                     if new_state == old_state:
                         new_state = round(old_state + (0.2 if delta <= 0 else -0.2), 2)
                     changed = device.update_state(new_state)
                 elif device.type == "switch":
-                    if random.random() > 0.9:
+                    if self._random(dev_id).random() > 0.9:
                         new_state = not old_state
                         changed = device.update_state(new_state)
                     else:
@@ -68,13 +523,115 @@ class SimulatedHub:
                     changed = device.update_state(device.state)
                 # Only fire callback if state actually changed
                 if changed:
-                    for callback in self._callbacks:
-                        callback(dev_id, device.state)
+                    changed_ids.append(dev_id)
+                    changed_states.append(device.state)
+        if behaviors is not None:
+            for dev_id, state in behaviors.step_devices(self, device_ids, self._now()):
+                changed_ids.append(dev_id)
+                changed_states.append(state)
+        return ChangeBatch(changed_ids, changed_states, [self._now()] * len(changed_ids))
+
+    def _vectorized_update_once(self, device_ids=None):
+        """Same as the per-device loop, but computed by the NumPy engine."""
+        engine = self._get_engine()
+        indices = None if device_ids is None else engine.indices(device_ids)
+        now = self._now()
+        changed = engine.tick(indices=indices, behaviors=self.behaviors, now=now)
+        return ChangeBatch.from_table(engine.table, changed, now)
+
+    def snapshot(self, path=None):
+        """Device states, simulation flags and random state as bytes.
+
+        Written to ``path`` as well if given, see ``iot_simulator.snapshot``
+        for the format.
+        """
+        data = encode_frame(self)
+        if path is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+        return data
+
+    def restore(self, source):
+        """Loads a snapshot or checkpoint file (bytes or a path) into the hub.
+
+        Devices unknown to the hub are skipped, no callbacks are called.
+        Returns the number of restored device records.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                source = f.read()
+        restored = 0
+        for frame in read_frames(source):
+            restored += apply_frame(self, frame)
+        if self._dirty is not None:
+            self._dirty.add(None)  # The next checkpoint has to be a full one
+        self._schedule_changed.set()
+        return restored
+
+    def checkpoint(self, path):
+        """Appends the devices changed since the last checkpoint to ``path``.
+
+        The first call for a path writes a full snapshot and starts tracking
+        changes, later calls append delta frames. ``restore(path)`` replays
+        all of them. Returns the number of bytes written.
+        """
+        if self._dirty is None or path != self._checkpoint_path:
+            self._dirty = DirtyTracker(self.devices)
+            self._checkpoint_path = path
+            data, mode = encode_frame(self), "wb"
+        else:
+            data, mode = encode_frame(self, self._dirty.selection(), DELTA), "ab"
+            self._dirty.clear()
+        with open(path, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(data)
 
     async def set_device_state(self, device_id, new_state):
+        if self.metrics is not None:
+            self.metrics.set_device_state_calls += 1
         if device_id in self.devices:
             changed = self.devices[device_id].update_state(new_state)
+            if changed and self._engine is not None:
+                self._engine.set_state(device_id, new_state)
             # Only fire callback if state actually changed
             if changed:
-                for callback in self._callbacks:
-                    callback(device_id, new_state)
\ No newline at end of file
+                self._emit(ChangeBatch([device_id], [new_state], [self._now()]))
+                await self._wait_for_subscribers()
+
+    async def set_device_states(self, states, values=None):
+        """Sets many device states in one pass and reports them as one batch.
+
+        ``states`` is a mapping of device id to state, an iterable of
+        ``(device_id, state)`` pairs, or a sequence of ids with the states in
+        ``values`` (lists or arrays). Unknown ids are ignored.
+
+        The update is atomic for subscribers: every state is written before
+        the first callback runs, so no callback sees a half-applied update.
+        It is not atomic against errors: if writing one state fails, the
+        states before it stay applied and nothing is reported.
+        """
+        if values is not None:
+            # Arrays become plain Python values (bool, float) first
+            pairs = zip(states, values.tolist() if hasattr(values, "tolist") else values)
+        elif hasattr(states, "items"):
+            pairs = states.items()
+        else:
+            pairs = states
+        if self.metrics is not None:
+            self.metrics.set_device_state_calls += 1
+        devices = self.devices
+        engine = self._engine
+        changed_ids = []
+        changed_states = []
+        for device_id, new_state in pairs:
+            device = devices.get(device_id)
+            if device is not None and device.update_state(new_state):
+                if engine is not None:
+                    engine.set_state(device_id, new_state)
+                changed_ids.append(device_id)
+                changed_states.append(new_state)
+        self._emit(ChangeBatch(changed_ids, changed_states, [self._now()] * len(changed_ids)))
+        await self._wait_for_subscribers()
+        return len(changed_ids)
\ No newline at end of file
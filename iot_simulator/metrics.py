@@ -0,0 +1,133 @@
+"""Runtime metrics for the simulation loop.
+
+``HubMetrics`` collects tick durations, how late ticks start against their
+schedule, state changes per tick, time spent in every callback and the
+number of ``set_device_state`` calls. It is only created with
+``SimulatedHub(metrics=True)``, without it the hub skips all measuring
+behind a single ``is None`` check. ``start_exporter`` serves the numbers in
+the Prometheus text format on a local port.
+"""
+import asyncio
+import bisect
+import time
+
+# Upper bucket bounds in seconds
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram like Prometheus uses it."""
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.mean, "max": self.max}
+
+    def prometheus(self, name, labels=""):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class HubMetrics:
+    def __init__(self):
+        self.tick_seconds = Histogram()
+        self.tick_lateness_seconds = Histogram()
+        self.changes_per_tick = Histogram(COUNT_BUCKETS)
+        self.callback_seconds = {}
+        self.set_device_state_calls = 0
+
+    def observe_tick(self, seconds, changes):
+        self.tick_seconds.observe(seconds)
+        self.changes_per_tick.observe(changes)
+
+    def call(self, callback, *args):
+        """Calls ``callback`` and records the time it took under its name."""
+        started = time.perf_counter()
+        try:
+            return callback(*args)
+        finally:
+            self.observe_callback(callback, time.perf_counter() - started)
+
+    def observe_callback(self, callback, seconds):
+        """Records ``seconds`` spent in ``callback`` under its name."""
+        name = getattr(callback, "__qualname__", None) or repr(callback)
+        histogram = self.callback_seconds.get(name)
+        if histogram is None:
+            histogram = self.callback_seconds[name] = Histogram()
+        histogram.observe(seconds)
+
+    def snapshot(self):
+        """All metrics as a plain dict."""
+        return {
+            "tick_seconds": self.tick_seconds.as_dict(),
+            "tick_lateness_seconds": self.tick_lateness_seconds.as_dict(),
+            "changes_per_tick": self.changes_per_tick.as_dict(),
+            "callback_seconds": {name: h.as_dict() for name, h in self.callback_seconds.items()},
+            "set_device_state_calls": self.set_device_state_calls,
+        }
+
+    def prometheus_text(self):
+        lines = [
+            "# TYPE iot_tick_seconds histogram",
+            *self.tick_seconds.prometheus("iot_tick_seconds"),
+            "# TYPE iot_tick_lateness_seconds histogram",
+            *self.tick_lateness_seconds.prometheus("iot_tick_lateness_seconds"),
+            "# TYPE iot_changes_per_tick histogram",
+            *self.changes_per_tick.prometheus("iot_changes_per_tick"),
+            "# TYPE iot_callback_seconds histogram",
+        ]
+        for name, histogram in sorted(self.callback_seconds.items()):
+            escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines += histogram.prometheus("iot_callback_seconds", f'callback="{escaped}"')
+        lines += [
+            "# TYPE iot_set_device_state_calls_total counter",
+            f"iot_set_device_state_calls_total {self.set_device_state_calls}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+async def start_exporter(metrics, host="127.0.0.1", port=9464):
+    """Serves ``metrics`` as Prometheus text over HTTP, returns the ``asyncio`` server."""
+
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        body = metrics.prometheus_text().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
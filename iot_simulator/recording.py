@@ -0,0 +1,188 @@
+"""Recording of state changes into a compact binary log, and replay.
+
+File layout: an 8 byte magic, then a sequence of records.
+
+* String record, ``<BII`` (tag 1, string number, byte length) followed by
+  the UTF-8 bytes. Device ids and string states are written once and
+  referenced by number afterwards.
+* Event record, 22 bytes: ``<BIdB`` (tag 2, device string number,
+  timestamp, value kind) followed by an 8 byte value (``double`` for
+  floats and bools, ``int64`` for ints and string numbers).
+
+The replayer memory-maps the file and walks it with precompiled structs,
+so replay costs one ``unpack_from`` per event. The recorder flushes each
+batch to the OS, and the replayer stops at a truncated last record, e.g.
+from a crash while writing.
+"""
+import asyncio
+import mmap
+import struct
+
+from .events import ChangeBatch
+
+MAGIC = b"IOTREC1\0"
+
+_TAG_STRING = 1
+_TAG_EVENT = 2
+
+_KIND_FLOAT = 0
+_KIND_BOOL = 1
+_KIND_INT = 2
+_KIND_STR = 3
+_KIND_NONE = 4
+
+_STRING = struct.Struct("<BII")
+_EVENT_HEAD = struct.Struct("<BIdB")
+_FLOAT = struct.Struct("<d")
+_INT = struct.Struct("<q")
+
+
+class EventRecorder:
+    """Appends every change it gets as a batch callback to ``path``.
+
+        recorder = EventRecorder("run.iotrec").attach(hub)
+        ...
+        recorder.close()
+
+    With ``flush=False`` batches stay in the file buffer until it is full or
+    the recorder is closed, which saves a system call per batch.
+    """
+
+    def __init__(self, path, flush=True):
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._flush = flush
+        self._strings = {}
+        self.events = 0
+
+    def attach(self, hub):
+        hub.register_batch_callback(self.record)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _string(self, out, text):
+        number = self._strings.get(text)
+        if number is None:
+            number = self._strings[text] = len(self._strings)
+            data = text.encode()
+            out += _STRING.pack(_TAG_STRING, number, len(data))
+            out += data
+        return number
+
+    def record(self, batch):
+        """Batch callback, writes all rows of ``batch`` with a single write."""
+        out = bytearray()
+        for device_id, state, timestamp in batch:
+            number = self._string(out, device_id)
+            if state is None:
+                out += _EVENT_HEAD.pack(_TAG_EVENT, number, timestamp, _KIND_NONE) + _INT.pack(0)
+            elif isinstance(state, bool):
+                out += _EVENT_HEAD.pack(_TAG_EVENT, number, timestamp, _KIND_BOOL) + _FLOAT.pack(state)
+            elif isinstance(state, float):
+                out += _EVENT_HEAD.pack(_TAG_EVENT, number, timestamp, _KIND_FLOAT) + _FLOAT.pack(state)
+            elif isinstance(state, int):
+                out += _EVENT_HEAD.pack(_TAG_EVENT, number, timestamp, _KIND_INT) + _INT.pack(state)
+            elif isinstance(state, str):
+                value = self._string(out, state)
+                out += _EVENT_HEAD.pack(_TAG_EVENT, number, timestamp, _KIND_STR) + _INT.pack(value)
+            else:
+                raise TypeError(f"Cannot record state of type {type(state).__name__}")
+        self._file.write(out)
+        if self._flush:
+            self._file.flush()
+        self.events += len(batch)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class EventReplayer:
+    """Reads a recording back, iterating yields ``(device_id, state, timestamp)``."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not an event recording")
+            strings = []
+            offset = len(MAGIC)
+            end = len(data)
+            event_size = _EVENT_HEAD.size + 8
+            while offset < end:
+                tag = data[offset]
+                if tag == _TAG_EVENT:
+                    if offset + event_size > end:
+                        return  # Cut off while writing
+                    _, number, timestamp, kind = _EVENT_HEAD.unpack_from(data, offset)
+                    value_at = offset + _EVENT_HEAD.size
+                    if kind == _KIND_FLOAT:
+                        state = _FLOAT.unpack_from(data, value_at)[0]
+                    elif kind == _KIND_BOOL:
+                        state = _FLOAT.unpack_from(data, value_at)[0] != 0.0
+                    elif kind == _KIND_INT:
+                        state = _INT.unpack_from(data, value_at)[0]
+                    elif kind == _KIND_STR:
+                        state = strings[_INT.unpack_from(data, value_at)[0]]
+                    else:
+                        state = None
+                    offset += event_size
+                    yield strings[number], state, timestamp
+                elif tag == _TAG_STRING:
+                    if offset + _STRING.size > end:
+                        return
+                    _, number, length = _STRING.unpack_from(data, offset)
+                    offset += _STRING.size
+                    if offset + length > end:
+                        return
+                    strings.append(bytes(data[offset : offset + length]).decode())
+                    offset += length
+                else:
+                    raise ValueError(f"Corrupt recording {self.path} at byte {offset}")
+
+    def batches(self):
+        """Groups consecutive events with the same timestamp into ``ChangeBatch`` objects."""
+        device_ids, states, timestamps = [], [], []
+        for device_id, state, timestamp in self:
+            if timestamps and timestamp != timestamps[-1]:
+                yield ChangeBatch(device_ids, states, timestamps)
+                device_ids, states, timestamps = [], [], []
+            device_ids.append(device_id)
+            states.append(state)
+            timestamps.append(timestamp)
+        if timestamps:
+            yield ChangeBatch(device_ids, states, timestamps)
+
+    async def replay(self, hub, speed=1.0):
+        """Feeds the recording through ``hub``'s normal callback path.
+
+        ``speed`` is a factor on the recorded timing (1, 10, ...), ``None``
+        replays as fast as possible. Devices known to the hub take over the
+        recorded states.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first = None
+        for batch in self.batches():
+            timestamp = batch.timestamps[0]
+            if first is None:
+                first = timestamp
+            if speed:
+                delay = (timestamp - first) / speed - (loop.time() - started)
+                await asyncio.sleep(max(0.0, delay))
+            else:
+                await asyncio.sleep(0)
+            for device_id, state in zip(batch.device_ids, batch.states):
+                device = hub.devices.get(device_id)
+                if device is not None:
+                    device.state = state
+                    if hub._engine is not None:
+                        hub._engine.set_state(device_id, state)
+            hub._emit(batch)
@@ -0,0 +1,197 @@
+"""Reporting policies: which simulated changes are reported at all.
+
+Real devices do not send every wobble. A ``ReportingPolicy`` decides per
+device or per device type when a change found in a tick becomes an event:
+
+* ``deadband``: the state has to differ from the last reported one by at
+  least this much (``relative=True``: this fraction of the last reported
+  value). States that are not numbers are reported on any change.
+* ``min_interval``: at least this many seconds between two reports.
+* ``max_interval``: heartbeat, report the current state after this many
+  seconds without a report even if nothing changed.
+
+The device state itself keeps changing every tick, only the reports are
+filtered. Manual ``set_device_state`` calls are always reported. For the
+vectorized engine the policies are kept as arrays aligned with the device
+table and evaluated for the whole tick at once.
+"""
+import math
+
+from .events import ChangeBatch
+from .store import KIND_OTHER, KIND_SENSOR, np
+
+
+class ReportingPolicy:
+    __slots__ = ("deadband", "relative", "min_interval", "max_interval")
+
+    def __init__(self, deadband=0.0, relative=False, min_interval=0.0, max_interval=None):
+        if deadband < 0 or min_interval < 0 or (max_interval is not None and max_interval <= 0):
+            raise ValueError("deadband and min_interval must be >= 0, max_interval > 0")
+        self.deadband = deadband
+        self.relative = relative
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def passes(self, state, last_state, elapsed):
+        """Whether a change from ``last_state`` to ``state`` is reported."""
+        if elapsed < self.min_interval:
+            return False
+        if isinstance(state, bool) or not isinstance(state, (int, float)) or not isinstance(
+            last_state, (int, float)
+        ):
+            return state != last_state
+        band = self.deadband * abs(last_state) if self.relative else self.deadband
+        return abs(state - last_state) >= band
+
+    def __repr__(self):
+        return (f"ReportingPolicy(deadband={self.deadband}, relative={self.relative}, "
+                f"min_interval={self.min_interval}, max_interval={self.max_interval})")
+
+
+class _TableState:
+    """Policy parameters and last reports as arrays over the rows of a table."""
+
+    def __init__(self, reporting, table):
+        self.table = table
+        self.size = 0
+        self.last_value = np.zeros(0)
+        self.last_time = np.zeros(0)
+        self.last_object = {}  # row -> last reported non-numeric state
+        self.reporting = reporting
+        self.rebuild()
+
+    def rebuild(self):
+        table = self.table
+        size = len(table)
+        known = self.size
+        # Last reports of known rows survive a rebuild
+        self.last_value = np.concatenate((self.last_value[:known], table.values[known:size]))
+        self.last_time = np.concatenate((self.last_time[:known], np.full(size - known, -np.inf)))
+        self.size = size
+        self.has = np.zeros(size, dtype=bool)
+        self.deadband = np.zeros(size)
+        self.relative = np.zeros(size, dtype=bool)
+        self.min_interval = np.zeros(size)
+        self.max_interval = np.full(size, np.inf)
+        type_codes = table.type_codes[:size]
+        for device_type, policy in self.reporting.by_type.items():
+            if device_type in table.types:
+                self._fill(type_codes == table.types.index(device_type), policy)
+        for device_id, policy in self.reporting.by_device.items():
+            i = table.find(device_id)
+            if i is not None:
+                self._fill(i, policy)
+        self.heartbeats = np.flatnonzero(np.isfinite(self.max_interval))
+
+    def _fill(self, rows, policy):
+        self.has[rows] = True
+        self.deadband[rows] = policy.deadband
+        self.relative[rows] = policy.relative
+        self.min_interval[rows] = policy.min_interval
+        self.max_interval[rows] = np.inf if policy.max_interval is None else policy.max_interval
+
+    def filter(self, batch, indices, now):
+        rows = batch.indices
+        kinds = batch.kinds
+        last = self.last_value[rows]
+        band = np.where(self.relative[rows], self.deadband[rows] * np.abs(last), self.deadband[rows])
+        # The deadband is for sensor values, switches report any change
+        moved = np.where(kinds == KIND_SENSOR, np.abs(batch.values - last) >= band, batch.values != last)
+        other = np.flatnonzero((kinds == KIND_OTHER) & self.has[rows])
+        if len(other):
+            # Their values are meaningless, compare with the last reported object
+            states = batch.states
+            last_object = self.last_object
+            for k, i in zip(other.tolist(), rows[other].tolist()):
+                moved[k] = i not in last_object or states[k] != last_object[i]
+        passes = moved & (now - self.last_time[rows] >= self.min_interval[rows])
+        # Rows without a policy or without any report so far always pass
+        passes |= ~self.has[rows] | np.isneginf(self.last_time[rows])
+        report = rows if passes.all() else rows[passes]
+        heartbeats = self.heartbeats
+        if indices is not None:
+            heartbeats = np.intersect1d(heartbeats, indices, assume_unique=True)
+        due = heartbeats[now - self.last_time[heartbeats] >= self.max_interval[heartbeats]]
+        if len(due):
+            report = np.union1d(report, due)
+        table = self.table
+        self.last_value[report] = table.values[report]
+        self.last_time[report] = now
+        for i in report[(table.kinds[report] == KIND_OTHER) & self.has[report]].tolist():
+            self.last_object[i] = table.objects[i]
+        if report is rows:
+            return batch
+        return ChangeBatch.from_table(self.table, report, now)
+
+
+class ReportingPolicies:
+    """The policies of a hub and the last report of every filtered device."""
+
+    def __init__(self):
+        self.by_device = {}
+        self.by_type = {}
+        self._last = {}  # device id -> (state, time)
+        self._heartbeats = False
+        self._table_state = None
+
+    def __bool__(self):
+        return bool(self.by_device or self.by_type)
+
+    def set(self, policy, device_id=None, device_type=None):
+        target = self.by_device if device_id is not None else self.by_type
+        key = device_id if device_id is not None else device_type
+        if key is None:
+            raise ValueError("Give a device_id or a device_type")
+        if policy is None:
+            target.pop(key, None)
+        else:
+            target[key] = policy
+        self._heartbeats = any(
+            policy.max_interval is not None
+            for policy in (*self.by_device.values(), *self.by_type.values())
+        )
+        if self._table_state is not None:
+            self._table_state.rebuild()
+
+    def policy_for(self, device_id, device_type):
+        policy = self.by_device.get(device_id)
+        return policy if policy is not None else self.by_type.get(device_type)
+
+    def filter(self, hub, batch, device_ids, now):
+        """The reported part of ``batch``, plus heartbeats of the ticked devices."""
+        if batch.indices is not None:
+            table = batch.table
+            state = self._table_state
+            if state is None or state.table is not table:
+                state = self._table_state = _TableState(self, table)
+            elif state.size != len(table):
+                state.rebuild()
+            return state.filter(batch, None if device_ids is None else hub._engine.indices(device_ids), now)
+        devices = hub.devices
+        last = self._last
+        reported = {}
+        filtered = False
+        for device_id, state in zip(batch.device_ids, batch.states):
+            policy = self.policy_for(device_id, devices[device_id].type)
+            if policy is not None:
+                last_state, last_time = last.get(device_id, (None, -math.inf))
+                if last_time != -math.inf and not policy.passes(state, last_state, now - last_time):
+                    filtered = True
+                    continue
+                last[device_id] = (state, now)
+            reported[device_id] = state
+        if self._heartbeats:
+            for device_id in devices if device_ids is None else device_ids:
+                device = devices.get(device_id)
+                if device is None or device_id in reported:
+                    continue
+                policy = self.policy_for(device_id, device.type)
+                if policy is None or policy.max_interval is None:
+                    continue
+                if now - last.get(device_id, (None, -math.inf))[1] >= policy.max_interval:
+                    reported[device_id] = device.state
+                    last[device_id] = (device.state, now)
+                    filtered = True
+        if not filtered:
+            return batch
+        return ChangeBatch(reported, reported.values(), [now] * len(reported))
@@ -0,0 +1,67 @@
+"""Deterministic random streams per device.
+
+Every device gets its own stream, keyed by a hash of the hub seed and the
+device id. The n-th number of a stream is computed from ``(key, n)`` with
+the SplitMix64 mixing function, so a stream needs no state besides its
+counter. A device's sequence therefore does not depend on the fleet size,
+the iteration order, the shard it runs on or other users of ``random``.
+Because the numbers are a pure function of key and counter, numpy can
+compute them for a whole fleet at once and gets exactly the same values as
+the scalar ``DeviceRandom``.
+"""
+import hashlib
+
+from .store import np
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_TO_UNIT = 1.0 / (1 << 53)
+
+
+def device_key(seed, device_id):
+    """64-bit stream key of a device."""
+    digest = hashlib.blake2b(f"{seed}:{device_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _splitmix(key, counter):
+    z = (key + (counter + 1) * _GOLDEN) & _MASK
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK
+    return z ^ (z >> 31)
+
+
+class DeviceRandom:
+    """Random stream of one device with the ``random.Random`` methods the hub uses."""
+
+    __slots__ = ("key", "counter")
+
+    def __init__(self, key, counter=0):
+        self.key = key
+        self.counter = counter
+
+    def random(self):
+        value = (_splitmix(self.key, self.counter) >> 11) * _TO_UNIT
+        self.counter += 1
+        return value
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+
+def bulk_random(keys, counters):
+    """The next value of many streams at once (``uint64`` arrays), like ``DeviceRandom.random``."""
+    with np.errstate(over="ignore"):
+        z = keys + (counters + np.uint64(1)) * np.uint64(_GOLDEN)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * _TO_UNIT
+
+
+def bulk_keys(seed, device_ids):
+    """Stream keys for many devices as a ``uint64`` array."""
+    return np.fromiter((device_key(seed, device_id) for device_id in device_ids),
+                       dtype=np.uint64, count=len(device_ids))
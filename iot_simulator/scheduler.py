@@ -0,0 +1,103 @@
+"""Priority queue scheduler for per-device update intervals.
+
+Devices that share an update interval and have no jitter are kept in one
+timer group and are woken together, so a fleet that only uses the default
+interval still costs a single heap entry. Devices with jitter get their own
+entry. Every wake-up is scheduled from the previous nominal due time, not
+from the time the update actually ran, so late wake-ups do not add up to
+drift. How late each wake-up was is recorded against the hub clock.
+"""
+import heapq
+import itertools
+import random
+
+DEFAULT_GROUP = "default"
+
+
+class UpdateScheduler:
+    """Heap of timer groups ordered by their next due time."""
+
+    def __init__(self, default_interval=5.0, seed=None):
+        self.default_interval = default_interval
+        self._heap = []
+        self._groups = {}
+        self._membership = {}
+        self._interval_groups = {}
+        self._seq = itertools.count()
+        # Own random stream, so jitter never shifts the device simulation
+        self._random = random.Random(seed)
+        # Drift statistics, measured against the hub clock
+        self.wakeups = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_lateness = 0.0
+
+    def _offset(self, jitter):
+        return self._random.uniform(-jitter, jitter) if jitter else 0.0
+
+    def add_group(self, key, interval, jitter=0.0, device_ids=None, now=0.0):
+        """Adds a timer group, ``device_ids=None`` stands for the default group."""
+        self._groups[key] = (interval, jitter, device_ids)
+        nominal = now + interval
+        heapq.heappush(self._heap, (nominal + self._offset(jitter), next(self._seq), key, nominal))
+
+    def assign(self, device_id, interval, jitter=0.0, now=0.0):
+        """Moves a device to its own update interval and jitter."""
+        old_key = self._membership.pop(device_id, None)
+        if old_key is not None:
+            device_ids = self._groups[old_key][2]
+            if len(device_ids) == 1:
+                # Stale heap entries of removed groups are skipped in pop_due
+                old_interval = self._groups.pop(old_key)[0]
+                if self._interval_groups.get(old_interval) == old_key:
+                    del self._interval_groups[old_interval]
+            else:
+                device_ids.remove(device_id)
+        key = self._interval_groups.get(interval) if not jitter else None
+        if key is not None:
+            self._groups[key][2].append(device_id)
+        else:
+            key = ("group", next(self._seq))
+            self.add_group(key, interval, jitter, [device_id], now=now)
+            if not jitter:
+                self._interval_groups[interval] = key
+        self._membership[device_id] = key
+
+    @classmethod
+    def for_intervals(cls, intervals, default_interval=5.0, now=0.0, seed=None):
+        """Builds the timer groups from a ``{device_id: (interval, jitter)}`` mapping."""
+        scheduler = cls(default_interval, seed)
+        scheduler.add_group(DEFAULT_GROUP, default_interval, now=now)
+        for device_id, (interval, jitter) in intervals.items():
+            scheduler.assign(device_id, interval, jitter, now=now)
+        return scheduler
+
+    def next_due(self):
+        """Time of the next wake-up, or ``None`` if nothing is scheduled."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Returns the due groups as a list of ``device_ids`` and reschedules them."""
+        due = []
+        self.last_lateness = 0.0
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, key, nominal = heapq.heappop(self._heap)
+            if key not in self._groups:
+                continue
+            lateness = now - fire_at
+            self.wakeups += 1
+            self.total_lateness += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.last_lateness = max(self.last_lateness, lateness)
+            interval, jitter, device_ids = self._groups[key]
+            due.append(device_ids)
+            nominal += interval
+            if nominal <= now:
+                # Far behind, skip missed periods instead of bursting to catch up
+                nominal += ((now - nominal) // interval + 1) * interval
+            heapq.heappush(self._heap, (nominal + self._offset(jitter), next(self._seq), key, nominal))
+        return due
+
+    @property
+    def mean_lateness(self):
+        return self.total_lateness / self.wakeups if self.wakeups else 0.0
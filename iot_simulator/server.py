@@ -0,0 +1,254 @@
+"""Network front-end: state changes out, commands in, over plain TCP.
+
+``HubServer`` serves a hub to many TCP clients on one asyncio loop. The
+protocol is newline-delimited JSON, one object per line.
+
+Client to server:
+
+* ``{"op": "subscribe", "id": ..., "type": ..., "pattern": ...}`` starts or
+  replaces the subscription of the connection, the filters work like in
+  ``register_callback`` (all optional, none means every device).
+* ``{"op": "unsubscribe"}``
+* ``{"op": "set", "id": "light_1", "state": true}`` or
+  ``{"op": "set", "states": {"light_1": true, ...}}`` sets device states.
+* ``{"op": "get", ...filters}`` asks for the current states.
+* ``{"op": "ping"}``
+
+Server to client:
+
+* ``{"op": "changes", "changes": [[id, state, timestamp], ...]}`` with the
+  changes of one hub batch that match the subscription.
+* ``{"op": "states", "states": {id: state, ...}}``, the answer to ``get``.
+* ``{"op": "ack"}`` / ``{"op": "pong"}`` for ``set`` / ``ping`` that carry
+  a ``"ref"``, which is echoed.
+* ``{"op": "dropped", "messages": n}`` when a slow client lost messages.
+* ``{"op": "error", "error": ...}``
+
+Every batch is encoded once per distinct subscription filter and the bytes
+are shared by all clients with that filter. A client's writer task sends
+all messages queued since its last write with a single ``write`` and then
+waits for ``drain``. If more than ``max_buffer`` bytes are queued for one
+client its oldest messages are dropped, the hub never waits for a slow
+client.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from fnmatch import fnmatchcase
+
+_LOGGER = logging.getLogger(__name__)
+
+_ALL = (None, None, None)
+
+
+def _encode(message):
+    return json.dumps(message, separators=(",", ":"), default=str).encode() + b"\n"
+
+
+class _Client:
+    """One connection with its subscription and its queue of encoded messages."""
+
+    def __init__(self, writer, max_buffer):
+        self.writer = writer
+        self.max_buffer = max_buffer
+        self.key = None  # (device_id, device_type, pattern) while subscribed
+        self._pending = deque()
+        self._pending_bytes = 0
+        self._ready = asyncio.Event()
+        self._lost = 0  # Dropped since the last "dropped" notice
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, data):
+        """Queues ``data`` without waiting, over ``max_buffer`` the oldest messages go."""
+        if self.closed:
+            return
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        while self._pending_bytes > self.max_buffer and len(self._pending) > 1:
+            self._pending_bytes -= len(self._pending.popleft())
+            self.dropped += 1
+            self._lost += 1
+        self._ready.set()
+
+    async def write_loop(self):
+        writer = self.writer
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                if not self._pending:
+                    continue
+                chunks = list(self._pending)
+                if self._lost:
+                    chunks.insert(0, _encode({"op": "dropped", "messages": self._lost}))
+                    self._lost = 0
+                self.sent += len(self._pending)
+                self._pending.clear()
+                self._pending_bytes = 0
+                writer.write(b"".join(chunks))
+                await writer.drain()
+        except ConnectionError:
+            self.closed = True
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+        self.writer.close()
+
+
+class HubServer:
+    """Serves the changes of ``hub`` to TCP clients and takes commands from them.
+
+        async with HubServer(hub, port=8765) as server:
+            await hub.start_background_updates()
+
+    ``port=0`` picks a free port, see ``port`` once started.
+    """
+
+    def __init__(self, hub, host="127.0.0.1", port=8765, max_buffer=1 << 20, backlog=1024):
+        self.hub = hub
+        self.host = host
+        self.max_buffer = max_buffer
+        self.backlog = backlog
+        self._port = port
+        self._server = None
+        self._subscriber = None
+        self._clients = set()
+        self._groups = {}  # subscription filter -> clients
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1] if self._server is not None else self._port
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    async def start(self):
+        self._subscriber = self.hub.register_batch_callback(self._publish)
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self._port, backlog=self.backlog
+        )
+        _LOGGER.info(f"Hub server hört auf {self.host}:{self.port}")
+        return self
+
+    async def close(self):
+        if self._subscriber is not None:
+            self.hub.unregister_batch_callback(self._subscriber)
+            self._subscriber = None
+        if self._server is not None:
+            self._server.close()
+            for client in list(self._clients):
+                client.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _matches(self, key, device_id):
+        wanted_id, device_type, pattern = key
+        return (
+            (wanted_id is None or device_id == wanted_id)
+            and (pattern is None or fnmatchcase(device_id, pattern))
+            and (device_type is None or self.hub._device_type(device_id) == device_type)
+        )
+
+    def _publish(self, batch):
+        """Batch callback, encodes the batch once per subscription filter."""
+        if not self._groups:
+            return
+        rows = list(zip(batch.device_ids, batch.states, batch.timestamps))
+        for key, clients in self._groups.items():
+            changes = rows if key == _ALL else [row for row in rows if self._matches(key, row[0])]
+            if not changes:
+                continue
+            data = _encode({"op": "changes", "changes": changes})
+            for client in clients:
+                client.send(data)
+
+    def _subscribe(self, client, key):
+        self._unsubscribe(client)
+        self._groups.setdefault(key, set()).add(client)
+        client.key = key
+
+    def _unsubscribe(self, client):
+        clients = self._groups.get(client.key)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del self._groups[client.key]
+        client.key = None
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer, self.max_buffer)
+        self._clients.add(client)
+        writing = asyncio.create_task(client.write_loop())
+        try:
+            while not client.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self._command(client, line)
+        except (ConnectionError, ValueError):
+            pass  # Gone, or a line over the stream limit
+        finally:
+            # Keys are validated strings, none of this can raise
+            self._clients.discard(client)
+            writing.cancel()
+            client.close()
+            self._unsubscribe(client)
+
+    async def _command(self, client, line):
+        try:
+            message = json.loads(line)
+            op = message.get("op")
+        except (ValueError, AttributeError):
+            client.send(_encode({"op": "error", "error": "Invalid message"}))
+            return
+        key = (message.get("id"), message.get("type"), message.get("pattern"))
+        if not all(value is None or isinstance(value, str) for value in key):
+            client.send(_encode({"op": "error", "error": "id, type and pattern must be strings"}))
+            return
+        try:
+            await self._run(client, op, message, key)
+        except (TypeError, ValueError) as err:
+            # Bad arguments of a command, e.g. states that are no mapping
+            client.send(_encode({"op": "error", "error": str(err)}))
+
+    async def _run(self, client, op, message, key):
+        if op == "subscribe":
+            self._subscribe(client, key)
+        elif op == "unsubscribe":
+            self._unsubscribe(client)
+        elif op == "set":
+            if "states" in message:
+                if not isinstance(message["states"], dict):
+                    raise TypeError("states must be an object of device ids to states")
+                await self.hub.set_device_states(message["states"])
+            elif message.get("id") in self.hub.devices:
+                await self.hub.set_device_state(message["id"], message.get("state"))
+            else:
+                client.send(_encode({"op": "error", "error": f"Unknown device {message.get('id')!r}"}))
+                return
+            if "ref" in message:
+                client.send(_encode({"op": "ack", "ref": message["ref"]}))
+        elif op == "get":
+            devices = self.hub.devices
+            selected = devices if key == _ALL else [dev_id for dev_id in devices if self._matches(key, dev_id)]
+            client.send(_encode({"op": "states", "states": {dev_id: devices[dev_id].state for dev_id in selected}}))
+        elif op == "ping":
+            client.send(_encode({"op": "pong", "ref": message.get("ref")}))
+        else:
+            client.send(_encode({"op": "error", "error": f"Unknown op {op!r}"}))
+
+
+async def start_server(hub, host="127.0.0.1", port=8765, **options):
+    """Starts a ``HubServer`` for ``hub`` and returns it."""
+    return await HubServer(hub, host, port, **options).start()
@@ -0,0 +1,323 @@
+"""Sharded hub that spreads a fleet across several worker processes.
+
+Every shard is a ``SimulatedHub`` running its own update loop in its own
+process. Shards send one compact message per tick back to the parent
+(device positions instead of ids, one timestamp per batch). The parent
+keeps a mirror of all devices, routes writes to the owning shard and feeds
+the changes into the normal callback machinery.
+
+Both sides send through a ``_PipeWriter`` thread, a pipe that is full never
+blocks an event loop, so parent and shard keep reading while large batches
+and commands cross. A shard runs the commands in the order they arrive.
+"""
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+from .events import ChangeBatch
+from .hub import SimulatedDevice, SimulatedHub
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def shard_of(device_id, shards):
+    """Stable shard number of a device, the same in every process and run."""
+    return zlib.crc32(device_id.encode()) % shards
+
+
+def _device_spec(device):
+    return (device.id, device.name, device.type, device.state, device.simulation_enabled)
+
+
+class _PipeWriter:
+    """Sends the messages for ``conn`` from its own thread, in order."""
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def send(self, message):
+        """Queues ``message`` without waiting for the other side to read."""
+        self._queue.put(message)
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                return  # The other side is gone
+
+    def close(self, timeout=None):
+        """Sends what is queued and stops the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+def _shard_main(conn, specs, intervals, options):
+    """Entry point of a worker process."""
+    devices = []
+    for device_id, name, device_type, state, enabled in specs:
+        device = SimulatedDevice(device_id, name, device_type, state)
+        device.simulation_enabled = enabled
+        devices.append(device)
+    hub = SimulatedHub(devices=devices, **options)
+    for device_id, (interval, jitter) in intervals.items():
+        hub.set_update_interval(device_id, interval, jitter)
+    position = {device_id: i for i, device_id in enumerate(hub.devices)}
+    writer = _PipeWriter(conn, "iot-shard-writer")
+
+    def send_batch(batch):
+        writer.send(([position[device_id] for device_id in batch.device_ids],
+                     batch.states, batch.timestamps[0]))
+
+    hub.register_batch_callback(send_batch)
+    asyncio.run(_shard_loop(hub, conn))
+    writer.close(timeout=5)
+    conn.close()
+
+
+async def _run_command(hub, command, args):
+    if command == "set":
+        await hub.set_device_state(*args)
+    elif command == "toggle":
+        await hub.toggle_simulation(*args)
+    elif command == "set_many":
+        await hub.set_device_states(*args)
+    elif command == "simulation":
+        enable, device_ids = args
+        await hub.set_simulation(enable, device_ids=device_ids)
+    elif command == "tick":
+        hub._background_update_once(*args)
+
+
+async def _shard_loop(hub, conn):
+    loop = asyncio.get_running_loop()
+    commands = asyncio.Queue()
+
+    def on_command():
+        try:
+            while conn.poll():
+                commands.put_nowait(conn.recv())
+        except EOFError:
+            commands.put_nowait(("stop",))  # The parent is gone
+
+    loop.add_reader(conn.fileno(), on_command)
+    updates = loop.create_task(hub.start_background_updates())
+    try:
+        while True:
+            # One consumer, so commands run in the order they arrived
+            command, *args = await commands.get()
+            if command == "stop":
+                break
+            await _run_command(hub, command, args)
+    finally:
+        updates.cancel()
+        await asyncio.gather(updates, return_exceptions=True)
+        loop.remove_reader(conn.fileno())
+
+
+class ShardStats:
+    """Throughput counters of one shard, as seen by the parent."""
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.batches = 0
+        self.events = 0
+        self.started = time.monotonic()
+
+    @property
+    def events_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.events / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "devices": self.devices,
+            "batches": self.batches,
+            "events": self.events,
+            "events_per_second": self.events_per_second,
+        }
+
+
+class ShardedHub(SimulatedHub):
+    """``SimulatedHub`` whose devices are simulated in ``shards`` processes.
+
+    ``devices``, ``register_callback``, ``register_batch_callback``,
+    ``subscribe``, ``set_device_state`` and ``toggle_simulation`` work as on
+    a single hub. ``devices`` is a mirror that follows the shards, a write
+    through ``set_device_state`` is visible (and reported) once the owning
+    shard has applied it. ``shard_options`` are passed to every shard's
+    ``SimulatedHub``, e.g. ``{"vectorized": True}``. With a ``seed`` every
+    device follows the same trajectory as in a single seeded hub.
+
+    Before ``start`` all writes go to the mirror like on a single hub, the
+    shards start from it. ``_background_update_once`` asks the running
+    shards for one extra tick, without shards there is nothing to tick.
+    """
+
+    def __init__(self, shards=2, update_interval=5.0, devices=None, shard_options=None, seed=None):
+        super().__init__(update_interval=update_interval, devices=devices, seed=seed)
+        self.shards = shards
+        self.shard_options = dict(shard_options or {}, update_interval=update_interval, seed=seed)
+        self._shard_ids = [[] for _ in range(shards)]
+        for device_id in self.devices:
+            self._shard_ids[shard_of(device_id, shards)].append(device_id)
+        self._processes = []
+        self._connections = []
+        self._writers = []
+        self._stopping = False
+        self._stopping = False
+        self.stats = []
+
+    async def start(self):
+        """Starts the worker processes."""
+        loop = asyncio.get_running_loop()
+        # Spawn instead of fork, the parent may already run an event loop
+        context = multiprocessing.get_context("spawn")
+        for shard, device_ids in enumerate(self._shard_ids):
+            parent_conn, child_conn = context.Pipe()
+            specs = [_device_spec(self.devices[device_id]) for device_id in device_ids]
+            intervals = {d: self._intervals[d] for d in device_ids if d in self._intervals}
+            process = context.Process(
+                target=_shard_main,
+                args=(child_conn, specs, intervals, self.shard_options),
+                name=f"iot-shard-{shard}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(parent_conn)
+            self._writers.append(_PipeWriter(parent_conn, f"iot-shard-{shard}-writer"))
+            self.stats.append(ShardStats(len(device_ids)))
+            loop.add_reader(parent_conn.fileno(), self._receive, shard)
+
+    async def stop(self):
+        """Stops all worker processes."""
+        loop = asyncio.get_running_loop()
+        self._stopping = True
+        for writer in self._writers:
+            writer.send(("stop",))
+        # Keep reading while the shards finish, one may be sending a batch
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        for writer in self._writers:
+            await loop.run_in_executor(None, writer.close, 5)
+        for conn in self._connections:
+            loop.remove_reader(conn.fileno())
+            conn.close()
+        self._processes = []
+        self._connections = []
+        self._writers = []
+        self._stopping = False
+
+    async def start_background_updates(self):
+        """Runs the shards until the task is cancelled."""
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    def _background_update_once(self, device_ids=None):
+        if device_ids is None:
+            for writer in self._writers:
+                writer.send(("tick",))
+            return
+        for shard, shard_ids in self._per_shard(device_ids).items():
+            self._writers[shard].send(("tick", shard_ids))
+
+    def _per_shard(self, device_ids):
+        """Known ``device_ids`` grouped by the shard that owns them."""
+        per_shard = {}
+        for device_id in device_ids:
+            if device_id in self.devices:
+                per_shard.setdefault(shard_of(device_id, self.shards), []).append(device_id)
+        return per_shard
+
+    def _receive(self, shard):
+        conn = self._connections[shard]
+        try:
+            while conn.poll():
+                positions, states, timestamp = conn.recv()
+                self._apply(shard, positions, states, timestamp)
+        except EOFError:
+            if not self._stopping:
+                _LOGGER.warning("Shard %s has stopped", shard)
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+
+    def _apply(self, shard, positions, states, timestamp):
+        shard_ids = self._shard_ids[shard]
+        device_ids = [shard_ids[i] for i in positions]
+        for device_id, state in zip(device_ids, states):
+            self.devices[device_id].state = state
+        stats = self.stats[shard]
+        stats.batches += 1
+        stats.events += len(device_ids)
+        self._emit(ChangeBatch(device_ids, states, [timestamp] * len(device_ids)))
+
+    def _send(self, device_id, command):
+        if device_id in self.devices:
+            self._writers[shard_of(device_id, self.shards)].send(command)
+
+    async def set_device_state(self, device_id, new_state):
+        if not self._connections:
+            return await super().set_device_state(device_id, new_state)
+        self._send(device_id, ("set", device_id, new_state))
+
+    async def toggle_simulation(self, device_id, enable: bool):
+        if not self._connections:
+            return await super().toggle_simulation(device_id, enable)
+        if device_id in self.devices:
+            self.devices[device_id].simulation_enabled = enable
+            self._send(device_id, ("toggle", device_id, enable))
+
+    async def set_device_states(self, states, values=None):
+        """Routes the states to their shards, returns how many differ from the mirror."""
+        if not self._connections:
+            return await super().set_device_states(states, values)
+        if values is not None:
+            pairs = zip(states, values.tolist() if hasattr(values, "tolist") else values)
+        elif hasattr(states, "items"):
+            pairs = states.items()
+        else:
+            pairs = states
+        devices = self.devices
+        per_shard = {}
+        changed = set()
+        for device_id, state in pairs:
+            if device_id in devices:
+                per_shard.setdefault(shard_of(device_id, self.shards), []).append((device_id, state))
+                if devices[device_id].state != state:
+                    changed.add(device_id)
+                else:
+                    changed.discard(device_id)
+        for shard, shard_pairs in per_shard.items():
+            # One message and one batch per shard, atomic within the shard
+            self._writers[shard].send(("set_many", shard_pairs))
+        return len(changed)
+
+    async def set_simulation(self, enable: bool, device_ids=None, device_type=None, prefix=None,
+                             pattern=None):
+        selected = self._select(device_ids, device_type, prefix, pattern)
+        for device_id in selected:
+            self.devices[device_id].simulation_enabled = enable
+        if self._connections:
+            for shard, shard_ids in self._per_shard(selected).items():
+                self._writers[shard].send(("simulation", enable, shard_ids))
+        return len(selected)
+
+    def shard_stats(self):
+        """Aggregate throughput per shard."""
+        return [stats.as_dict() for stats in self.stats]
@@ -0,0 +1,309 @@
+"""Snapshots and incremental checkpoints of a hub's simulated state.
+
+A snapshot frame stores, for every device it covers, the state, the
+simulation flag and the counter of the device's random stream, plus the
+state of the ``random`` module for unseeded hubs and the clock time. The
+columns are written as raw arrays, so a compact hub writes them straight
+from its ``DeviceTable``.
+
+Frame layout (little-endian):
+
+* header ``<8sBdQQ``: magic, kind (0 full, 1 delta), clock time, number of
+  devices, length of the body,
+* body: ``random`` state (``<I`` length, 625 ``uint32`` words and the
+  ``gauss`` spare as ``double``, empty for seeded hubs), ids (``<Q`` length,
+  UTF-8 joined by ``\\0``), kinds ``uint8``, values ``float64``, flags
+  ``uint8``, stream counters ``uint64``, and the non-numeric states as a
+  JSON list (``<Q`` length).
+
+A checkpoint file is a full frame followed by delta frames that only hold
+the devices changed since the frame before. ``restore`` applies all frames
+of a file in order and ignores a truncated last frame, e.g. from a crash
+while writing.
+"""
+import json
+import random
+import struct
+import sys
+from array import array
+
+from .rng import DeviceRandom, device_key
+from .store import _KINDS, KIND_OTHER, KIND_SWITCH, DeviceTable, _state_kind, np
+
+MAGIC = b"IOTSNAP1"
+
+FULL = 0
+DELTA = 1
+
+_HEADER = struct.Struct("<8sBdQQ")
+_LENGTH = struct.Struct("<Q")
+_RNG_LENGTH = struct.Struct("<I")
+_GAUSS = struct.Struct("<d")
+
+
+def _raw(typecode, items):
+    column = array(typecode, items)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _column(typecode, data):
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+class DirtyTracker:
+    """Devices changed since the last checkpoint.
+
+    Fed by the hub with every emitted batch, simulation flag change and,
+    for seeded hubs, the devices that drew random numbers in a tick (their
+    streams moved on, even without a change). Rows of the hub's own ``DeviceTable`` are kept in a mask.
+    """
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.ids = set()
+        self.rows = None
+        self.all = False
+
+    def add(self, device_ids):
+        if device_ids is None:
+            self.all = True
+        elif not self.all:
+            self.ids.update(device_ids)
+
+    def add_batch(self, batch):
+        if self.all:
+            return
+        if batch.indices is not None:
+            self.add_rows(batch.table, batch.indices)
+        else:
+            self.ids.update(batch.device_ids)
+
+    def add_rows(self, table, rows):
+        """Marks rows of ``table``, the hub's own table or the private one of an engine."""
+        if self.all or not len(rows):
+            return
+        if table is not self.devices:
+            self.ids.update(table.id_at(i) for i in rows.tolist())
+            return
+        size = len(self.devices)
+        if self.rows is None or len(self.rows) < size:
+            grown = np.zeros(size, dtype=bool)
+            if self.rows is not None:
+                grown[: len(self.rows)] = self.rows
+            self.rows = grown
+        self.rows[rows] = True
+
+    def clear(self):
+        self.ids = set()
+        self.rows = None
+        self.all = False
+
+    def selection(self):
+        """Ids (dict store) or rows (table) of the dirty devices, ``None`` for all."""
+        if self.all:
+            return None
+        if not isinstance(self.devices, DeviceTable):
+            return [device_id for device_id in self.ids if device_id in self.devices]
+        rows = set(np.flatnonzero(self.rows).tolist()) if self.rows is not None else set()
+        for device_id in self.ids:
+            i = self.devices.find(device_id)
+            if i is not None:
+                rows.add(i)
+        return np.array(sorted(rows), dtype=np.intp)
+
+
+def _rng_state(hub):
+    if hub.seed is not None:
+        return b""
+    _, words, gauss = random.getstate()
+    return _raw("I", words) + _GAUSS.pack(float("nan") if gauss is None else gauss)
+
+
+def _table_columns(table, rows):
+    ids = table.ids
+    kinds = table.kinds[rows]
+    others = [table.objects[i] for i in rows[kinds == KIND_OTHER].tolist()]
+    return (
+        [ids[i] for i in rows.tolist()],
+        kinds.astype("<u1").tobytes(),
+        table.values[rows].astype("<f8").tobytes(),
+        table.enabled[rows].astype("<u1").tobytes(),
+        others,
+    )
+
+
+def _dict_columns(devices, device_ids):
+    ids = list(devices) if device_ids is None else list(device_ids)
+    kinds, values, enabled, others = [], [], [], []
+    for device_id in ids:
+        device = devices[device_id]
+        state = device.state
+        kind = _state_kind(_KINDS.get(device.type, KIND_OTHER), state)
+        kinds.append(kind)
+        if kind == KIND_OTHER:
+            values.append(0.0)
+            others.append(state)
+        else:
+            values.append(float(state))
+        enabled.append(1 if device.simulation_enabled else 0)
+    return ids, _raw("B", kinds), _raw("d", values), _raw("B", enabled), others
+
+
+def _counters(hub, ids, rows):
+    """Stream counters of ``ids`` as raw ``uint64``, zeros for unseeded hubs."""
+    if hub.seed is None:
+        return bytes(8 * len(ids))
+    engine = hub._engine
+    if engine is not None:
+        counters = engine._streams(len(engine.table))[1]
+        if rows is None or not engine.shared:
+            index = engine.table.index
+            rows = np.array([index[device_id] for device_id in ids], dtype=np.intp)
+        return counters[rows].astype("<u8").tobytes()
+    streams = hub._streams
+    return _raw("Q", [streams[device_id].counter if device_id in streams else 0 for device_id in ids])
+
+
+def encode_frame(hub, selection=None, kind=FULL):
+    """One frame with the devices of ``selection`` (see ``DirtyTracker``), all with ``None``."""
+    devices = hub.devices
+    rows = None
+    if isinstance(devices, DeviceTable):
+        rows = np.arange(len(devices), dtype=np.intp) if selection is None else selection
+        ids, kinds, values, enabled, others = _table_columns(devices, rows)
+    else:
+        ids, kinds, values, enabled, others = _dict_columns(devices, selection)
+    rng = _rng_state(hub)
+    encoded_ids = "\0".join(ids).encode()
+    encoded_others = json.dumps(others).encode()
+    body = b"".join((
+        _RNG_LENGTH.pack(len(rng)), rng,
+        _LENGTH.pack(len(encoded_ids)), encoded_ids,
+        kinds, values, enabled,
+        _counters(hub, ids, rows),
+        _LENGTH.pack(len(encoded_others)), encoded_others,
+    ))
+    return _HEADER.pack(MAGIC, kind, hub.clock.time(), len(ids), len(body)) + body
+
+
+def read_frames(data):
+    """Decoded frames of ``data`` as dicts, a truncated last frame is skipped."""
+    offset = 0
+    end = len(data)
+    while offset + _HEADER.size <= end:
+        magic, kind, timestamp, count, length = _HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError(f"Not a hub snapshot at byte {offset}")
+        offset += _HEADER.size
+        if offset + length > end:
+            return  # Cut off while writing
+        body = memoryview(data)[offset : offset + length]
+        offset += length
+        at = 0
+        (rng_length,) = _RNG_LENGTH.unpack_from(body, at)
+        at += _RNG_LENGTH.size
+        rng = bytes(body[at : at + rng_length])
+        at += rng_length
+        (ids_length,) = _LENGTH.unpack_from(body, at)
+        at += _LENGTH.size
+        ids = bytes(body[at : at + ids_length]).decode().split("\0") if count else []
+        at += ids_length
+        kinds = _column("B", body[at : at + count])
+        at += count
+        values = _column("d", body[at : at + 8 * count])
+        at += 8 * count
+        enabled = _column("B", body[at : at + count])
+        at += count
+        counters = _column("Q", body[at : at + 8 * count])
+        at += 8 * count
+        (others_length,) = _LENGTH.unpack_from(body, at)
+        at += _LENGTH.size
+        others = json.loads(bytes(body[at : at + others_length]))
+        yield {
+            "kind": kind, "time": timestamp, "rng": rng, "ids": ids, "kinds": kinds,
+            "values": values, "enabled": enabled, "counters": counters, "others": others,
+        }
+
+
+def _states(frame):
+    """``(device_id, state, enabled, counter)`` rows of a frame."""
+    others = iter(frame["others"])
+    for device_id, kind, value, enabled, counter in zip(
+        frame["ids"], frame["kinds"], frame["values"], frame["enabled"], frame["counters"]
+    ):
+        if kind == KIND_OTHER:
+            state = next(others)
+        elif kind == KIND_SWITCH:
+            state = value != 0.0
+        else:
+            state = value
+        yield device_id, state, bool(enabled), counter
+
+
+def _apply_table(hub, frame):
+    """Bulk path for a hub that stores its devices in a ``DeviceTable``."""
+    table = hub.devices
+    ids = frame["ids"]
+    if len(ids) == len(table) and ids == table.ids:
+        rows = np.arange(len(ids), dtype=np.intp)  # Same fleet, no lookups needed
+    else:
+        index = table.index
+        rows = np.array([index.get(device_id, -1) for device_id in ids], dtype=np.intp)
+    kinds = np.frombuffer(frame["kinds"], dtype=np.uint8)
+    known = rows >= 0
+    target = rows[known]
+    table.values[target] = np.frombuffer(frame["values"], dtype=np.float64)[known]
+    table.kinds[target] = kinds[known]
+    table.enabled[target] = np.frombuffer(frame["enabled"], dtype=np.uint8)[known] != 0
+    for i, state in zip(rows[kinds == KIND_OTHER].tolist(), frame["others"]):
+        if i >= 0:
+            table.objects[i] = state
+    if hub.seed is not None:
+        counters = np.frombuffer(frame["counters"], dtype=np.uint64)[known]
+        engine = hub._engine
+        if engine is not None and engine.shared:
+            engine._streams(len(table))[1][target] = counters
+        else:
+            for i, counter in zip(target.tolist(), counters.tolist()):
+                device_id = table.id_at(i)
+                hub._streams[device_id] = DeviceRandom(device_key(hub.seed, device_id), counter)
+    return len(target)
+
+
+def apply_frame(hub, frame):
+    """Writes a decoded frame into ``hub``, returns the number of known devices."""
+    if isinstance(hub.devices, DeviceTable):
+        restored = _apply_table(hub, frame)
+    else:
+        devices = hub.devices
+        engine = hub._engine
+        seeded = hub.seed is not None
+        counters = engine._streams(len(engine.table))[1] if engine is not None and seeded else None
+        restored = 0
+        for device_id, state, enabled, counter in _states(frame):
+            device = devices.get(device_id)
+            if device is None:
+                continue
+            restored += 1
+            device.state = state
+            device.simulation_enabled = enabled
+            if engine is not None:
+                engine.set_state(device_id, state)
+                engine.set_enabled(device_id, enabled)
+                if seeded:
+                    counters[engine.table.find(device_id)] = counter
+            elif seeded:
+                hub._streams[device_id] = DeviceRandom(device_key(hub.seed, device_id), counter)
+    if frame["rng"]:
+        words = _column("I", frame["rng"][: -_GAUSS.size])
+        (gauss,) = _GAUSS.unpack(frame["rng"][-_GAUSS.size :])
+        random.setstate((3, tuple(words), None if gauss != gauss else gauss))
+    if hasattr(hub.clock, "advance"):
+        hub.clock.now = frame["time"]  # Virtual time continues where it was
+    return restored
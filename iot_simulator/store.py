@@ -0,0 +1,417 @@
+"""Compact device storage for very large fleets.
+
+``DeviceTable`` keeps all devices of a hub in a struct-of-arrays layout and
+hands out lightweight ``DeviceView`` objects that read and write straight
+into those arrays. It is a drop-in replacement for the ``devices`` dict of
+``SimulatedHub``, ``hub.devices[id].state`` and ``.simulation_enabled``
+keep working.
+"""
+import bisect
+from collections.abc import Mapping, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+# Per-type metadata, stored once per type instead of per device. Devices
+# hand out a copy of the options, so changing it never touches other devices
+DEVICE_UNITS = {"sensor": "°C"}
+DEVICE_OPTIONS = {"select": ("Eco", "Comfort", "Boost")}
+
+KIND_OTHER = 0
+KIND_SENSOR = 1
+KIND_SWITCH = 2
+
+_KINDS = {"sensor": KIND_SENSOR, "switch": KIND_SWITCH}
+
+
+def _state_kind(kind, state):
+    """Storage kind of ``state`` on a device whose type has ``kind``."""
+    if kind == KIND_SWITCH and not isinstance(state, bool):
+        return KIND_OTHER
+    if kind == KIND_SENSOR and (isinstance(state, bool) or not isinstance(state, (int, float))):
+        # Not a number, the value is kept as a plain object instead
+        return KIND_OTHER
+    return kind
+
+
+def _metadata(overrides, key, device_type):
+    """Unit or options of a device, an assigned value wins over the type default."""
+    if overrides is not None and key in overrides:
+        return overrides[key]
+    if key == "unit":
+        return DEVICE_UNITS.get(device_type)
+    options = DEVICE_OPTIONS.get(device_type)
+    return list(options) if options is not None else None
+
+
+def require_numpy(feature):
+    if np is None:
+        raise ImportError(
+            f"{feature} needs numpy, install it with 'pip install simlauted-iot[fast]'"
+        )
+
+
+class NameTemplate(Sequence):
+    """``count`` strings ``template.format(n=n)`` for ``n`` from ``first``.
+
+    Stands in for a list of generated ids or names, the strings are only
+    formatted when they are read.
+    """
+
+    __slots__ = ("template", "first", "count")
+
+    def __init__(self, template, count, first=1):
+        self.template = template
+        self.first = first
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[i] for i in range(*k.indices(self.count))]
+        if k < 0:
+            k += self.count
+        if not 0 <= k < self.count:
+            raise IndexError(k)
+        return self.template.format(n=self.first + k)
+
+    def __iter__(self):
+        template = self.template
+        return (template.format(n=n) for n in range(self.first, self.first + self.count))
+
+    @property
+    def simple(self):
+        """Whether ``{n}`` is the only field, which ``find`` needs."""
+        return self.template.count("{") == 1 and "{n}" in self.template
+
+    def find(self, value):
+        """Position of ``value`` in a ``simple`` template, ``None`` if it is not there."""
+        prefix, _, suffix = self.template.partition("{n}")
+        if not (value.startswith(prefix) and value.endswith(suffix)):
+            return None
+        number = value[len(prefix) : len(value) - len(suffix)]
+        # Only the canonical spelling, "room_007" is not "room_7"
+        if not number.isdigit() or str(int(number)) != number:
+            return None
+        k = int(number) - self.first
+        return k if 0 <= k < self.count else None
+
+
+class TemplateColumn(Sequence):
+    """List of strings that keeps ``NameTemplate`` chunks unformatted.
+
+    Reading single items formats just that item, ``tolist()`` turns the
+    column into one plain list for bulk access.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._starts = []
+        self._overrides = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _locate(self, i):
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError(i)
+        c = bisect.bisect_right(self._starts, i) - 1
+        return self._chunks[c], i - self._starts[c], i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.tolist()[i]
+        chunk, k, i = self._locate(i)
+        if self._overrides and i in self._overrides:
+            return self._overrides[i]
+        return chunk[k]
+
+    def __setitem__(self, i, value):
+        chunk, k, i = self._locate(i)
+        if isinstance(chunk, list):
+            chunk[k] = value
+        else:
+            self._overrides[i] = value
+
+    def __iter__(self):
+        if self._overrides:
+            return iter(self.tolist())
+        return (item for chunk in self._chunks for item in chunk)
+
+    def append(self, value):
+        if not self._chunks or not isinstance(self._chunks[-1], list):
+            self._starts.append(self._size)
+            self._chunks.append([])
+        self._chunks[-1].append(value)
+        self._size += 1
+
+    def extend(self, items):
+        """Appends a list or a ``NameTemplate``, the latter stays lazy."""
+        if not isinstance(items, NameTemplate):
+            for item in items:
+                self.append(item)
+            return
+        if len(items):
+            self._starts.append(self._size)
+            self._chunks.append(items)
+            self._size += len(items)
+
+    def tolist(self):
+        """All items as one list, which the column keeps using afterwards."""
+        if len(self._chunks) != 1 or not isinstance(self._chunks[0], list):
+            items = [item for chunk in self._chunks for item in chunk]
+            for i, value in self._overrides.items():
+                items[i] = value
+            self._chunks, self._starts, self._overrides = [items], [0], {}
+        return self._chunks[0]
+
+
+class DeviceView:
+    """Lightweight handle on one row of a ``DeviceTable``."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    @property
+    def id(self):
+        return self._table.id_at(self._index)
+
+    @property
+    def name(self):
+        return self._table.names[self._index]
+
+    @property
+    def type(self):
+        return self._table.types[self._table.type_codes[self._index]]
+
+    @property
+    def unit(self):
+        return _metadata(self._table.metadata.get(self._index), "unit", self.type)
+
+    @unit.setter
+    def unit(self, value):
+        self._table.metadata.setdefault(self._index, {})["unit"] = value
+
+    @property
+    def options(self):
+        return _metadata(self._table.metadata.get(self._index), "options", self.type)
+
+    @options.setter
+    def options(self, value):
+        self._table.metadata.setdefault(self._index, {})["options"] = value
+
+    @property
+    def state(self):
+        return self._table.get_state(self._index)
+
+    @state.setter
+    def state(self, value):
+        self._table.set_state(self._index, value)
+
+    @property
+    def simulation_enabled(self):
+        return bool(self._table.enabled[self._index])
+
+    @simulation_enabled.setter
+    def simulation_enabled(self, value):
+        self._table.enabled[self._index] = value
+
+    def update_state(self, new_state):
+        if self.state == new_state:
+            return False  # No change, do not update
+        self.state = new_state
+        return True
+
+    def __repr__(self):
+        return f"DeviceView({self.id!r}, state={self.state!r})"
+
+
+class DeviceTable(Mapping):
+    """Struct-of-arrays device store with a ``dict``-like interface.
+
+    Sensor values and switch states live in one ``float64`` array, any other
+    state (select options, strings) in a plain list. The simulation flags
+    are a ``bool`` array. Adding a device appends a row, rows are never
+    removed.
+
+    ``extend`` adds whole blocks of devices at once. Ids and names of a
+    block can be a ``NameTemplate``, they are only formatted on first use.
+    Single ids of such a block are found by parsing them, the full ``index``
+    dict is built when bulk code asks for it.
+    """
+
+    def __init__(self, capacity=16):
+        require_numpy("DeviceTable")
+        self._ids = TemplateColumn()
+        self.names = TemplateColumn()
+        self._index = {}
+        self._templates = []  # (first row, NameTemplate) of blocks missing in _index
+        self.types = []
+        self._type_index = {}
+        self.objects = []
+        self.metadata = {}  # row -> unit and options assigned to single devices
+        capacity = max(capacity, 1)
+        self.type_codes = np.zeros(capacity, dtype=np.uint8)
+        self.kinds = np.zeros(capacity, dtype=np.uint8)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.enabled = np.zeros(capacity, dtype=bool)
+
+    @classmethod
+    def from_devices(cls, devices):
+        """Copies a mapping of device objects into a new table."""
+        table = cls(capacity=len(devices))
+        for dev_id, device in devices.items():
+            table.add(dev_id, device.name, device.type, device.state, device.simulation_enabled)
+        return table
+
+    @property
+    def ids(self):
+        return self._ids.tolist()
+
+    @property
+    def index(self):
+        """Dict of all ids to their row."""
+        if self._templates:
+            for start, ids in self._templates:
+                self._index.update(zip(ids, range(start, start + len(ids))))
+            self._templates = []
+        return self._index
+
+    def find(self, device_id):
+        """Row of ``device_id`` or ``None``, without building the full index."""
+        i = self._index.get(device_id)
+        if i is None and self._templates and isinstance(device_id, str):
+            for start, ids in self._templates:
+                k = ids.find(device_id)
+                if k is not None:
+                    return start + k
+        return i
+
+    def id_at(self, i):
+        """Id of row ``i`` without formatting the other ids."""
+        return self._ids[i]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __contains__(self, device_id):
+        return self.find(device_id) is not None
+
+    def __getitem__(self, device_id):
+        i = self.find(device_id)
+        if i is None:
+            raise KeyError(device_id)
+        return DeviceView(self, i)
+
+    def __setitem__(self, device_id, device):
+        self.add(device_id, device.name, device.type, device.state, device.simulation_enabled)
+
+    def _grow(self, needed):
+        capacity = len(self.values)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in ("type_codes", "kinds", "values", "enabled"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    def _type_code(self, device_type):
+        code = self._type_index.get(device_type)
+        if code is None:
+            code = self._type_index[device_type] = len(self.types)
+            self.types.append(device_type)
+        return code
+
+    def add(self, device_id, name, device_type, state, simulation_enabled=True):
+        """Adds a device or overwrites the row of an existing id."""
+        i = self.find(device_id)
+        if i is None:
+            i = len(self._ids)
+            self._grow(i + 1)
+            self._index[device_id] = i
+            self._ids.append(device_id)
+            self.names.append(name)
+            self.objects.append(None)
+        else:
+            self.names[i] = name
+        self.type_codes[i] = self._type_code(device_type)
+        self.enabled[i] = simulation_enabled
+        self.set_state(i, state)
+        return DeviceView(self, i)
+
+    def extend(self, ids, names, device_type, states, simulation_enabled=True):
+        """Appends a block of devices of one type in bulk.
+
+        ``ids`` and ``names`` are lists or ``NameTemplate`` objects of equal
+        length, ``states`` is a single state for all of them, a list or an
+        array. Unlike ``add`` ids are not checked, they must be new.
+        """
+        count = len(ids)
+        if len(names) != count:
+            raise ValueError("ids and names differ in length")
+        start = len(self._ids)
+        stop = start + count
+        self._grow(stop)
+        self._ids.extend(ids)
+        self.names.extend(names)
+        if isinstance(ids, NameTemplate) and ids.simple:
+            self._templates.append((start, ids))
+        else:
+            self._index.update(zip(ids, range(start, stop)))
+        self.type_codes[start:stop] = self._type_code(device_type)
+        self.enabled[start:stop] = simulation_enabled
+
+        self.objects.extend([None] * count)
+        kind = _KINDS.get(device_type, KIND_OTHER)
+        if np.ndim(states) == 0:
+            if isinstance(states, np.generic):
+                states = states.item()
+            kind = _state_kind(kind, states)
+            self.kinds[start:stop] = kind
+            if kind == KIND_OTHER:
+                self.objects[start:stop] = [states] * count
+            else:
+                self.values[start:stop] = states
+        elif isinstance(states, np.ndarray) and (
+            (kind == KIND_SENSOR and states.dtype.kind in "fiu")
+            or (kind == KIND_SWITCH and states.dtype.kind == "b")
+        ):
+            self.values[start:stop] = states
+            self.kinds[start:stop] = kind
+        else:
+            if isinstance(states, np.ndarray):
+                states = states.tolist()
+            for i, state in zip(range(start, stop), states):
+                self.set_state(i, state)
+
+    def get_state(self, i):
+        kind = self.kinds[i]
+        if kind == KIND_SENSOR:
+            return float(self.values[i])
+        if kind == KIND_SWITCH:
+            return bool(self.values[i])
+        return self.objects[i]
+
+    def set_state(self, i, state):
+        kind = _state_kind(_KINDS.get(self.types[self.type_codes[i]], KIND_OTHER), state)
+        if kind == KIND_OTHER:
+            self.objects[i] = state
+        else:
+            self.values[i] = state
+            self.objects[i] = None
+        self.kinds[i] = kind
@@ -0,0 +1,64 @@
+"""Index from devices to the callbacks that are interested in them.
+
+Callbacks without a filter get every change. Filtered callbacks are
+registered for a device id, a device type and/or an id glob pattern (all
+given filters must match). The callbacks for a device are resolved once
+and cached, so a change only touches the callbacks that care about it,
+no matter how many filtered subscribers there are.
+"""
+from fnmatch import fnmatchcase
+
+
+class CallbackIndex:
+    def __init__(self):
+        # Unfiltered callbacks, this is the hub's _callbacks set
+        self.callbacks = set()
+        self._by_device = {}
+        self._by_type = {}
+        self._patterns = []
+        self._resolved = {}
+
+    @property
+    def filtered(self):
+        """Whether any filtered callback is registered."""
+        return bool(self._by_device or self._by_type or self._patterns)
+
+    def add(self, callback, device_id=None, device_type=None, pattern=None):
+        if device_id is None and device_type is None and pattern is None:
+            self.callbacks.add(callback)
+            return
+        entry = (callback, device_type, pattern)
+        if device_id is not None:
+            self._by_device.setdefault(device_id, []).append(entry)
+        elif pattern is not None:
+            self._patterns.append(entry)
+        else:
+            self._by_type.setdefault(device_type, []).append(entry)
+        self._resolved.clear()
+
+    def remove(self, callback):
+        self.callbacks.discard(callback)
+        for index in (self._by_device, self._by_type):
+            for key in list(index):
+                index[key] = [entry for entry in index[key] if entry[0] != callback]
+                if not index[key]:
+                    del index[key]
+        self._patterns = [entry for entry in self._patterns if entry[0] != callback]
+        self._resolved.clear()
+
+    def lookup(self, device_id, device_type):
+        """Filtered callbacks for a device, ``device_type`` is a function of the id."""
+        resolved = self._resolved.get(device_id)
+        if resolved is None:
+            resolved = self._resolved[device_id] = self._resolve(device_id, device_type(device_id))
+        return resolved
+
+    def _resolve(self, device_id, device_type):
+        candidates = self._by_device.get(device_id, []) + self._by_type.get(device_type, [])
+        candidates += [entry for entry in self._patterns if fnmatchcase(device_id, entry[2])]
+        return tuple(
+            callback
+            for callback, wanted_type, pattern in candidates
+            if (wanted_type is None or wanted_type == device_type)
+            and (pattern is None or fnmatchcase(device_id, pattern))
+        )
@@ -5,6 +5,7 @@ setup(
     version="0.1.0",
     packages=find_packages(),
     install_requires=[],
+    extras_require={"fast": ["numpy"]},
     author="Børge Grunicke",
     description="Tiny simluator that behaves like an iot gateway",
     python_requires=">=3.12"
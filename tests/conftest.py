@@ -0,0 +1,54 @@
+"""Fleets, hubs and engine options shared by the tests."""
+import pytest
+
+from iot_simulator import SimulatedDevice, SimulatedHub
+from iot_simulator.clock import VirtualClock
+
+# Hub options of every engine, the per-device loop first
+ENGINES = [{}, {"vectorized": True, "compact": True}, {"vectorized": True}, {"compact": True}]
+
+
+def mixed_fleet(sensors=0, switches=0, selects=0, temperature=21.0):
+    """Sensors ``temp_n``, then switches ``light_n``, then selects ``mode_n``."""
+    devices = [SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", temperature) for n in range(sensors)]
+    devices += [SimulatedDevice(f"light_{n}", f"Licht {n}", "switch", False) for n in range(switches)]
+    devices += [SimulatedDevice(f"mode_{n}", f"Modus {n}", "select", "Eco") for n in range(selects)]
+    return devices
+
+
+@pytest.fixture
+def make_fleet():
+    """``make_fleet(sensors, switches, selects, temperature=21.0)`` builds a device list."""
+    return mixed_fleet
+
+
+@pytest.fixture
+def make_hub():
+    """``make_hub(sensors=20, switches=20, selects=1, **options)`` builds a hub on a virtual clock."""
+
+    def make(sensors=20, switches=20, selects=1, temperature=21.0, **options):
+        options.setdefault("clock", VirtualClock(start=0.0))
+        return SimulatedHub(devices=mixed_fleet(sensors, switches, selects, temperature), **options)
+
+    return make
+
+
+@pytest.fixture
+def run():
+    """``run(hub, ticks, step=0)`` runs ticks, advancing the virtual clock by ``step`` before each."""
+
+    def run_ticks(hub, ticks, step=0):
+        for _ in range(ticks):
+            if step:
+                hub.clock.advance(step)
+            hub._background_update_once()
+
+    return run_ticks
+
+
+@pytest.fixture(params=ENGINES, ids=["loop", "vectorized-compact", "vectorized", "compact"])
+def engine(request):
+    """Hub options of each engine, the NumPy ones are skipped without NumPy."""
+    if request.param:
+        pytest.importorskip("numpy")
+    return dict(request.param)
@@ -0,0 +1,174 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from iot_simulator import SimulatedDevice, SimulatedHub  # noqa: E402
+from iot_simulator.behavior import (  # noqa: E402
+    MODELS, BatchRandom, DailyCycle, MarkovChain, RandomWalk, TracePlayback, create_model, register_model,
+)
+from iot_simulator.clock import VirtualClock  # noqa: E402
+
+
+def make_devices():
+    devices = [SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", 21.0) for n in range(30)]
+    devices += [SimulatedDevice(f"light_{n}", f"Licht {n}", "switch", False) for n in range(30)]
+    devices += [SimulatedDevice(f"mode_{n}", f"Modus {n}", "select", "Eco") for n in range(30)]
+    return devices
+
+
+def run(options, behaviors, ticks=20, seed=None):
+    hub = SimulatedHub(devices=make_devices(), clock=VirtualClock(start=0.0), seed=seed, **options)
+    for device_type, model in behaviors.items():
+        hub.set_behavior(model, device_type=device_type)
+    calls = []
+    hub.register_callback(lambda device_id, state: calls.append((device_id, state)))
+    random.seed(11)
+    for _ in range(ticks):
+        hub.clock.advance(60)
+        hub._background_update_once()
+    return {dev_id: device.state for dev_id, device in hub.devices.items()}, calls
+
+
+def uniform_rng(values):
+    return BatchRandom(len(values), lambda count: np.array(values))
+
+
+def test_registry_creates_models_from_specs():
+    """Should build registered models from names and dicts."""
+    assert {"random_walk", "toggle", "daily_cycle", "markov", "trace"} <= set(MODELS)
+    model = create_model({"model": "random_walk", "step": 0.5})
+    assert isinstance(model, RandomWalk) and model.step_size == 0.5
+    assert create_model(model) is model
+    with pytest.raises(ValueError, match="known"):
+        create_model("nope")
+
+    @register_model("constant_for_test")
+    class Constant:
+        def step(self, states, dt, rng, now):
+            return np.full(len(states), 5.0)
+
+    assert isinstance(create_model("constant_for_test"), Constant)
+    del MODELS["constant_for_test"]
+
+
+def test_default_random_walk_matches_builtin_sensor_rule():
+    """Should give exactly the built-in results when set as the sensor model."""
+    builtin = run({}, {}, seed=4)
+    modeled = run({}, {"sensor": "random_walk", "switch": "toggle"}, seed=4)
+    assert modeled[0] == builtin[0]
+    assert sorted(modeled[1]) == sorted(builtin[1])
+
+
+@pytest.mark.parametrize("seed", [None, 8])
+def test_loop_and_vectorized_engine_step_models_alike(seed):
+    """Should produce the same states with both engines, seeded or not."""
+    behaviors = {
+        "sensor": {"model": "daily_cycle", "mean": 20, "amplitude": 4},
+        "select": {"model": "markov", "transitions": {"Eco": {"Boost": 0.3}, "Boost": {"Eco": 0.5}}},
+    }
+    loop = run({}, behaviors, seed=seed)
+    vectorized = run({"vectorized": True, "compact": True}, behaviors, seed=seed)
+    private = run({"vectorized": True}, behaviors, seed=seed)
+    assert loop[0] == vectorized[0] == private[0]
+    assert sorted(loop[1]) == sorted(vectorized[1])
+
+
+def test_markov_chain_moves_between_states():
+    """Should follow the cumulative transition probabilities and leave unknown states alone."""
+    model = MarkovChain({"Eco": {"Comfort": 0.2, "Boost": 0.1}, "Boost": {"Eco": 1.0}})
+    states = np.array(["Eco", "Eco", "Eco", "Boost", "Other"], dtype=object)
+    new = model.step(states, None, uniform_rng([0.25, 0.05, 0.5, 0.99, 0.0]), 0.0)
+    assert new.tolist() == ["Comfort", "Boost", "Eco", "Eco", "Other"]
+    with pytest.raises(ValueError):
+        MarkovChain({"Eco": {"Boost": 0.8, "Comfort": 0.4}})
+
+
+def test_daily_cycle_peaks_at_peak_hour():
+    """Should follow the day curve in clock time."""
+    model = DailyCycle(mean=20.0, amplitude=5.0, peak_hour=15, noise=0.0)
+    states = np.zeros(3)
+    assert model.step(states, None, None, 15 * 3600.0).tolist() == [25.0] * 3
+    assert model.step(states, None, None, 3 * 3600.0 + 86400.0).tolist() == [15.0] * 3
+
+
+def test_markov_selects_change_in_hub():
+    """Should let select devices change, which the built-in rules never do."""
+    states, calls = run({}, {"select": {"model": "markov", "transitions": {"Eco": {"Comfort": 0.5}}}})
+    assert any(state == "Comfort" for dev_id, state in calls if dev_id.startswith("mode_"))
+    assert set(states[f"mode_{n}"] for n in range(30)) <= {"Eco", "Comfort"}
+
+
+def test_csv_trace_is_read_row_by_row(tmp_path):
+    """Should play a CSV trace with a header, one row per period, and loop."""
+    path = tmp_path / "trace.csv"
+    path.write_text("a,b\n1.0,10.0\n2.0,20.0\n\n3.0,30.0\n")
+    model = TracePlayback(path, period=60)
+    states = np.zeros(3)
+    assert model.step(states, None, None, 0.0).tolist() == [1.0, 10.0, 1.0]
+    assert model.step(states, None, None, 65.0).tolist() == [2.0, 20.0, 2.0]
+    assert model.step(states, None, None, 120.0).tolist() == [3.0, 30.0, 3.0]
+    assert model.step(states, None, None, 180.0).tolist() == [1.0, 10.0, 1.0]
+    assert model._trace.rows == 3
+    model.close()
+
+
+def test_binary_traces(tmp_path):
+    """Should memory-map .npy and raw float64 traces, and hold the last row without loop."""
+    np.save(tmp_path / "trace.npy", np.array([[1.0, 2.0], [3.0, 4.0]]))
+    model = TracePlayback(tmp_path / "trace.npy", period=1.0, loop=False)
+    assert model.step(np.zeros(2), None, None, 0.0).tolist() == [1.0, 2.0]
+    assert model.step(np.zeros(2), None, None, 5.0).tolist() == [3.0, 4.0]
+    np.arange(6, dtype="<f8").tofile(tmp_path / "trace.f64")
+    raw = TracePlayback(tmp_path / "trace.f64", period=1.0, columns=3)
+    assert raw.step(np.zeros(1), None, None, 0.0).tolist() == [0.0]
+    assert raw.step(np.zeros(3), None, None, 1.0).tolist() == [3.0, 4.0, 5.0]
+
+
+def test_trace_model_in_hub(tmp_path):
+    """Should drive sensors from a trace in both engines."""
+    path = tmp_path / "trace.csv"
+    path.write_text("\n".join(f"{20 + n},{30 + n}" for n in range(100)))
+    for options in ({}, {"vectorized": True, "compact": True}):
+        states, _ = run(options, {"sensor": {"model": "trace", "path": str(path), "period": 60}}, ticks=5)
+        assert states["temp_0"] == 24.0
+        assert states["temp_1"] == 34.0
+
+
+def test_fleet_config_assigns_behaviors():
+    """Should take behavior models per device type from a fleet config."""
+    hub = SimulatedHub.from_config({
+        "devices": [{"id": "mode_{n}", "count": 5, "type": "select", "state": "Eco"}],
+        "behaviors": {"select": {"model": "markov", "transitions": {"Eco": {"Boost": 1.0}}}},
+    })
+    hub._background_update_once()
+    assert {device.state for device in hub.devices.values()} == {"Boost"}
+
+
+def test_removing_a_model_restores_builtin_rule():
+    """Should go back to the built-in rules after set_behavior(None)."""
+    hub = SimulatedHub()
+    hub.set_behavior(DailyCycle(noise=0.0), device_type="sensor")
+    hub.set_behavior(None, device_type="sensor")
+    assert not hub.behaviors
+    hub._background_update_once()
+    assert abs(hub.devices["temp_1"].state - 21.0) <= 0.2 + 1e-9
+
+
+@pytest.mark.parametrize("options", [{}, {"vectorized": True, "compact": True}, {"vectorized": True}])
+def test_trace_columns_stay_with_their_device(tmp_path, options):
+    """Should keep each device on its column when another device of the model is disabled."""
+    import asyncio
+
+    path = tmp_path / "trace.csv"
+    path.write_text("10.0,20.0,30.0\n")
+    devices = [SimulatedDevice(f"s{n}", f"Sensor {n}", "sensor", 0.0) for n in range(4)]
+    hub = SimulatedHub(devices=devices, clock=VirtualClock(start=0.0), **options)
+    hub.set_behavior({"model": "trace", "path": str(path)}, device_type="sensor")
+    asyncio.run(hub.toggle_simulation("s0", False))
+    hub._background_update_once()
+    assert [hub.devices[f"s{n}"].state for n in range(4)] == [0.0, 20.0, 30.0, 10.0]
+    asyncio.run(hub.set_device_state("s3", 0.0))
+    hub._background_update_once(["s3"])
+    assert hub.devices["s3"].state == 10.0
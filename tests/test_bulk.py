@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def make_hub(make_hub):
+    """Hubs with 5 sensors at 20.0 and 5 switches."""
+
+    def make(**options):
+        return make_hub(5, 5, 0, temperature=20.0, **options)
+
+    return make
+
+
+def test_set_device_states_emits_one_batch(make_hub):
+    """Should apply a mapping in one pass and report one batch."""
+    hub = make_hub()
+    batches = []
+    hub.register_batch_callback(batches.append)
+    changed = asyncio.run(hub.set_device_states({"light_0": True, "temp_0": 25.0, "temp_1": 20.0, "nope": 1}))
+    assert changed == 2
+    assert len(batches) == 1
+    assert [(d, s) for d, s, _ in batches[0]] == [("light_0", True), ("temp_0", 25.0)]
+
+
+def test_set_device_states_accepts_arrays(make_hub):
+    """Should accept a sequence of ids with an array of states."""
+    np = pytest.importorskip("numpy")
+    hub = make_hub(compact=True)
+    ids = ["light_1", "light_2", "temp_2"]
+    asyncio.run(hub.set_device_states(ids[:2], np.array([True, True])))
+    asyncio.run(hub.set_device_states(ids[2:], np.array([30.5])))
+    assert hub.devices["light_1"].state is True
+    assert hub.devices["temp_2"].state == 30.5
+
+
+def test_callbacks_never_see_half_applied_updates(make_hub):
+    """Should write every state before the first callback runs."""
+    hub = make_hub()
+    seen = []
+    hub.register_callback(lambda device_id, state: seen.append(
+        [hub.devices[f"light_{n}"].state for n in range(5)]))
+    asyncio.run(hub.set_device_states([(f"light_{n}", True) for n in range(5)]))
+    assert seen == [[True] * 5] * 5
+
+
+def test_set_simulation_by_type_prefix_and_ids(make_hub):
+    """Should select devices by type, id prefix or explicit ids."""
+    hub = make_hub()
+    assert asyncio.run(hub.set_simulation(False, device_type="switch")) == 5
+    assert all(not hub.devices[f"light_{n}"].simulation_enabled for n in range(5))
+    assert hub.devices["temp_0"].simulation_enabled
+    assert asyncio.run(hub.set_simulation(True, prefix="light_", device_ids=["light_0", "temp_0"])) == 1
+    assert hub.devices["light_0"].simulation_enabled
+    assert asyncio.run(hub.set_simulation(False)) == 10
+
+
+def test_set_simulation_keeps_engine_in_sync(make_hub):
+    """Should stop the vectorized engine from changing disabled devices."""
+    pytest.importorskip("numpy")
+    hub = make_hub(vectorized=True, seed=1)
+    asyncio.run(hub.set_simulation(False, pattern="temp_*"))
+    for _ in range(5):
+        hub._background_update_once()
+    assert all(hub.devices[f"temp_{n}"].state == 20.0 for n in range(5))
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock, WallClock
+
+
+def test_virtual_clock_runs_a_day_quickly():
+    """Should simulate a whole day without waiting in real time."""
+    clock = VirtualClock(start=1_000_000.0)
+    hub = SimulatedHub(clock=clock)
+    batches = []
+    hub.register_batch_callback(batches.append)
+    started = time.monotonic()
+    asyncio.run(hub.start_background_updates(until=1_000_000.0 + 86400))
+    assert time.monotonic() - started < 10
+    assert clock.time() == 1_000_000.0 + 86400
+    assert hub.scheduler.wakeups == 86400 / 5
+    timestamps = [batch.timestamps[0] for batch in batches]
+    assert timestamps[0] == 1_000_005.0
+    assert timestamps[-1] == 1_086_400.0
+
+
+def test_virtual_clock_speed_factor():
+    """Should run simulated time speed times faster than real time."""
+    clock = VirtualClock(start=0.0, speed=100.0)
+    hub = SimulatedHub(clock=clock, update_interval=1.0)
+    started = time.monotonic()
+    asyncio.run(hub.start_background_updates(until=10.0))
+    elapsed = time.monotonic() - started
+    assert 0.08 <= elapsed < 1.0
+    assert hub.scheduler.wakeups == 10
+
+
+def test_set_device_state_uses_clock_timestamp():
+    """Should stamp manual changes with the clock time."""
+    hub = SimulatedHub(clock=VirtualClock(start=42.0))
+    batches = []
+    hub.register_batch_callback(batches.append)
+    asyncio.run(hub.set_device_state("light_1", True))
+    assert list(batches[0]) == [("light_1", True, 42.0)]
+
+
+def test_wall_clock_follows_real_time():
+    """Should report epoch seconds."""
+    assert abs(WallClock().time() - time.time()) < 1
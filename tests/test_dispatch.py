@@ -0,0 +1,250 @@
+import asyncio
+import time
+
+import pytest
+
+from iot_simulator import SimulatedDevice, SimulatedHub
+from iot_simulator.dispatch import Subscription
+
+
+def test_drop_oldest_keeps_latest_changes():
+    """Should discard the oldest pending change when the buffer is full."""
+    subscription = Subscription(lambda device_id, state: None, maxsize=2, policy="drop_oldest")
+    for n in range(4):
+        subscription.offer("temp_1", n)
+    assert list(subscription._pending) == [("temp_1", 2), ("temp_1", 3)]
+    assert subscription.dropped == 2
+
+
+def test_coalesce_keeps_one_entry_per_device():
+    """Should keep only the latest state per device, in first-arrival order."""
+    subscription = Subscription(lambda device_id, state: None, maxsize=10, policy="coalesce")
+    subscription.offer("temp_1", 1)
+    subscription.offer("light_1", True)
+    subscription.offer("temp_1", 2)
+    assert list(subscription._pending.items()) == [("temp_1", 2), ("light_1", True)]
+    assert subscription.dropped == 0
+
+
+def test_block_never_drops():
+    """Should keep every change and report full for back pressure."""
+    subscription = Subscription(lambda device_id, state: None, maxsize=2, policy="block")
+    for n in range(3):
+        subscription.offer("temp_1", n)
+    assert len(subscription) == 3
+    assert subscription.full
+
+
+def test_block_coalesces_a_tick_beyond_maxsize():
+    """Should keep a blocking buffer bounded within one tick and deliver the latest states."""
+    received = {}
+
+    async def run():
+        devices = [SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", 20.0) for n in range(50)]
+        hub = SimulatedHub(devices=devices, seed=3)
+        subscription = hub.subscribe(lambda device_id, state: received.__setitem__(device_id, state),
+                                     maxsize=10, policy="block")
+        for _ in range(3):
+            hub._background_update_once()  # 150 changes without waiting in between
+        size = len(subscription)
+        await hub._wait_for_subscribers()
+        while len(subscription):
+            await asyncio.sleep(0)
+        return hub, subscription, size
+
+    hub, subscription, size = asyncio.run(run())
+    assert size <= 10 + 50
+    assert subscription.coalesced == 150 - size and subscription.dropped == 0
+    assert received == {device_id: device.state for device_id, device in hub.devices.items()}
+
+
+def test_rejects_unknown_policy():
+    """Should raise ValueError for an unknown policy."""
+    with pytest.raises(ValueError):
+        Subscription(lambda device_id, state: None, policy="whatever")
+
+
+def test_delivers_to_async_and_sync_subscribers():
+    """Should deliver changes to coroutine and plain callbacks."""
+    received = []
+
+    async def slow(device_id, state):
+        await asyncio.sleep(0.01)
+        received.append(("async", device_id, state))
+
+    async def run():
+        hub = SimulatedHub()
+        hub.subscribe(slow)
+        hub.subscribe(lambda device_id, state: received.append(("sync", device_id, state)))
+        await hub.set_device_state("light_1", True)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert ("async", "light_1", True) in received
+    assert ("sync", "light_1", True) in received
+
+
+def test_slow_subscriber_does_not_stall_tick():
+    """Should finish ticks while a slow subscriber is still busy."""
+    async def stuck(device_id, state):
+        await asyncio.sleep(10)
+
+    async def run():
+        hub = SimulatedHub()
+        subscription = hub.subscribe(stuck, maxsize=5, policy="coalesce")
+        for _ in range(100):
+            hub._background_update_once()
+        await asyncio.sleep(0)
+        hub.unsubscribe(subscription)
+        return subscription
+
+    subscription = asyncio.run(run())
+    assert len(subscription) <= 3
+
+
+def test_slow_sync_subscriber_runs_off_the_loop():
+    """Should keep the loop free while a slow plain callback works through its changes."""
+    received = []
+
+    def slow(device_id, state):
+        time.sleep(0.05)
+        received.append((device_id, state))
+
+    async def run():
+        hub = SimulatedHub()
+        subscription = hub.subscribe(slow, maxsize=None, policy="coalesce")
+        started = time.perf_counter()
+        for _ in range(20):
+            hub._background_update_once()
+            await asyncio.sleep(0)  # The delivery task gets its turn
+        ticking = time.perf_counter() - started
+        while len(subscription) or not received:
+            await asyncio.sleep(0.01)
+        hub.unsubscribe(subscription)
+        return ticking
+
+    assert asyncio.run(run()) < 0.5  # On the loop the callbacks alone take 20 * 3 * 0.05 s
+    assert received
+
+
+def test_failing_subscriber_keeps_delivering(caplog):
+    """Should log exceptions from a subscriber and continue with the next change."""
+    received = []
+
+    def flaky(device_id, state):
+        received.append(state)
+        if len(received) == 1:
+            raise RuntimeError("boom")
+
+    async def run():
+        hub = SimulatedHub()
+        hub.subscribe(flaky)
+        await hub.set_device_state("temp_1", 1.0)
+        await hub.set_device_state("temp_1", 2.0)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert received == [1.0, 2.0]
+    assert any("failed" in m for m in caplog.messages)
+
+
+def test_block_policy_applies_back_pressure():
+    """Should make set_device_state wait while a blocking subscriber is full."""
+    release = asyncio.Event()
+
+    async def gated(device_id, state):
+        await release.wait()
+
+    async def run():
+        hub = SimulatedHub()
+        hub.subscribe(gated, maxsize=1, policy="block")
+        await hub.set_device_state("temp_1", 1.0)
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(hub.set_device_state("temp_1", 2.0), timeout=0.05)
+        release.set()
+        await asyncio.wait_for(hub.set_device_state("temp_1", 3.0), timeout=0.05)
+
+    asyncio.run(run())
+
+
+def test_event_stream_yields_changes_in_order():
+    """Should hand out pending changes to async for and stop after leaving async with."""
+    async def scenario():
+        hub = SimulatedHub()
+        received = []
+        async with hub.events(policy="drop_oldest") as events:
+            await hub.set_device_state("light_1", True)
+            await hub.set_device_state("mode_1", "Boost")
+            async for event in events:
+                received.append(event)
+                if len(received) == 2:
+                    break
+        assert events.closed and hub._subscriptions == []
+        await hub.set_device_state("light_1", False)
+        return received
+
+    assert asyncio.run(scenario()) == [("light_1", True), ("mode_1", "Boost")]
+
+
+def test_event_stream_waits_for_new_changes():
+    """Should block the reader until the next change arrives."""
+    async def scenario():
+        hub = SimulatedHub()
+        events = hub.events(device_id="light_1")
+
+        async def read():
+            return await events.__anext__()
+
+        reader = asyncio.create_task(read())
+        await asyncio.sleep(0)
+        assert not reader.done()
+        await hub.set_device_state("temp_1", 30.0)  # Filtered out
+        await hub.set_device_state("light_1", True)
+        result = await reader
+        hub.unsubscribe(events)
+        return result
+
+    assert asyncio.run(scenario()) == ("light_1", True)
+
+
+def test_closing_an_event_stream_unregisters_it():
+    """Should drop a closed stream from the hub, so a blocking stream cannot stall writes."""
+    async def scenario():
+        hub = SimulatedHub()
+        async with hub.events(policy="block", maxsize=2) as events:
+            events.close()
+        for state in (True, False, True):
+            await asyncio.wait_for(hub.set_device_state("light_1", state), timeout=1)
+        hub.unsubscribe(events)  # Again, a no-op
+        return hub
+
+    hub = asyncio.run(scenario())
+    assert hub._subscriptions == [] and not hub._callback_index.callbacks
+
+
+def test_coalescing_event_stream_is_bounded_by_fleet_size():
+    """Should keep only the latest state per device however far the reader falls behind."""
+    async def scenario():
+        hub = SimulatedHub()
+        events = hub.events()
+        for _ in range(200):
+            hub._background_update_once()
+        assert len(events) <= len(hub.devices)
+        latest = {dev_id: device.state for dev_id, device in hub.devices.items()}
+        received = {}
+        while len(events):
+            device_id, state = await events.__anext__()
+            received[device_id] = state
+        hub.unsubscribe(events)
+        return received, latest
+
+    received, latest = asyncio.run(scenario())
+    assert "temp_1" in received
+    assert all(latest[dev_id] == state for dev_id, state in received.items())
+
+
+def test_coalesce_without_maxsize_only():
+    """Should require a maxsize for the queueing policies."""
+    with pytest.raises(ValueError):
+        Subscription(lambda device_id, state: None, maxsize=None, policy="block")
@@ -0,0 +1,107 @@
+import asyncio
+import random
+
+import pytest
+
+from iot_simulator import SimulatedDevice, SimulatedHub
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def run_ticks(make_fleet):
+    """``run_ticks(vectorized, seed)`` ticks an unseeded mixed fleet after ``random.seed``."""
+
+    def run(vectorized, seed, ticks=20, size=300):
+        devices = make_fleet(size // 3, size // 3, size - 2 * (size // 3))
+        for n, device in enumerate(devices):
+            if device.type == "sensor":
+                device.state = 20.0 + n % 7 * 0.5
+            elif device.type == "switch":
+                device.state = n % 2 == 0
+            if n % 11 == 0:
+                device.simulation_enabled = False
+        hub = SimulatedHub(vectorized=vectorized)
+        # Replaced after construction, the engine has to pick up the new fleet
+        hub.devices = {device.id: device for device in devices}
+        called = []
+        hub.register_callback(lambda device_id, state: called.append((device_id, state)))
+        random.seed(seed)
+        for _ in range(ticks):
+            hub._background_update_once()
+        states = {dev_id: device.state for dev_id, device in hub.devices.items()}
+        return states, called
+
+    return run
+
+
+def test_vectorized_matches_per_device_path(run_ticks):
+    """Should produce the same states and callbacks as the per-device loop for a seed."""
+    expected_states, expected_calls = run_ticks(False, seed=1234)
+    states, calls = run_ticks(True, seed=1234)
+    assert states == expected_states
+    assert calls == expected_calls
+
+
+def test_vectorized_keeps_random_stream_in_sync(run_ticks):
+    """Should leave the global random module in the same state as the per-device loop."""
+    run_ticks(False, seed=7, ticks=3)
+    expected = random.random()
+    run_ticks(True, seed=7, ticks=3)
+    assert random.random() == expected
+
+
+def test_vectorized_never_returns_old_value(monkeypatch):
+    """Should push sensors in the opposite direction when the delta rounds to zero."""
+    hub = SimulatedHub(vectorized=True)
+    monkeypatch.setattr("iot_simulator.engine.draw_uniform", lambda rng, count: np.full(count, 0.5))
+    hub._background_update_once()
+    assert hub.devices["temp_1"].state == 21.2
+    assert hub.devices["light_1"].state is False
+
+
+def test_vectorized_fires_callbacks_only_for_changed_devices():
+    """Should return only changed devices from the engine tick."""
+    hub = SimulatedHub(vectorized=True)
+    called = []
+    hub.register_callback(lambda device_id, state: called.append((device_id, state)))
+    random.seed(3)
+    hub._background_update_once()
+    assert "mode_1" not in [device_id for device_id, _ in called]
+    assert ("temp_1", hub.devices["temp_1"].state) in called
+
+
+def test_vectorized_follows_set_state_and_toggle():
+    """Should keep engine arrays in sync with set_device_state and toggle_simulation."""
+    hub = SimulatedHub(vectorized=True)
+    asyncio.run(hub.set_device_state("temp_1", 30.0))
+    asyncio.run(hub.toggle_simulation("light_1", False))
+    hub._background_update_once()
+    assert abs(hub.devices["temp_1"].state - 30.0) <= 0.2
+    assert hub.devices["light_1"].state is False
+
+
+def test_vectorized_hub_stores_a_replaced_fleet_as_table():
+    """Should turn a dict assigned to hub.devices into a table the engine works on."""
+    from iot_simulator.store import DeviceTable
+
+    hub = SimulatedHub(vectorized=True, seed=2)
+    hub.devices = {"temp_9": SimulatedDevice("temp_9", "Sensor", "sensor", 21.0)}
+    hub._background_update_once()
+    assert isinstance(hub.devices, DeviceTable) and list(hub.devices) == ["temp_9"]
+    assert hub._engine.shared and hub.devices["temp_9"].state != 21.0
+
+
+def test_vectorized_sees_direct_device_writes():
+    """Should tick from states and flags written straight to hub.devices, like the loop."""
+    results = []
+    for vectorized in (False, True):
+        hub = SimulatedHub(vectorized=vectorized, seed=5)
+        called = []
+        hub.register_callback(lambda device_id, state: called.append(device_id))
+        hub.devices["temp_1"].state = 50.0
+        hub.devices["light_1"].simulation_enabled = False
+        hub._background_update_once()
+        results.append((hub.devices["temp_1"].state, "light_1" in called))
+    assert results[0] == results[1]
+    assert abs(results[1][0] - 50.0) <= 0.2 and results[1][1] is False
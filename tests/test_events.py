@@ -0,0 +1,103 @@
+import asyncio
+import random
+
+import pytest
+
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock
+from iot_simulator.events import ChangeBatch
+
+
+def test_batch_callback_gets_one_batch_per_tick(monkeypatch):
+    """Should deliver all changes of a tick in a single call."""
+    hub = SimulatedHub()
+    batches = []
+    hub.register_batch_callback(batches.append)
+    monkeypatch.setattr(random, "uniform", lambda a, b: 0.2)
+    monkeypatch.setattr(random, "random", lambda: 1.0)
+    hub._background_update_once()
+    assert len(batches) == 1
+    rows = list(batches[0])
+    assert [(device_id, state) for device_id, state, _ in rows] == [("temp_1", 21.2), ("light_1", True)]
+    assert all(isinstance(timestamp, float) for _, _, timestamp in rows)
+
+
+def test_batch_callback_skips_empty_ticks():
+    """Should not call batch callbacks when nothing changed."""
+    hub = SimulatedHub()
+    for device in hub.devices.values():
+        device.simulation_enabled = False
+    batches = []
+    hub.register_batch_callback(batches.append)
+    hub._background_update_once()
+    assert batches == []
+
+
+def test_per_device_callbacks_built_on_batches():
+    """Should still call per-device callbacks for every row of a batch."""
+    hub = SimulatedHub()
+    called = []
+    batches = []
+    hub.register_callback(lambda device_id, state: called.append((device_id, state)))
+    hub.register_batch_callback(batches.append)
+    asyncio.run(hub.set_device_state("mode_1", "Boost"))
+    assert called == [("mode_1", "Boost")]
+    assert [(device_id, state) for device_id, state, _ in batches[0]] == called
+
+
+def test_flush_interval_merges_batches(monkeypatch):
+    """Should collect batches until the flush interval has passed."""
+    hub = SimulatedHub()
+    now = [100.0]
+    monkeypatch.setattr(hub, "_now", lambda: now[0])
+    batches = []
+    hub.register_batch_callback(batches.append, flush_interval=10)
+    for step in range(3):
+        hub._background_update_once()
+        now[0] += 5
+    assert len(batches) == 1
+    assert len(batches[0]) >= 3
+    assert sorted(set(batches[0].timestamps)) == [100.0, 105.0, 110.0]
+    hub.flush_batches()
+    assert len(batches) == 1
+
+
+def test_concat_keeps_order():
+    """Should merge batches row by row in order."""
+    first = ChangeBatch(["a"], [1], [1.0])
+    second = ChangeBatch(["b", "c"], [2, 3], [2.0, 2.0])
+    merged = ChangeBatch.concat([first, second])
+    assert list(merged) == [("a", 1, 1.0), ("b", 2, 2.0), ("c", 3, 2.0)]
+
+
+def test_vectorized_batch_exposes_columns():
+    """Should expose table indices and numeric values as arrays."""
+    np = pytest.importorskip("numpy")
+    hub = SimulatedHub(vectorized=True, compact=True)
+    batches = []
+    hub.register_batch_callback(batches.append)
+    random.seed(5)
+    hub._background_update_once()
+    batch = batches[0]
+    assert isinstance(batch.values, np.ndarray)
+    assert batch.device_ids[0] == "temp_1"
+    assert batch.values[0] == hub.devices["temp_1"].state
+    assert batch.states[0] == hub.devices["temp_1"].state
+
+
+def test_update_loop_flushes_collected_batches():
+    """Should deliver collected batches from the update loop once the flush interval has passed."""
+    hub = SimulatedHub(clock=VirtualClock(start=0.0))
+    delivered = []
+    hub.register_batch_callback(lambda batch: delivered.append((hub._now(), list(batch))), flush_interval=10)
+
+    async def scenario():
+        await hub.set_simulation(False)
+        await hub.set_device_state("light_1", True)
+        updates = asyncio.create_task(hub.start_background_updates(until=3600.0))
+        await asyncio.sleep(0)
+        await hub.set_device_state("mode_1", "Boost")  # While the loop waits
+        await updates
+
+    asyncio.run(scenario())
+    assert delivered == [(10.0, [("light_1", True, 0.0), ("mode_1", "Boost", 0.0)])]
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import pytest
+
+from iot_simulator import SimulatedHub
+from iot_simulator.fleet import build_fleet
+from iot_simulator.store import NameTemplate
+
+CONFIG = {
+    "seed": 3,
+    "templates": {
+        "room": {"type": "sensor", "name": "Raum {n}", "state": {"normal": [21, 1]}},
+    },
+    "devices": [
+        {"id": "light_1", "name": "Deckenlicht", "type": "switch", "state": False},
+        {"template": "room", "id": "room_{n}", "count": 500},
+        {"id": "mode_{n}", "count": 3, "first": 0, "type": "select",
+         "state": {"choice": ["Eco", "Boost"]}, "simulation_enabled": False, "update_interval": 60},
+    ],
+}
+
+
+def test_name_template_formats_on_access_and_finds_ids():
+    """Should format single items and parse only canonical ids back."""
+    ids = NameTemplate("room_{n}", 10, first=1)
+    assert len(ids) == 10
+    assert ids[0] == "room_1" and ids[-1] == "room_10"
+    assert list(ids)[:2] == ["room_1", "room_2"]
+    assert ids.find("room_10") == 9
+    assert ids.find("room_11") is None
+    assert ids.find("room_01") is None
+    assert ids.find("hall_1") is None
+
+
+def test_fleet_from_config_creates_all_devices():
+    """Should expand templates and counts into devices with their settings."""
+    hub = SimulatedHub.from_config(CONFIG)
+    assert len(hub.devices) == 504
+    assert hub.devices["light_1"].name == "Deckenlicht"
+    room = hub.devices["room_500"]
+    assert room.name == "Raum 500"
+    assert room.type == "sensor"
+    assert 15.0 < room.state < 27.0
+    assert round(room.state, 2) == room.state
+    assert hub.devices["mode_0"].state in ("Eco", "Boost")
+    assert hub.devices["mode_2"].simulation_enabled is False
+    assert hub._intervals["mode_1"] == (60, 0.0)
+    assert "room_501" not in hub.devices
+
+
+def test_fleet_from_json_file(tmp_path):
+    """Should read the same fleet from a JSON file."""
+    path = tmp_path / "fleet.json"
+    path.write_text(json.dumps(CONFIG))
+    hub = SimulatedHub.from_config(str(path))
+    assert len(hub.devices) == 504
+
+
+def test_fleet_start_values_follow_the_seed():
+    """Should draw the same start values for the same seed."""
+    first, _ = build_fleet(CONFIG)
+    second, _ = build_fleet(CONFIG)
+    assert [d.state for d in first] == [d.state for d in second]
+    other, _ = build_fleet(dict(CONFIG, seed=4))
+    assert [d.state for d in first] != [d.state for d in other]
+
+
+def test_fleet_rejects_bad_entries():
+    """Should name the problem for unknown templates, keys and id patterns."""
+    with pytest.raises(ValueError, match="template"):
+        build_fleet({"devices": [{"template": "nope", "id": "x", "type": "sensor"}]})
+    with pytest.raises(ValueError, match="colour"):
+        build_fleet({"devices": [{"id": "x", "type": "sensor", "colour": "red"}]})
+    with pytest.raises(ValueError, match="{n}"):
+        build_fleet({"devices": [{"id": "x", "type": "sensor", "count": 2}]})
+    with pytest.raises(ValueError, match="distribution"):
+        build_fleet({"devices": [{"id": "x", "type": "sensor", "state": {"poisson": 3}}]})
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_fleet_rejects_duplicate_ids(compact):
+    """Should refuse ids that two entries generate, in both stores."""
+    if compact:
+        pytest.importorskip("numpy")
+    sensor = {"type": "sensor", "state": 21.0}
+    for devices in (
+        [dict(sensor, id="temp_{n}", count=3), dict(sensor, id="temp_2")],
+        [dict(sensor, id="temp_2"), dict(sensor, id="temp_{n}", count=3)],
+        [dict(sensor, id="temp_{n}", count=3), dict(sensor, id="temp_{n}", count=3, first=3)],
+        [dict(sensor, id="temp_1{n}", count=3), dict(sensor, id="temp_{n}", count=20)],
+        [dict(sensor, id="x"), dict(sensor, id="x")],
+    ):
+        with pytest.raises(ValueError, match="more than one fleet entry"):
+            build_fleet({"devices": devices}, compact=compact)
+    devices, _ = build_fleet({"devices": [dict(sensor, id="temp_{n}", count=3),
+                                          dict(sensor, id="temp_{n}", count=3, first=4)]}, compact=compact)
+    assert len(devices) == 6
+
+
+def test_compact_fleet_is_lazy_and_matches_dict_fleet():
+    """Should build a table without formatting ids and hold the same states."""
+    pytest.importorskip("numpy")
+    hub = SimulatedHub.from_config(CONFIG, compact=True)
+    table = hub.devices
+    assert table._templates  # Generated ids are not in the index yet
+    plain = SimulatedHub.from_config(CONFIG)
+    for device_id, device in plain.devices.items():
+        view = table[device_id]
+        assert (view.name, view.type, view.state, view.simulation_enabled) == (
+            device.name, device.type, device.state, device.simulation_enabled)
+    assert list(table) == list(plain.devices)
+    assert table.index["room_250"] == 250
+
+
+def test_compact_fleet_runs_and_accepts_new_devices():
+    """Should tick, take manual states and add devices after a bulk load."""
+    pytest.importorskip("numpy")
+    hub = SimulatedHub.from_config(CONFIG, compact=True, vectorized=True, seed=1)
+    changes = []
+    hub.register_batch_callback(lambda batch: changes.extend(batch.device_ids))
+    hub._background_update_once()
+    assert changes and all(device_id in hub.devices for device_id in changes)
+    asyncio.run(hub.set_device_state("room_7", 30.0))
+    assert hub.devices["room_7"].state == 30.0
+    hub.devices.add("room_7", "Neuer Raum", "sensor", 18.0)
+    assert len(hub.devices) == 504
+    assert hub.devices["room_7"].name == "Neuer Raum"
+    hub.devices.add("room_501", "Raum 501", "sensor", 18.0)
+    assert hub.devices["room_501"].state == 18.0
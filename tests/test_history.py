@@ -0,0 +1,121 @@
+import asyncio
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from iot_simulator import SimulatedHub  # noqa: E402
+
+
+@pytest.fixture
+def make_hub(make_hub):
+    """Hubs with a history of ``depth`` states."""
+
+    def make(depth=5, **options):
+        return make_hub(10, 10, 1, history=depth, seed=6, **options)
+
+    return make
+
+
+def test_history_starts_with_current_states(make_hub):
+    """Should hold the states at the time the hub was created."""
+    hub = make_hub()
+    assert hub.history.last("temp_0") == [(0.0, 21.0)]
+    assert hub.history.last("light_0") == [(0.0, False)]
+    assert hub.history.last("mode_0") == [(0.0, "Eco")]
+    assert hub.history.last("nope") == []
+    assert SimulatedHub().history is None
+
+
+def test_ring_keeps_the_last_states(make_hub, run, engine):
+    """Should keep the last ``depth`` reported states, oldest first, in every engine."""
+    hub = make_hub(**engine)
+    seen = {}
+    hub.register_callback(lambda device_id, state: seen.setdefault(device_id, []).append((hub._now(), state)))
+    run(hub, 12, step=10)
+    assert hub.history.last("temp_3") == seen["temp_3"][-5:]
+    assert hub.history.last("temp_3", 2) == seen["temp_3"][-2:]
+    switch = seen.get("light_4", [])
+    assert hub.history.last("light_4") == ([(0.0, False)] + switch)[-5:]
+    size = hub.history.nbytes
+    run(hub, 12, step=10)
+    assert hub.history.nbytes == size
+
+
+def test_loop_and_vectorized_history_agree(make_hub, run):
+    """Should record the same samples with both engines."""
+    loop = make_hub()
+    vectorized = make_hub(vectorized=True, compact=True)
+    run(loop, 8, step=10)
+    run(vectorized, 8, step=10)
+    for device_id in loop.devices:
+        assert loop.history.last(device_id) == vectorized.history.last(device_id)
+
+
+def test_between_and_manual_states(make_hub):
+    """Should select samples by time and record manual changes, strings included."""
+    hub = make_hub(depth=10)
+    for state in ("Boost", "Comfort"):
+        hub.clock.advance(10)
+        asyncio.run(hub.set_device_state("mode_0", state))
+    assert hub.history.between("mode_0", start=5) == [(10.0, "Boost"), (20.0, "Comfort")]
+    assert hub.history.between("mode_0", end=10) == [(0.0, "Eco"), (10.0, "Boost")]
+
+
+def test_downsample_buckets(make_hub, run, engine):
+    """Should compute min, max and avg per time bucket and device."""
+    hub = make_hub(depth=20, **engine)
+    run(hub, 19, step=10)
+    history = hub.history
+    result = history.downsample(["temp_2", "light_1", "mode_0"], start=0, end=190, buckets=4)
+    assert result["start"].tolist() == [0.0, 47.5, 95.0, 142.5]
+    samples = history.last("temp_2")
+    first = [state for timestamp, state in samples if timestamp < 47.5]
+    assert result["min"][0, 0] == min(first)
+    assert result["max"][0, 0] == max(first)
+    assert math.isclose(result["avg"][0, 0], sum(first) / len(first))
+    assert result["count"][0].sum() == len(samples)
+    assert result["count"][2].sum() == 0 and np.isnan(result["avg"][2]).all()
+    single = history.downsample("temp_2", buckets=4)
+    assert single["count"].tolist() == result["count"][0].tolist()
+    everything = history.downsample(buckets=2)
+    assert everything["min"].shape == (len(hub.devices), 2)
+
+
+def test_downsample_after_clock_went_back(make_hub):
+    """Should still aggregate correctly when timestamps are not in order."""
+    hub = make_hub(depth=4)
+    hub.clock.advance(100)
+    asyncio.run(hub.set_device_state("temp_0", 30.0))
+    hub.clock.now = 10.0
+    asyncio.run(hub.set_device_state("temp_0", 10.0))
+    result = hub.history.downsample("temp_0", start=0, end=100, buckets=2)
+    assert result["min"].tolist() == [10.0, 30.0]
+    assert result["max"].tolist() == [21.0, 30.0]
+
+
+def test_history_follows_reported_changes_only(make_hub, run):
+    """Should record what the reporting policies let through."""
+    from iot_simulator import ReportingPolicy
+
+    hub = make_hub(depth=50)
+    hub.set_reporting_policy(ReportingPolicy(deadband=1.0), device_type="sensor")
+    reported = []
+    hub.register_callback(lambda device_id, state: reported.append(state), device_id="temp_1")
+    run(hub, 30, step=10)
+    assert [state for _, state in hub.history.last("temp_1")] == [21.0] + reported
+
+
+def test_intern_table_stays_bounded(make_hub, engine, monkeypatch):
+    """Should drop non-numeric states that left the buffer and keep unhashable ones."""
+    monkeypatch.setattr("iot_simulator.history._INTERN_LIMIT", 8)
+    hub = make_hub(depth=3, **engine)
+    for n in range(100):
+        hub.clock.advance(1)
+        asyncio.run(hub.set_device_state("mode_0", f"Modus {n}"))
+    assert len(hub.history._objects) <= 16
+    assert [state for _, state in hub.history.last("mode_0")] == ["Modus 97", "Modus 98", "Modus 99"]
+    hub.clock.advance(1)
+    asyncio.run(hub.set_device_state("mode_0", ["Eco", "Boost"]))
+    assert hub.history.last("mode_0", 2) == [(100.0, "Modus 99"), (101.0, ["Eco", "Boost"])]
@@ -0,0 +1,93 @@
+import asyncio
+
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock
+from iot_simulator.metrics import Histogram, start_exporter
+
+
+def test_metrics_are_off_by_default():
+    """Should not create metrics unless asked for."""
+    assert SimulatedHub().metrics is None
+
+
+def test_histogram_buckets():
+    """Should count values into cumulative buckets."""
+    histogram = Histogram((1, 10))
+    for value in (0.5, 5, 50):
+        histogram.observe(value)
+    lines = histogram.prometheus("x")
+    assert lines[:3] == ['x_bucket{le="1"} 1', 'x_bucket{le="10"} 2', 'x_bucket{le="+Inf"} 3']
+    assert histogram.max == 50
+
+
+def test_records_ticks_callbacks_and_set_state_calls():
+    """Should record tick durations, changes, callback times and set_device_state calls."""
+    hub = SimulatedHub(metrics=True, seed=1)
+
+    def slow_consumer(device_id, state):
+        pass
+
+    hub.register_callback(slow_consumer)
+    hub._background_update_once()
+    asyncio.run(hub.set_device_state("mode_1", "Boost"))
+    snapshot = hub.metrics.snapshot()
+    assert snapshot["tick_seconds"]["count"] == 1
+    assert snapshot["changes_per_tick"]["sum"] >= 1
+    assert snapshot["set_device_state_calls"] == 1
+    names = list(snapshot["callback_seconds"])
+    assert any(name.endswith("slow_consumer") for name in names)
+
+
+def test_records_tick_lateness_in_loop():
+    """Should observe how late every wake-up starts."""
+    hub = SimulatedHub(metrics=True, clock=VirtualClock(start=0.0))
+    asyncio.run(hub.start_background_updates(until=50.0))
+    assert hub.metrics.tick_lateness_seconds.count == 10
+    assert hub.metrics.tick_lateness_seconds.max == 0.0
+
+
+def test_exporter_serves_prometheus_text():
+    """Should answer HTTP requests with the metrics in text format."""
+    hub = SimulatedHub(metrics=True)
+    hub._background_update_once()
+
+    async def scrape():
+        server = await start_exporter(hub.metrics, port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response.decode()
+
+    response = asyncio.run(scrape())
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert "iot_tick_seconds_count 1" in response
+    assert "iot_set_device_state_calls_total 0" in response
+
+
+def test_batch_and_subscription_callbacks_are_timed_by_name():
+    """Should time batch callbacks and subscription deliveries under the user callback's name."""
+    hub = SimulatedHub(metrics=True, seed=1)
+
+    def batch_consumer(batch):
+        pass
+
+    def queue_consumer(device_id, state):
+        pass
+
+    async def scenario():
+        hub.register_batch_callback(batch_consumer)
+        hub.subscribe(queue_consumer, device_type="sensor")
+        hub.subscribe(queue_consumer)
+        hub._background_update_once()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    seconds = hub.metrics.callback_seconds
+    names = {name.rsplit(".", 1)[-1] for name in seconds}
+    assert names == {"batch_consumer", "queue_consumer"}
+    queued = next(histogram for name, histogram in seconds.items() if name.endswith("queue_consumer"))
+    assert queued.count == sum(subscription.delivered for subscription in hub._subscriptions)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock
+from iot_simulator.events import ChangeBatch
+from iot_simulator.recording import EventRecorder, EventReplayer
+
+
+def test_round_trips_all_state_types(tmp_path):
+    """Should read back floats, bools, ints, strings and None unchanged."""
+    path = tmp_path / "run.iotrec"
+    rows = [("temp_1", 21.5, 1.0), ("light_1", True, 1.0), ("count", 7, 2.0),
+            ("mode_1", "Boost", 2.0), ("mode_2", "Boost", 2.0), ("gone", None, 3.0)]
+    with EventRecorder(path) as recorder:
+        recorder.record(ChangeBatch(*zip(*rows)))
+    assert list(EventReplayer(path)) == rows
+
+
+def test_strings_are_stored_once(tmp_path):
+    """Should write each device id only once."""
+    path = tmp_path / "run.iotrec"
+    with EventRecorder(path) as recorder:
+        for n in range(100):
+            recorder.record(ChangeBatch(["temp_with_a_long_device_id"], [float(n)], [float(n)]))
+    assert path.stat().st_size < 8 + 40 + 100 * 22
+
+
+def test_rejects_foreign_files(tmp_path):
+    """Should refuse files without the magic header."""
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a recording")
+    with pytest.raises(ValueError):
+        list(EventReplayer(path))
+
+
+def test_records_and_replays_a_simulation(tmp_path):
+    """Should replay recorded batches through the hub's callbacks."""
+    path = tmp_path / "run.iotrec"
+    hub = SimulatedHub(seed=1, clock=VirtualClock(start=0.0))
+    recorder = EventRecorder(path).attach(hub)
+    asyncio.run(hub.start_background_updates(until=60.0))
+    recorder.close()
+    recorded = [(d, s) for d, s, _ in EventReplayer(path)]
+    assert recorder.events == len(recorded) > 0
+
+    target = SimulatedHub()
+    replayed = []
+    target.register_callback(lambda device_id, state: replayed.append((device_id, state)))
+    started = time.monotonic()
+    asyncio.run(EventReplayer(path).replay(target, speed=None))
+    assert time.monotonic() - started < 1
+    assert replayed == recorded
+    assert target.devices["temp_1"].state == hub.devices["temp_1"].state
+
+
+def test_replay_keeps_timing_with_speed_factor(tmp_path):
+    """Should spread the replay over recorded time divided by speed."""
+    path = tmp_path / "run.iotrec"
+    with EventRecorder(path) as recorder:
+        recorder.record(ChangeBatch(["temp_1"], [1.0], [100.0]))
+        recorder.record(ChangeBatch(["temp_1"], [2.0], [101.0]))
+    started = time.monotonic()
+    asyncio.run(EventReplayer(path).replay(SimulatedHub(), speed=10))
+    assert 0.09 <= time.monotonic() - started < 0.5
+
+
+@pytest.mark.parametrize("cut", [1, 5, 21, 30])
+def test_replay_stops_at_a_truncated_record(tmp_path, cut):
+    """Should replay the complete events of a file cut off while writing."""
+    path = tmp_path / "run.iotrec"
+    rows = [("temp_1", 21.5, 1.0), ("mode_1", "Boost", 2.0), ("temp_1", 22.0, 3.0)]
+    with EventRecorder(path) as recorder:
+        recorder.record(ChangeBatch(*zip(*rows)))
+    data = path.read_bytes()
+    path.write_bytes(data[:-cut])
+    replayed = list(EventReplayer(path))
+    assert replayed == rows[: len(replayed)]
+    assert len(replayed) == (2 if cut <= 22 else 1)
+
+
+def test_recorder_flushes_each_batch(tmp_path):
+    """Should make each batch readable before the recorder is closed."""
+    path = tmp_path / "run.iotrec"
+    recorder = EventRecorder(path)
+    recorder.record(ChangeBatch(["temp_1"], [21.5], [1.0]))
+    assert list(EventReplayer(path)) == [("temp_1", 21.5, 1.0)]
+    recorder.close()
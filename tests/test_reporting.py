@@ -0,0 +1,111 @@
+import pytest
+
+from iot_simulator import ReportingPolicy
+
+
+@pytest.fixture
+def make_hub(make_hub):
+    """Seeded hubs with 50 sensors, 50 switches and 10 selects."""
+
+    def make(**options):
+        return make_hub(50, 50, 10, seed=3, **options)
+
+    return make
+
+
+def tick(hub, ticks, step=1.0):
+    reports = []
+    hub.register_batch_callback(lambda batch: reports.extend(zip(batch.device_ids, batch.states)))
+    for _ in range(ticks):
+        hub.clock.advance(step)
+        hub._background_update_once()
+    return reports
+
+
+def test_policy_validates_arguments():
+    """Should reject negative deadbands and non-positive heartbeats."""
+    with pytest.raises(ValueError):
+        ReportingPolicy(deadband=-1)
+    with pytest.raises(ValueError):
+        ReportingPolicy(max_interval=0)
+
+
+def test_policy_passes():
+    """Should apply absolute and relative deadbands and the minimum interval."""
+    policy = ReportingPolicy(deadband=0.5)
+    assert not policy.passes(21.4, 21.0, 10)
+    assert policy.passes(21.5, 21.0, 10)
+    relative = ReportingPolicy(deadband=0.1, relative=True)
+    assert not relative.passes(21.9, 20.0, 10)
+    assert relative.passes(22.0, 20.0, 10)
+    assert not ReportingPolicy(min_interval=5).passes(30.0, 20.0, 4)
+    assert ReportingPolicy(deadband=5).passes("Boost", "Eco", 1)
+
+
+def test_deadband_cuts_sensor_reports(make_hub, engine):
+    """Should report a sensor only after it moved by the deadband since its last report."""
+    hub = make_hub(**engine)
+    hub.set_reporting_policy(ReportingPolicy(deadband=0.5), device_type="sensor")
+    last = {}
+    reports = tick(hub, 100)
+    sensor_reports = [(dev_id, state) for dev_id, state in reports if dev_id.startswith("temp_")]
+    # Without the policy every sensor reports every tick
+    assert 50 <= len(sensor_reports) < 50 * 100 / 4
+    for device_id, state in sensor_reports:
+        if device_id in last:
+            assert abs(state - last[device_id]) >= 0.5 - 1e-9
+        last[device_id] = state
+    # Switches have no policy and report every flip
+    assert any(dev_id.startswith("light_") for dev_id, _ in reports)
+
+
+def test_min_interval_and_heartbeat(make_hub, engine):
+    """Should rate-limit reports and send heartbeats for quiet devices."""
+    hub = make_hub(**engine)
+    hub.set_reporting_policy(ReportingPolicy(min_interval=10), device_type="sensor")
+    hub.set_reporting_policy(ReportingPolicy(max_interval=5), device_id="light_0")
+    reports = tick(hub, 30)
+    temp_reports = [dev_id for dev_id, _ in reports if dev_id == "temp_0"]
+    assert len(temp_reports) == 3  # At t=1, 11 and 21
+    light_reports = [state for dev_id, state in reports if dev_id == "light_0"]
+    assert len(light_reports) >= 6  # First tick plus every 5 s
+
+
+def test_heartbeat_reports_disabled_device(make_hub, engine):
+    """Should send the unchanged state of a device that does not simulate."""
+    import asyncio
+
+    hub = make_hub(**engine)
+    asyncio.run(hub.toggle_simulation("temp_1", False))
+    hub.set_reporting_policy(ReportingPolicy(max_interval=3), device_id="temp_1")
+    reports = tick(hub, 9)
+    assert [state for dev_id, state in reports if dev_id == "temp_1"] == [21.0] * 3
+
+
+def test_same_reports_for_loop_and_vectorized_engine(make_hub, engine):
+    """Should filter sensors, switches and selects identically in every engine for a seeded run."""
+    pytest.importorskip("numpy")  # The markov model needs it, in the loop as well
+    results = []
+    for options in ({}, engine):
+        hub = make_hub(**options)
+        hub.set_behavior({"model": "markov", "transitions": {"Eco": {"Boost": 0.4}, "Boost": {"Eco": 0.4}}},
+                         device_type="select")
+        hub.set_reporting_policy(ReportingPolicy(deadband=0.3, min_interval=2, max_interval=7), device_type="sensor")
+        # Deadbands do not apply to switches and selects, they report any change
+        hub.set_reporting_policy(ReportingPolicy(deadband=2.0), device_type="switch")
+        hub.set_reporting_policy(ReportingPolicy(deadband=0.5, min_interval=2), device_type="select")
+        results.append(sorted(tick(hub, 40)))  # Heartbeats come last in the loop
+    assert results[0] == results[1]
+    assert any(dev_id.startswith("light_") for dev_id, _ in results[0])
+    assert any(state == "Boost" for _, state in results[0])
+
+
+def test_removing_policy_reports_everything_again(make_hub):
+    """Should go back to report-on-every-change without policies."""
+    hub = make_hub()
+    hub.set_reporting_policy(ReportingPolicy(deadband=100), device_type="sensor")
+    tick(hub, 1)
+    hub.set_reporting_policy(None, device_type="sensor")
+    assert not hub.reporting
+    reports = tick(hub, 1)
+    assert len([dev_id for dev_id, _ in reports if dev_id.startswith("temp_")]) == 50
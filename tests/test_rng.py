@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from iot_simulator import SimulatedHub
+from iot_simulator.rng import DeviceRandom, device_key
+
+
+def trajectory(hub, device_id, ticks=30):
+    states = []
+    for _ in range(ticks):
+        hub._background_update_once()
+        states.append(hub.devices[device_id].state)
+    return states
+
+
+def test_device_key_depends_on_seed_and_id():
+    """Should derive different keys for different seeds and ids."""
+    assert device_key(1, "temp_1") == device_key(1, "temp_1")
+    assert device_key(1, "temp_1") != device_key(2, "temp_1")
+    assert device_key(1, "temp_1") != device_key(1, "temp_2")
+
+
+def test_stream_values_are_uniform():
+    """Should produce values in [0, 1) with a plausible mean."""
+    stream = DeviceRandom(device_key(0, "x"))
+    values = [stream.random() for _ in range(10_000)]
+    assert all(0.0 <= value < 1.0 for value in values)
+    assert 0.48 < sum(values) / len(values) < 0.52
+
+
+def test_trajectory_independent_of_fleet_and_global_random(make_fleet):
+    """Should give a device the same states alone and inside a large fleet."""
+    alone = SimulatedHub(seed=7, devices=make_fleet(1))
+    expected = trajectory(alone, "temp_0")
+    fleet = SimulatedHub(seed=7, devices=list(reversed(make_fleet(100, 100))))
+    random.seed(123)
+    assert trajectory(fleet, "temp_0") == expected
+
+
+def test_different_seeds_give_different_trajectories(make_fleet):
+    """Should change the trajectory with the seed."""
+    first = trajectory(SimulatedHub(seed=1, devices=make_fleet(1, 1)), "temp_0")
+    second = trajectory(SimulatedHub(seed=2, devices=make_fleet(1, 1)), "temp_0")
+    assert first != second
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_vectorized_engine_uses_the_same_streams(compact, make_fleet):
+    """Should compute the same streams in bulk as the per-device loop."""
+    pytest.importorskip("numpy")
+    expected_hub = SimulatedHub(seed=3, devices=make_fleet(25, 25))
+    hub = SimulatedHub(seed=3, devices=make_fleet(25, 25), vectorized=True, compact=compact)
+    for _ in range(25):
+        expected_hub._background_update_once()
+        hub._background_update_once()
+    assert {d: v.state for d, v in hub.devices.items()} == {
+        d: v.state for d, v in expected_hub.devices.items()
+    }
+
+
+def test_bulk_random_matches_scalar_stream():
+    """Should return the same numbers as DeviceRandom for given counters."""
+    np = pytest.importorskip("numpy")
+    from iot_simulator.rng import bulk_random
+
+    keys = [device_key("s", f"d{n}") for n in range(100)]
+    counters = np.arange(100, dtype=np.uint64)
+    bulk = bulk_random(np.array(keys, dtype=np.uint64), counters)
+    scalar = [DeviceRandom(key, counter).random() for key, counter in zip(keys, range(100))]
+    assert bulk.tolist() == scalar
@@ -0,0 +1,112 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from iot_simulator import SimulatedHub
+from iot_simulator.clock import VirtualClock
+from iot_simulator.scheduler import UpdateScheduler
+
+
+def test_default_group_is_a_single_entry():
+    """Should wake the whole default group with one heap entry."""
+    scheduler = UpdateScheduler.for_intervals({}, default_interval=5.0)
+    assert scheduler.pop_due(4.9) == []
+    assert scheduler.pop_due(5.0) == [None]
+    assert scheduler.next_due() == 10.0
+
+
+def test_groups_devices_with_same_interval():
+    """Should share a timer group between devices with the same interval."""
+    scheduler = UpdateScheduler.for_intervals({"a": (1.0, 0.0), "b": (1.0, 0.0), "c": (2.0, 0.0)})
+    assert scheduler.pop_due(1.0) == [["a", "b"]]
+    assert sorted(scheduler.pop_due(2.0)) == [["a", "b"], ["c"]]
+
+
+def test_reschedules_from_nominal_due_time():
+    """Should not accumulate drift when a wake-up is late."""
+    scheduler = UpdateScheduler.for_intervals({"a": (1.0, 0.0)}, default_interval=100.0)
+    scheduler.pop_due(1.25)
+    assert scheduler.next_due() == 2.0
+    assert scheduler.max_lateness == pytest.approx(0.25)
+
+
+def test_skips_missed_periods_when_far_behind():
+    """Should not burst through missed periods after a long stall."""
+    scheduler = UpdateScheduler.for_intervals({"a": (1.0, 0.0)}, default_interval=100.0)
+    assert scheduler.pop_due(10.5) == [["a"]]
+    assert scheduler.next_due() == 11.0
+
+
+def test_jitter_stays_within_bounds():
+    """Should fire jittered devices within +/- jitter of their nominal time."""
+    scheduler = UpdateScheduler.for_intervals({"a": (1.0, 0.1)}, default_interval=100.0)
+    for period in range(1, 50):
+        due = scheduler.next_due()
+        assert period - 0.1 <= due <= period + 0.1
+        assert scheduler.pop_due(due) == [["a"]]
+
+
+def test_reassign_does_not_fire_twice():
+    """Should drop the old timer group when a device gets a new interval."""
+    scheduler = UpdateScheduler.for_intervals({"a": (1.0, 0.0)}, default_interval=100.0)
+    scheduler.assign("a", 3.0)
+    assert scheduler.pop_due(2.0) == []
+    assert scheduler.pop_due(3.0) == [["a"]]
+
+
+def test_hub_updates_devices_on_their_own_interval():
+    """Should update fast devices more often than the default interval."""
+    hub = SimulatedHub(update_interval=0.2, clock=VirtualClock(start=0.0), seed=1)
+    hub.set_update_interval("light_1", 0.01)
+    updates = Counter()
+    hub.register_callback(lambda device_id, state: updates.update([device_id]))
+    asyncio.run(hub.start_background_updates(until=0.3))
+    assert updates["temp_1"] == 1
+    assert hub.scheduler.wakeups > 20  # Every 0.01 s for light_1 plus one default tick
+    assert hub.scheduler.mean_lateness == 0.0
+
+
+def test_vectorized_default_group_is_cached_rows():
+    """Should keep the default group as table rows and tick it like the loop does."""
+    pytest.importorskip("numpy")
+    from iot_simulator import SimulatedDevice
+
+    results = []
+    for options in ({}, {"vectorized": True, "compact": True}):
+        devices = [SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", 21.0) for n in range(10)]
+        hub = SimulatedHub(devices=devices, seed=2, **options)
+        hub.set_update_interval("temp_3", 60)
+        group = hub._default_group()
+        assert hub._default_group() is group
+        for _ in range(3):
+            hub._background_update_once(group)
+        results.append({dev_id: device.state for dev_id, device in hub.devices.items()})
+    assert results[0] == results[1]
+    assert results[1]["temp_3"] == 21.0
+    hub.set_update_interval("temp_4", 60)
+    assert hub._default_group().tolist() == [0, 1, 2, 5, 6, 7, 8, 9]
+
+
+def test_seeded_hub_repeats_its_jitter():
+    """Should draw the jitter of a seeded hub from its seed, so two runs wake up alike."""
+    wakeups = []
+    for _ in range(2):
+        hub = SimulatedHub(clock=VirtualClock(start=0.0), seed=4)
+        hub.set_update_interval("temp_1", 10, jitter=3)
+        seen = []
+        hub.register_callback(lambda device_id, state, seen=seen, hub=hub: seen.append(hub._now()),
+                              device_id="temp_1")
+        asyncio.run(hub.start_background_updates(until=200.0))
+        wakeups.append(seen)
+    assert len(wakeups[0]) > 10 and wakeups[0] == wakeups[1]
+    assert any(time % 10 for time in wakeups[0])
+
+
+def test_update_loop_runs_again_under_a_new_event_loop():
+    """Should start the update loop once more after the first event loop has ended."""
+    hub = SimulatedHub(clock=VirtualClock(start=0.0, speed=1000))  # Waits on the wake-up event
+    asyncio.run(hub.start_background_updates(until=20.0))
+    hub.set_update_interval("temp_1", 2)
+    asyncio.run(hub.start_background_updates(until=40.0))
+    assert hub.clock.time() == 40.0
@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+from iot_simulator import SimulatedDevice, SimulatedHub
+from iot_simulator.clock import VirtualClock
+from iot_simulator.server import HubServer, _Client, start_server
+
+
+def make_hub():
+    devices = [SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", 21.0) for n in range(5)]
+    devices += [SimulatedDevice(f"light_{n}", f"Licht {n}", "switch", False) for n in range(5)]
+    return SimulatedHub(devices=devices, clock=VirtualClock(start=0.0), seed=1)
+
+
+async def connect(server, **subscription):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    await send(writer, {"op": "subscribe", **subscription})
+    return reader, writer
+
+
+async def send(writer, message):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+async def receive(reader):
+    return json.loads(await asyncio.wait_for(reader.readline(), timeout=2))
+
+
+async def settle(server, clients):
+    """Waits until the server has registered ``clients`` subscriptions."""
+    for _ in range(100):
+        if sum(len(group) for group in server._groups.values()) == clients:
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_clients_get_matching_changes():
+    """Should send each client the changes of a tick that match its subscription."""
+
+    async def scenario():
+        hub = make_hub()
+        async with HubServer(hub, port=0) as server:
+            everything = await connect(server)
+            sensors = await connect(server, type="sensor")
+            light = await connect(server, id="light_2")
+            await settle(server, 3)
+            hub._background_update_once()
+            await hub.set_device_state("light_2", True)
+            first = await receive(everything[0])
+            only_sensors = await receive(sensors[0])
+            only_light = await receive(light[0])
+            for _, writer in (everything, sensors, light):
+                writer.close()
+            return first, only_sensors, only_light
+
+    first, only_sensors, only_light = asyncio.run(scenario())
+    assert first["op"] == "changes"
+    assert {device_id for device_id, _, _ in first["changes"]} >= {f"temp_{n}" for n in range(5)}
+    assert {device_id for device_id, _, _ in only_sensors["changes"]} == {f"temp_{n}" for n in range(5)}
+    assert only_light["changes"] == [["light_2", True, 0.0]]
+
+
+def test_commands_set_and_get_states():
+    """Should apply set commands, acknowledge them and answer get requests."""
+
+    async def scenario():
+        hub = make_hub()
+        server = await start_server(hub, port=0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        await send(writer, {"op": "set", "id": "light_1", "state": True, "ref": 7})
+        ack = await receive(reader)
+        await send(writer, {"op": "set", "states": {"temp_0": 30.0, "light_0": True}})
+        await send(writer, {"op": "get", "pattern": "*_0"})
+        states = await receive(reader)
+        await send(writer, {"op": "set", "id": "nope", "state": 1})
+        error = await receive(reader)
+        await send(writer, {"op": "ping", "ref": "x"})
+        pong = await receive(reader)
+        writer.write(b"not json\n")
+        invalid = await receive(reader)
+        writer.close()
+        await server.close()
+        return hub, ack, states, error, pong, invalid
+
+    hub, ack, states, error, pong, invalid = asyncio.run(scenario())
+    assert hub.devices["light_1"].state is True
+    assert ack == {"op": "ack", "ref": 7}
+    assert states == {"op": "states", "states": {"temp_0": 30.0, "light_0": True}}
+    assert error["op"] == "error" and "nope" in error["error"]
+    assert pong == {"op": "pong", "ref": "x"}
+    assert invalid["op"] == "error"
+    assert not hub._batch_subscribers
+
+
+def test_batches_are_encoded_once_per_filter():
+    """Should share the encoded bytes between clients with the same filter."""
+
+    async def scenario():
+        hub = make_hub()
+        async with HubServer(hub, port=0) as server:
+            connections = [await connect(server, pattern="temp_*") for _ in range(20)]
+            await settle(server, 20)
+            queued = []
+            for client in server._clients:
+                original = client.send
+                client.send = lambda data, original=original: (queued.append(data), original(data))
+            hub._background_update_once()
+            messages = [await receive(reader) for reader, _ in connections]
+            for _, writer in connections:
+                writer.close()
+            return queued, messages
+
+    queued, messages = asyncio.run(scenario())
+    assert len(queued) == 20 and all(data is queued[0] for data in queued)
+    assert all(message == messages[0] for message in messages)
+
+
+def test_slow_client_drops_oldest_messages():
+    """Should drop the oldest queued messages above max_buffer and report how many."""
+
+    class Writer:
+        def __init__(self):
+            self.data = b""
+
+        def write(self, data):
+            self.data += data
+
+        async def drain(self):
+            pass
+
+        def close(self):
+            pass
+
+    async def scenario():
+        writer = Writer()
+        client = _Client(writer, max_buffer=25)
+        task = asyncio.create_task(client.write_loop())
+        for n in range(10):
+            client.send(b'{"n":%d}\n' % n)
+        await asyncio.sleep(0)
+        client.close()
+        await task
+        return client, writer.data
+
+    client, data = asyncio.run(scenario())
+    lines = [json.loads(line) for line in data.splitlines()]
+    assert lines[0] == {"op": "dropped", "messages": 7}
+    assert lines[1:] == [{"n": 7}, {"n": 8}, {"n": 9}]
+    assert client.dropped == 7 and client.sent == 3
+
+
+def test_many_clients_on_one_loop():
+    """Should serve a few hundred concurrent connections."""
+
+    async def scenario():
+        hub = make_hub()
+        async with HubServer(hub, port=0) as server:
+            connections = await asyncio.gather(*(connect(server, id="light_3") for _ in range(300)))
+            await settle(server, 300)
+            await hub.set_device_state("light_3", True)
+            messages = await asyncio.gather(*(receive(reader) for reader, _ in connections))
+            clients = server.clients
+            for _, writer in connections:
+                writer.close()
+            return clients, messages
+
+    clients, messages = asyncio.run(scenario())
+    assert clients == 300
+    assert all(message["changes"] == [["light_3", True, 0.0]] for message in messages)
+
+
+def test_invalid_commands_get_errors_and_keep_the_connection():
+    """Should answer malformed commands with errors and clean up when the client leaves."""
+
+    async def scenario():
+        hub = make_hub()
+        async with HubServer(hub, port=0) as server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            answers = []
+            for message in (
+                {"op": "set", "id": ["x"], "state": 1},
+                {"op": "subscribe", "id": {}},
+                {"op": "get", "pattern": 5},
+                {"op": "set", "states": ["light_1"]},
+                ["not", "an", "object"],
+            ):
+                await send(writer, message)
+                answers.append(await receive(reader))
+            await send(writer, {"op": "set", "id": "light_1", "state": True, "ref": 1})
+            answers.append(await receive(reader))
+            writer.close()
+            for _ in range(100):
+                if not server.clients:
+                    break
+                await asyncio.sleep(0.01)
+            return answers, server.clients, dict(server._groups)
+
+    answers, clients, groups = asyncio.run(scenario())
+    assert [answer["op"] for answer in answers] == ["error"] * 5 + ["ack"]
+    assert clients == 0 and groups == {}
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+from iot_simulator import SimulatedDevice
+from iot_simulator.sharding import ShardedHub, shard_of
+
+
+def make_devices(count):
+    return [SimulatedDevice(f"temp_{n}", f"Sensor {n}", "sensor", 20.0) for n in range(count)] + [
+        SimulatedDevice("mode_1", "Heizungsmodus", "select", "Eco")
+    ]
+
+
+async def wait_until(condition, timeout=60):
+    """Polls ``condition`` instead of guessing how long spawned workers take."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.02)
+
+
+def test_shard_of_is_stable():
+    """Should always put a device on the same shard."""
+    assert shard_of("temp_1", 4) == shard_of("temp_1", 4)
+    assert {shard_of(f"temp_{n}", 4) for n in range(100)} == {0, 1, 2, 3}
+
+
+def test_sharded_hub_runs_shards_and_routes_writes():
+    """Should collect changes from all shards and route writes to the owner."""
+    hub = ShardedHub(shards=2, update_interval=0.05, devices=make_devices(20))
+    updates = []
+    hub.register_callback(lambda device_id, state: updates.append((device_id, state)))
+
+    async def run():
+        task = asyncio.create_task(hub.start_background_updates())
+        await wait_until(lambda: len(hub.stats) == 2 and all(stats.events for stats in hub.stats))
+        await hub.toggle_simulation("temp_0", False)
+        await hub.set_device_state("mode_1", "Boost")
+        await hub.set_simulation(False, prefix="temp_1")
+        await hub.set_device_states({"temp_1": 99.0, "temp_2": 98.0})
+        await wait_until(lambda: ("mode_1", "Boost") in updates and ("temp_1", 99.0) in updates
+                         and ("temp_2", 98.0) in updates)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    stats = hub.shard_stats()
+    assert [s["devices"] for s in stats] == [len(ids) for ids in hub._shard_ids]
+    assert all(s["events"] > 0 for s in stats)
+    assert hub.devices["mode_1"].state == "Boost"
+    assert hub.devices["temp_0"].simulation_enabled is False
+    assert hub.devices["temp_1"].state == 99.0
+    assert hub.devices["temp_5"].state == [s for d, s in updates if d == "temp_5"][-1]
+
+
+def test_writes_before_start_go_to_the_mirror_and_ticks_reach_the_shards():
+    """Should apply writes before start to the mirror and tick running shards on request."""
+    hub = ShardedHub(shards=2, update_interval=3600, devices=make_devices(6))
+    updates = []
+    hub.register_callback(lambda device_id, state: updates.append((device_id, state)))
+
+    async def run():
+        results = [
+            await hub.set_device_states({"temp_1": 50.0, "temp_2": 20.0, "nope": 1.0}),
+            await hub.set_simulation(False, device_ids=["temp_1"]),
+        ]
+        await hub.set_device_state("mode_1", "Boost")
+        before = len(updates)
+        await hub.start()
+        try:
+            hub._background_update_once(["temp_3"])
+            hub._background_update_once()
+            results.append(await hub.set_device_states({"mode_1": "Boost", "temp_1": 51.0}))
+            await wait_until(lambda: {"temp_1", "temp_3", "temp_4"} <= {d for d, _ in updates[before:]})
+        finally:
+            await hub.stop()
+        return results, before
+
+    (changed, selected, changed_later), before = asyncio.run(run())
+    assert (changed, selected, changed_later) == (1, 1, 1)
+    assert ("temp_1", 50.0) in updates[:before] and ("mode_1", "Boost") in updates[:before]
+    assert hub.devices["temp_1"].state == 51.0 and hub.devices["temp_1"].simulation_enabled is False
+
+
+def test_shard_runs_commands_in_arrival_order():
+    """Should apply a write before the tick sent after it."""
+    hub = ShardedHub(shards=1, update_interval=3600, devices=make_devices(3))
+    updates = []
+    hub.register_callback(lambda device_id, state: updates.append((device_id, state)))
+
+    async def run():
+        await hub.start()
+        try:
+            await hub.set_device_state("temp_1", 50.0)
+            hub._background_update_once(["temp_1"])
+            await wait_until(lambda: len([d for d, _ in updates if d == "temp_1"]) == 2)
+        finally:
+            await hub.stop()
+
+    asyncio.run(run())
+    first, second = [state for device_id, state in updates if device_id == "temp_1"]
+    assert first == 50.0 and second != 50.0 and abs(second - 50.0) <= 0.2
+
+
+def test_large_writes_while_shards_send_large_batches():
+    """Should not deadlock when a large write crosses large tick batches on the same pipe."""
+    count = 50_000
+    hub = ShardedHub(shards=1, update_interval=0.01, devices=make_devices(count))
+    seen = set()
+    hub.register_batch_callback(lambda batch: seen.update(
+        device_id for device_id, state in zip(batch.device_ids, batch.states) if state == 99.0))
+
+    async def run():
+        await hub.start()
+        try:
+            await wait_until(lambda: hub.stats[0].batches > 0)
+            changed = await asyncio.wait_for(
+                hub.set_device_states({f"temp_{n}": 99.0 for n in range(count)}), timeout=30)
+            await wait_until(lambda: len(seen) == count)
+        finally:
+            await hub.stop()
+        return changed
+
+    assert asyncio.run(run()) == count
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from iot_simulator.clock import VirtualClock
+from iot_simulator.snapshot import DELTA, read_frames
+
+
+def states(hub):
+    return {dev_id: (device.state, device.simulation_enabled) for dev_id, device in hub.devices.items()}
+
+
+def test_restore_continues_the_same_trajectory(make_hub, run, engine):
+    """Should restore states, flags and random streams so the run continues identically."""
+    hub = make_hub(seed=5, **engine)
+    run(hub, 5)
+    asyncio.run(hub.toggle_simulation("temp_3", False))
+    asyncio.run(hub.set_device_state("mode_0", "Boost"))
+    data = hub.snapshot()
+    run(hub, 5)
+    expected = states(hub)
+
+    restored = make_hub(seed=5, **engine)
+    assert restored.restore(data) == len(restored.devices)
+    assert restored.devices["mode_0"].state == "Boost"
+    assert restored.devices["temp_3"].simulation_enabled is False
+    run(restored, 5)
+    assert states(restored) == expected
+
+
+def test_restore_unseeded_hub_restores_random_module(make_hub, run):
+    """Should put the random module back for hubs without a seed."""
+    hub = make_hub()
+    run(hub, 3)
+    data = hub.snapshot()
+    run(hub, 3)
+    expected = states(hub)
+    hub.restore(data)
+    run(hub, 3)
+    assert states(hub) == expected
+
+
+def test_snapshot_file_and_virtual_time(tmp_path, make_hub):
+    """Should write the snapshot to a file and continue the virtual clock."""
+    clock = VirtualClock(start=1000.0)
+    hub = make_hub(seed=1, clock=clock)
+    clock.advance(50)
+    hub.snapshot(tmp_path / "hub.snap")
+    other = make_hub(seed=1, clock=VirtualClock(start=0.0))
+    other.restore(tmp_path / "hub.snap")
+    assert other.clock.time() == 1050.0
+
+
+def test_checkpoint_writes_only_changed_devices(tmp_path, make_hub):
+    """Should append delta frames with the dirty devices and restore all frames in order."""
+    path = tmp_path / "soak.ckpt"
+    hub = make_hub()
+    hub.checkpoint(path)
+    asyncio.run(hub.set_device_state("light_2", True))
+    asyncio.run(hub.toggle_simulation("temp_4", False))
+    hub.checkpoint(path)
+    asyncio.run(hub.set_device_states({"mode_0": "Comfort", "temp_0": 30.0}))
+    hub.checkpoint(path)
+    hub.checkpoint(path)
+
+    frames = list(read_frames(path.read_bytes()))
+    assert [len(frame["ids"]) for frame in frames] == [41, 2, 2, 0]
+    assert sorted(frames[1]["ids"]) == ["light_2", "temp_4"]
+    assert all(frame["kind"] == DELTA for frame in frames[1:])
+
+    restored = make_hub()
+    restored.restore(path)
+    assert states(restored) == states(hub)
+
+
+def test_checkpoint_of_seeded_tick_covers_ticked_devices(tmp_path, make_hub, run):
+    """Should include devices whose random stream moved on, even without a change."""
+    path = tmp_path / "soak.ckpt"
+    hub = make_hub(seed=2)
+    hub.checkpoint(path)
+    hub._background_update_once(["light_1"])
+    hub.checkpoint(path)
+    run(hub, 2)
+    hub.checkpoint(path)
+    expected_after = make_hub(seed=2)
+    expected_after.restore(path)
+    run(hub, 3)
+    run(expected_after, 3)
+    assert states(expected_after) == states(hub)
+    frames = list(read_frames(path.read_bytes()))
+    assert frames[1]["ids"] == ["light_1"]
+
+
+def test_restore_ignores_truncated_last_frame(tmp_path, make_hub):
+    """Should keep the frames before a checkpoint that was cut off."""
+    path = tmp_path / "soak.ckpt"
+    hub = make_hub()
+    hub.checkpoint(path)
+    asyncio.run(hub.set_device_state("light_2", True))
+    size = path.stat().st_size
+    hub.checkpoint(path)
+    with open(path, "r+b") as f:
+        f.truncate(size + 10)
+    restored = make_hub()
+    restored.restore(path)
+    assert restored.devices["light_2"].state is False
+    assert restored.devices["temp_0"].state == 21.0
+
+
+def test_compact_checkpoint_tracks_table_rows(tmp_path, make_hub, run):
+    """Should track vectorized ticks by table row and restore them."""
+    pytest.importorskip("numpy")
+    path = tmp_path / "soak.ckpt"
+    hub = make_hub(vectorized=True, compact=True)
+    hub.checkpoint(path)
+    run(hub, 3)
+    asyncio.run(hub.set_simulation(False, device_type="switch"))
+    hub.checkpoint(path)
+    restored = make_hub(vectorized=True, compact=True)
+    restored.restore(path)
+    assert states(restored) == states(hub)
+
+
+def test_seeded_delta_holds_only_ticked_devices(tmp_path, make_hub, run, engine):
+    """Should leave disabled devices out of the delta of a seeded hub."""
+    path = tmp_path / "soak.ckpt"
+    hub = make_hub(seed=3, **engine)
+    asyncio.run(hub.set_simulation(False))
+    asyncio.run(hub.set_simulation(True, device_ids=["temp_1", "light_1"]))
+    full = hub.checkpoint(path)
+    run(hub, 3)
+    delta = hub.checkpoint(path)
+    assert delta < full / 4
+    assert sorted(list(read_frames(path.read_bytes()))[1]["ids"]) == ["light_1", "temp_1"]
+    restored = make_hub(seed=3, **engine)
+    restored.restore(path)
+    run(hub, 3)
+    run(restored, 3)
+    assert states(restored) == states(hub)
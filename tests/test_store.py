@@ -0,0 +1,95 @@
+import asyncio
+import random
+
+import pytest
+
+from iot_simulator import SimulatedHub, SimulatedDevice
+
+pytest.importorskip("numpy")
+
+from iot_simulator import DeviceTable  # noqa: E402
+
+
+def test_slotted_device_shares_metadata():
+    """Should not carry a __dict__ and share unit and options per type."""
+    first = SimulatedDevice("mode_1", "Modus", "select", "Eco")
+    second = SimulatedDevice("mode_2", "Modus", "select", "Eco")
+    assert not hasattr(first, "__dict__")
+    assert first.options == second.options == ["Eco", "Comfort", "Boost"]
+    assert SimulatedDevice("temp_1", "Temp", "sensor", 21.0).unit == "°C"
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_unit_and_options_are_per_device(compact):
+    """Should let a device change or replace its options and unit without touching others."""
+    hub = SimulatedHub(devices=[SimulatedDevice(f"mode_{n}", "Modus", "select", "Eco") for n in range(2)]
+                       + [SimulatedDevice("temp_1", "Temp", "sensor", 21.0)], compact=compact)
+    first, second, temp = hub.devices["mode_0"], hub.devices["mode_1"], hub.devices["temp_1"]
+    first.options.append("Away")
+    assert second.options == ["Eco", "Comfort", "Boost"]
+    first.options = ["Eco", "Away"]
+    first.options.append("Party")
+    temp.unit = "K"
+    assert hub.devices["mode_0"].options == ["Eco", "Away", "Party"]
+    assert hub.devices["mode_1"].options == ["Eco", "Comfort", "Boost"]
+    assert hub.devices["temp_1"].unit == "K" and first.unit is None
+
+
+def test_compact_hub_keeps_device_interface():
+    """Should expose the same device attributes through table views."""
+    hub = SimulatedHub(compact=True)
+    assert isinstance(hub.devices, DeviceTable)
+    temp = hub.devices["temp_1"]
+    assert temp.name == "Wohnzimmer Temperatur"
+    assert temp.state == 21.0
+    assert temp.unit == "°C"
+    assert hub.devices["mode_1"].options == ["Eco", "Comfort", "Boost"]
+    assert hub.devices["light_1"].state is False
+    assert "does_not_exist" not in hub.devices
+
+
+def test_compact_hub_set_state_and_toggle():
+    """Should write set_device_state and toggle_simulation into the arrays."""
+    hub = SimulatedHub(compact=True)
+    called = []
+    hub.register_callback(lambda device_id, state: called.append((device_id, state)))
+    asyncio.run(hub.set_device_state("light_1", True))
+    asyncio.run(hub.set_device_state("mode_1", "Boost"))
+    asyncio.run(hub.toggle_simulation("temp_1", False))
+    assert hub.devices["light_1"].state is True
+    assert hub.devices["mode_1"].state == "Boost"
+    assert hub.devices["temp_1"].simulation_enabled is False
+    assert called == [("light_1", True), ("mode_1", "Boost")]
+
+
+def test_table_keeps_non_numeric_sensor_state():
+    """Should fall back to object storage when a sensor gets a non-numeric state."""
+    table = DeviceTable()
+    device = table.add("temp_1", "Temp", "sensor", 21.0)
+    device.state = "offline"
+    assert device.state == "offline"
+    device.state = 19.5
+    assert device.state == 19.5
+
+
+def test_table_grows_beyond_capacity():
+    """Should grow its arrays when more devices are added."""
+    table = DeviceTable(capacity=2)
+    for n in range(100):
+        table.add(f"light_{n}", "Licht", "switch", n % 2 == 0)
+    assert len(table) == 100
+    assert table["light_98"].state is True
+    assert table["light_99"].state is False
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_compact_hub_matches_dict_hub(vectorized):
+    """Should simulate the same trajectory as the dict based hub for a seed."""
+    results = []
+    for compact in (False, True):
+        hub = SimulatedHub(vectorized=vectorized, compact=compact)
+        random.seed(42)
+        for _ in range(10):
+            hub._background_update_once()
+        results.append({dev_id: device.state for dev_id, device in hub.devices.items()})
+    assert results[0] == results[1]
@@ -0,0 +1,65 @@
+import asyncio
+from collections import Counter
+
+from iot_simulator import SimulatedHub, SimulatedDevice
+from iot_simulator.topics import CallbackIndex
+
+
+def test_filters_by_device_type_and_pattern():
+    """Should only call callbacks whose filters match the device."""
+    hub = SimulatedHub()
+    hub.devices["temp_2"] = SimulatedDevice("temp_2", "Küche Temperatur", "sensor", 19.0)
+    called = []
+    hub.register_callback(lambda device_id, state: called.append(("id", device_id)), device_id="mode_1")
+    hub.register_callback(lambda device_id, state: called.append(("type", device_id)), device_type="switch")
+    hub.register_callback(lambda device_id, state: called.append(("glob", device_id)), pattern="temp_*")
+    for device_id, state in [("temp_1", 1.0), ("temp_2", 2.0), ("light_1", True), ("mode_1", "Boost")]:
+        asyncio.run(hub.set_device_state(device_id, state))
+    assert called == [("glob", "temp_1"), ("glob", "temp_2"), ("type", "light_1"), ("id", "mode_1")]
+
+
+def test_combined_filters_must_all_match():
+    """Should require every given filter to match."""
+    index = CallbackIndex()
+    index.add("cb", device_type="sensor", pattern="temp_*")
+    types = {"temp_1": "sensor", "temp_x": "switch"}
+    assert index.lookup("temp_1", types.get) == ("cb",)
+    assert index.lookup("temp_x", types.get) == ()
+
+
+def test_unfiltered_callbacks_still_get_everything():
+    """Should keep calling unfiltered callbacks next to filtered ones."""
+    hub = SimulatedHub()
+    counts = Counter()
+    hub.register_callback(lambda device_id, state: counts.update(["all"]))
+    hub.register_callback(lambda device_id, state: counts.update(["light"]), device_id="light_1")
+    asyncio.run(hub.set_device_state("temp_1", 30.0))
+    asyncio.run(hub.set_device_state("light_1", True))
+    assert counts == Counter(all=2, light=1)
+
+
+def test_unregister_callback_removes_filtered_entries():
+    """Should stop calling a callback after unregister_callback."""
+    hub = SimulatedHub()
+    called = []
+    callback = lambda device_id, state: called.append(device_id)  # noqa: E731
+    hub.register_callback(callback, pattern="*")
+    asyncio.run(hub.set_device_state("temp_1", 30.0))
+    hub.unregister_callback(callback)
+    asyncio.run(hub.set_device_state("temp_1", 31.0))
+    assert called == ["temp_1"]
+
+
+def test_filtered_subscription():
+    """Should only queue matching changes for a filtered subscription."""
+    received = []
+
+    async def run():
+        hub = SimulatedHub()
+        hub.subscribe(lambda device_id, state: received.append(device_id), device_type="select")
+        await hub.set_device_state("temp_1", 30.0)
+        await hub.set_device_state("mode_1", "Comfort")
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert received == ["mode_1"]